@@ -0,0 +1,89 @@
+# Скорость рендера карточек анонсов: на одном ядре, в пуле процессов и из кэша.
+# Нужен Pillow. Запуск из корня репозитория: python -m benchmarks.bench_cards
+import asyncio
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import cards
+
+RENDERS = 40
+
+
+def sample_thumbnail(seed):
+    image = cards.Image.linear_gradient("L").resize((1280, 720)).convert("RGB")
+    image = cards.Image.merge("RGB", (image.getchannel(0), image.getchannel(0).rotate(seed % 360), image.getchannel(0)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def render(args):
+    path, thumbnail, index = args
+    return cards.render_card(
+        path, thumbnail, f"Стрим номер {index}: идём на рекорд", "Just Chatting", "pika_dev", "#9146FF",
+        os.path.abspath(cards.FONT_PATH)
+    )
+
+
+class NullHttp:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def get(self, url):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    status = 200
+
+    async def read(self):
+        return self.payload
+
+
+async def cached(workdir, thumbnail):
+    renderer = cards.CardRenderer(NullHttp(thumbnail), {"enabled": True, "cache_dir": os.path.join(workdir, "cache")})
+    await renderer.render("thumb", "Один и тот же анонс", "Just Chatting", "pika_dev")
+    started = time.perf_counter()
+    for _ in range(RENDERS * 10):
+        await renderer.render("thumb", "Один и тот же анонс", "Just Chatting", "pika_dev")
+    elapsed = time.perf_counter() - started
+    renderer.close()
+    return RENDERS * 10 / elapsed
+
+
+def main():
+    if not cards.is_available():
+        print("Pillow не установлен: pip install Pillow")
+        return
+
+    workdir = tempfile.mkdtemp()
+    thumbnails = [sample_thumbnail(i) for i in range(4)]
+    jobs = [(os.path.join(workdir, f"{i}.jpg"), thumbnails[i % 4], i) for i in range(RENDERS)]
+
+    started = time.perf_counter()
+    for job in jobs:
+        render(job)
+    single = RENDERS / (time.perf_counter() - started)
+
+    cores = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=cores) as pool:
+        list(pool.map(render, jobs[:cores]))  # прогрев процессов
+        started = time.perf_counter()
+        list(pool.map(render, jobs))
+        pooled = RENDERS / (time.perf_counter() - started)
+
+    size = sum(os.path.getsize(path) for path, _, _ in jobs) / RENDERS / 1024
+    print(f"1 ядро: {single:.1f} карточек/с ({1000 / single:.0f} мс на карточку, ~{size:.0f} КБ)")
+    print(f"пул из {cores} процессов: {pooled:.1f} карточек/с, {pooled / cores:.1f} на ядро")
+    print(f"из кэша по хэшу содержимого: {asyncio.run(cached(workdir, thumbnails[0])):.0f} анонсов/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# Рассылка одного анонса по сотням каналов Discord: время до последней доставки
+# при разном max_concurrency. Локальная заглушка Discord отвечает с задержкой
+# настоящего REST и, как Discord, возвращает 429 при превышении лимитов —
+# 5 сообщений за 5 с в канал и 50 запросов в секунду на бота.
+#
+# Запуск из корня репозитория (нужны зависимости из requirements.txt):
+#     python -m benchmarks.bench_fanout
+#     python -m benchmarks.bench_fanout --targets 500 --concurrency 5,25,50 --latency 0.1
+#     python -m benchmarks.bench_fanout --no-limits   # без окон лимитов в очереди: видно, сколько 429 получит бот
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import disnake
+from aiohttp import web
+
+from benchmarks.harness import HarnessBot, percentile
+from utils import endpoints, persist
+from utils.outbox import get_outbox
+from utils.routing import get_router
+
+GLOBAL_LIMIT = 50      # запросов в секунду на бота
+CHANNEL_LIMIT = 5      # сообщений в канал
+CHANNEL_WINDOW = 5     # за столько секунд
+
+
+class RateWindow:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.hits = deque()
+
+    def allow(self, now):
+        while self.hits and now - self.hits[0] >= self.window:
+            self.hits.popleft()
+        if len(self.hits) >= self.limit:
+            return False
+        self.hits.append(now)
+        return True
+
+
+class FakeDiscord:
+    def __init__(self, latency):
+        self.latency = latency
+        self.global_window = RateWindow(GLOBAL_LIMIT, 1)
+        self.channel_windows = {}
+        self.delivered = {}
+        self.limited = 0
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/discord/channels/{channel_id}/messages", self.send)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        await web.SockSite(self.runner, sock).start()
+        return f"http://127.0.0.1:{sock.getsockname()[1]}/discord"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def send(self, request):
+        channel_id = int(request.match_info["channel_id"])
+        await request.read()
+        now = time.perf_counter()
+        window = self.channel_windows.setdefault(channel_id, RateWindow(CHANNEL_LIMIT, CHANNEL_WINDOW))
+        if not self.global_window.allow(now) or not window.allow(now):
+            self.limited += 1
+            return web.json_response({"message": "You are being rate limited.", "retry_after": 1.0}, status=429)
+        await asyncio.sleep(self.latency)
+        self.delivered[channel_id] = time.perf_counter()
+        return web.json_response({"id": str(len(self.delivered))})
+
+
+# Канал поверх заглушки: 429 — ошибка отправки, как у вебхуков безголового режима
+class LimitedChannel:
+    def __init__(self, http, channel_id):
+        self.http = http
+        self.id = channel_id
+
+    async def send(self, content=None, embed=None, embeds=None, file=None, files=None):
+        embeds = embeds or ([embed] if embed is not None else [])
+        payload = {"content": content, "embeds": [item.to_dict() for item in embeds]}
+        async with self.http.post(f"{endpoints.base_url('discord')}/channels/{self.id}/messages", json=payload) as resp:
+            if resp.status == 429:
+                raise RuntimeError("429 Too Many Requests")
+            data = await resp.json()
+        return SimpleNamespace(id=int(data["id"]))
+
+
+class FanoutBot(HarnessBot):
+    def get_channel(self, channel_id):
+        return LimitedChannel(self.http_client, channel_id)
+
+
+def write_configs(targets, concurrency, limits):
+    def dump(name, data):
+        with open(os.path.join("config", name), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    os.makedirs("config", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    routes = [
+        {
+            "channel_id": 10000 + i,
+            "platforms": ["youtube"],
+            "mention": f"<@&{900000 + i}>" if i % 3 else "@everyone",
+            "language": "en" if i % 4 == 0 else "ru",
+        }
+        for i in range(targets)
+    ]
+    # Ещё каждый десятый маршрут с фильтром, который анонс не проходит: он не должен дойти
+    routes += [
+        {"channel_id": 50000 + i, "platforms": ["youtube"], "keywords": ["minecraft"]}
+        for i in range(targets // 10)
+    ]
+    config = {"max_concurrency": concurrency, "routes": routes}
+    if not limits:
+        config.update(channel_window=0, global_rate=0)
+    dump("routing.json", config)
+
+
+async def run(targets, concurrency, latency, limits):
+    fake = FakeDiscord(latency)
+    endpoints.configure({"discord": await fake.start()})
+    write_configs(targets, concurrency, limits)
+    bot = FanoutBot(asyncio.get_running_loop())
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            router = get_router(bot)
+            outbox = get_outbox(bot)
+
+            started = time.perf_counter()
+            embed = disnake.Embed(
+                title="📺 Новое видео на YouTube!",
+                description="**Бенчмарк рассылки**\nСмотри сейчас 👉 [перейти к видео](https://www.youtube.com/watch?v=bench)",
+                color=disnake.Color.red()
+            )
+            embed.set_image(url="https://i.ytimg.com/vi/bench/hqdefault.jpg")
+            routed = router.resolve("youtube", "UCbench", {"title": "Бенчмарк рассылки", "url": "https://youtu.be/bench"})
+            resolved = time.perf_counter() - started
+            await outbox.enqueue(routed, embed, "youtube", "bench", time.time())
+            queued = time.perf_counter() - started
+            stored = len(json.dumps(outbox.store.data, ensure_ascii=False))
+            # Столько занял бы тот же эмбед, скопированный в каждый элемент очереди
+            inline = stored + (len(routed) - 1) * len(json.dumps(outbox.payloads, ensure_ascii=False))
+
+            # То же, что делает диспетчер очереди: воркер на каждый канал, готовый к отправке
+            while outbox.pending:
+                due = outbox.due_channels(time.time())
+                if due:
+                    await asyncio.gather(*(outbox.drain(channel_id) for channel_id in due))
+                    continue
+                wake = min(queue[0]["next_attempt"] for queue in outbox.queues.values())
+                await asyncio.sleep(max(0.0, wake - time.time()))
+            outbox.stop()
+    finally:
+        await bot.http_client.close()
+        await fake.stop()
+
+    times = [at - started for at in fake.delivered.values()]
+    return {
+        "targets": len(routed),
+        "delivered": len(fake.delivered),
+        "resolved": resolved,
+        "queued": queued,
+        "stored": stored,
+        "inline": inline,
+        "p50": percentile(times, 0.5),
+        "last": max(times) if times else None,
+        "limited": fake.limited,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время до последней доставки анонса по многим каналам")
+    parser.add_argument("--targets", type=int, default=500)
+    parser.add_argument("--concurrency", default="5,25,50", help="значения max_concurrency через запятую")
+    parser.add_argument("--latency", type=float, default=0.1, help="задержка ответа Discord, секунд")
+    parser.add_argument("--no-limits", action="store_true", help="без окон лимитов Discord в очереди")
+    args = parser.parse_args()
+
+    floor = args.targets / GLOBAL_LIMIT
+    print(
+        f"{args.targets} каналов, ответ Discord {args.latency * 1000:.0f} мс, "
+        f"нижняя граница при {GLOBAL_LIMIT} запросах/с: ~{max(0.0, floor - 1):.1f} с"
+    )
+    cwd = os.getcwd()
+    for concurrency in [int(value) for value in args.concurrency.split(",")]:
+        workdir = tempfile.mkdtemp(prefix="streambot-fanout-")
+        os.chdir(workdir)
+        persist._json_stores.clear()
+        try:
+            result = asyncio.run(run(args.targets, concurrency, args.latency, not args.no_limits))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(
+            f"  max_concurrency {concurrency:>3}: доставлено {result['delivered']}/{result['targets']}, "
+            f"p50 {result['p50']:.2f} с, последняя {result['last']:.2f} с, ответов 429: {result['limited']}; "
+            f"маршруты {result['resolved'] * 1000:.1f} мс, в очередь {result['queued'] * 1000:.1f} мс, "
+            f"outbox.json {result['stored'] / 1024:.0f} КБ (с эмбедом в каждом элементе {result['inline'] / 1024:.0f} КБ)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Сколько запросов к Helix в минуту делает бот при 10 / 100 / 1000 каналах Twitch:
+# статус стримов (StreamWatcher), клипы (TwitchClipsNotifier) и резолв логинов
+# (/users) — на холодном старте и в установившемся режиме. Каждый сотый логин
+# Helix не знает (переименован или забанен): он не должен переспрашиваться каждый опрос.
+# Запуск из корня репозитория: python -m benchmarks.bench_twitch_batching
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.harness import HarnessBot
+from utils import persist, stream_watcher, twitch_users
+
+POLL_SECONDS = 60
+
+
+class FakeHelix:
+    def __init__(self, logins, live_ratio=0.05):
+        self.users = {login: str(100000 + i) for i, login in enumerate(logins)}
+        self.live = set(random.sample(logins, max(1, int(len(logins) * live_ratio))))
+        self.calls = {}
+
+    async def request(self, method, url, params=None, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        params = params or []
+        if endpoint == "users":
+            logins = [value for key, value in params if key == "login"]
+            assert len(logins) <= twitch_users.BATCH_SIZE
+            return {"data": [
+                {"id": self.users[login], "login": login, "display_name": login, "profile_image_url": None}
+                for login in logins if login in self.users
+            ]}
+        if endpoint == "streams":
+            ids = {value for key, value in params if key == "user_id"}
+            assert len(ids) <= twitch_users.BATCH_SIZE
+            return {"data": [
+                {"user_login": login, "title": "", "game_name": "", "viewer_count": 0, "thumbnail_url": ""}
+                for login in self.live if self.users[login] in ids
+            ]}
+        if endpoint == "clips":
+            # /helix/clips принимает один broadcaster_id — запрос на каждый канал
+            return {"data": [], "pagination": {}}
+        raise AssertionError(url)
+
+
+class NullSink:
+    async def on_stream_online(self, login, stream):
+        pass
+
+    async def on_stream_offline(self, login):
+        pass
+
+
+def per_minute(calls, interval):
+    return {endpoint: count * 60 / interval for endpoint, count in calls.items()}
+
+
+async def run(count):
+    known = [f"creator{i}" for i in range(count)]
+    logins = known + [f"renamed{i}" for i in range(max(1, count // 100))]
+    helix = FakeHelix(known)
+    stream_watcher.get_twitch_auth = lambda bot, client_id, secret: helix
+    clips_module = importlib.import_module("cogs.twitch_clips_notify")
+    clips_module.get_twitch_auth = lambda bot, client_id, secret: helix
+
+    os.makedirs("config", exist_ok=True)
+    twitch = {"client_id": "bench", "client_secret": "bench", "broadcaster_login": logins}
+    with open(os.path.join("config", "twitch_clips.json"), "w", encoding="utf-8") as f:
+        json.dump({**twitch, "discord_channel_id": 1}, f)
+
+    bot = HarnessBot(asyncio.get_running_loop())
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            watcher = stream_watcher.StreamWatcher(bot, {**twitch, "poll_seconds": POLL_SECONDS})
+            watcher.sinks["null"] = NullSink()
+            clips_module.setup(bot)
+            clips = bot.cogs["TwitchClipsNotifier"]
+
+            # Холодный старт: пустой кэш каталога, оба опроса резолвят логины
+            await watcher.poll()
+            await clips.check_new_clips()
+            cold_users = helix.calls.get("users", 0)
+
+            # Установившийся режим: одна минута опросов
+            helix.calls.clear()
+            started = time.perf_counter()
+            await watcher.poll()
+            elapsed = time.perf_counter() - started
+            streams = per_minute(helix.calls, POLL_SECONDS)
+            helix.calls.clear()
+            await clips.check_new_clips()
+            clip_calls = per_minute(helix.calls, clips.job.interval)
+    finally:
+        scheduler = getattr(bot, "scheduler", None)
+        for name in list(scheduler.jobs if scheduler else []):
+            scheduler.remove_job(name)
+        if getattr(bot, "outbox", None) is not None:
+            bot.outbox.stop()
+        await persist.flush_all()
+        if getattr(bot, "seen_store", None) is not None:
+            bot.seen_store.close()
+        await bot.http_client.close()
+
+    users = streams.get("users", 0) + clip_calls.get("users", 0)
+    total = sum(streams.values()) + sum(clip_calls.values())
+    print(
+        f"{count:>5} каналов: Helix {total:>5.0f} запросов/мин — streams {streams.get('streams', 0):.0f} "
+        f"(раньше {count * 60 // POLL_SECONDS}), clips {clip_calls.get('clips', 0):.0f}, users {users:.0f}; "
+        f"холодный старт: users {cold_users} (не найдено {len(logins) - count}); "
+        f"обработка опроса стримов {elapsed * 1000:.1f} мс"
+    )
+
+
+async def main():
+    # Бюджет app-токена — 800 запросов/мин; что сверху, планировщик растянет по времени
+    print("Лимит Twitch: 800 запросов/мин на токен приложения")
+    cwd = os.getcwd()
+    for count in (10, 100, 1000):
+        # Каждый прогон — в своём каталоге, чтобы кэши не пересекались
+        os.chdir(tempfile.mkdtemp())
+        persist._json_stores.clear()
+        try:
+            await run(count)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,250 @@
+# Шардирование на одной машине: несколько процессов-воркеров делят каналы Twitch
+# через общий SQLite (utils/cluster.py), посреди прогона один воркер убивается
+# SIGKILL, и его каналы по истечении аренды переезжают к остальным. В конце
+# проверяется, что каждый начавшийся стрим и каждый клип анонсирован ровно один раз.
+#
+# Запуск из корня репозитория (нужны зависимости из requirements.txt):
+#     python -m benchmarks.cluster_demo
+#     python -m benchmarks.cluster_demo --workers 4 --creators 500
+import argparse
+import asyncio
+import contextlib
+import importlib
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from benchmarks import harness
+from utils import endpoints, persist
+from utils.cluster import HashRing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COGS = ("twitch_notify", "twitch_clips_notify")
+LEASE_SECONDS = 3
+TICK = 0.5
+CLIP_URL = re.compile(r"clips\.twitch\.tv/(\w+)")
+
+
+def announcement_key(embed):
+    url = embed.get("url") or ""
+    if url.startswith("https://twitch.tv/"):
+        return ("stream", url.rsplit("/", 1)[-1])
+    match = CLIP_URL.search(embed.get("description") or "")
+    if match:
+        return ("clip", match.group(1))
+    return None
+
+
+# Заглушка API, которая запоминает, какой воркер что анонсировал
+class RecordingUpstream(harness.FakeUpstream):
+    def __init__(self, creators):
+        super().__init__(creators)
+        self.announced = Counter()
+        self.by_worker = Counter()
+
+    async def discord_send(self, request):
+        payload = await request.json()
+        for embed in payload.get("embeds") or []:
+            key = announcement_key(embed)
+            if key:
+                self.announced[key] += 1
+                self.by_worker[request.headers.get("X-Worker", "?")] += 1
+        return await super().discord_send(request)
+
+
+class WorkerChannel(harness.FakeChannel):
+    def __init__(self, http, channel_id, worker_id):
+        super().__init__(http, channel_id)
+        self.worker_id = worker_id
+
+    async def send(self, content=None, embed=None, embeds=None, file=None, files=None):
+        embeds = embeds or ([embed] if embed is not None else [])
+        payload = {"content": content, "embeds": [item.to_dict() for item in embeds]}
+        url = f"{endpoints.base_url('discord')}/channels/{self.id}/messages"
+        async with self.http.post(url, json=payload, headers={"X-Worker": self.worker_id}) as resp:
+            data = await resp.json()
+        return SimpleNamespace(id=int(data["id"]))
+
+
+class WorkerBot(harness.HarnessBot):
+    def __init__(self, loop, worker_id):
+        super().__init__(loop)
+        self.worker_id = worker_id
+
+    def get_channel(self, channel_id):
+        return WorkerChannel(self.http_client, channel_id, self.worker_id)
+
+
+async def run_worker(worker_id, shared):
+    # Каждый воркер — в своём каталоге со своими базами и очередью, общий только кластерный SQLite
+    with open(os.path.join(shared, "setup.json"), "r", encoding="utf-8") as f:
+        setup = json.load(f)
+    workdir = os.path.join(shared, worker_id)
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    harness.write_configs(setup["creators"])
+    with open(os.path.join("config", "cluster.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "enabled": True, "path": os.path.join(shared, "cluster.sqlite3"), "worker_id": worker_id,
+            "lease_seconds": LEASE_SECONDS, "heartbeat_seconds": TICK,
+        }, f)
+    endpoints.configure(setup["urls"])
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    bot = WorkerBot(asyncio.get_running_loop(), worker_id)
+    with open("worker.log", "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        for name in COGS:
+            importlib.import_module(f"cogs.{name}").setup(bot)
+        jobs = [bot.scheduler.jobs[name] for name in ("twitch_streams", "twitch_clips")]
+        try:
+            while not stop.is_set():
+                await bot.cluster.heartbeat()
+                await asyncio.gather(*(harness.run_job(job) for job in jobs))
+                outbox = bot.outbox
+                await asyncio.gather(*(outbox.drain(channel_id) for channel_id in outbox.due_channels(time.time())))
+                try:
+                    await asyncio.wait_for(stop.wait(), TICK)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for name in list(bot.scheduler.jobs):
+                bot.scheduler.remove_job(name)
+            bot.outbox.stop()
+            await persist.flush_all()
+            bot.seen_store.close()
+            bot.cluster.close()
+            await bot.http_client.close()
+
+
+def live_workers(path):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT worker_id FROM workers WHERE heartbeat > ?", (time.time() - LEASE_SECONDS,))
+        return sorted(row[0] for row in rows)
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+def ownership(creators, workers):
+    ring = HashRing(workers)
+    return Counter(ring.owner(login) for login in creators)
+
+
+async def run_demo(args):
+    random.seed(args.seed)
+    creators = [f"creator{i:04d}" for i in range(args.creators)]
+    fake = RecordingUpstream(creators)
+    urls = await fake.start()
+    shared = tempfile.mkdtemp(prefix="streambot-cluster-")
+    db = os.path.join(shared, "cluster.sqlite3")
+    with open(os.path.join(shared, "setup.json"), "w", encoding="utf-8") as f:
+        json.dump({"creators": creators, "urls": urls}, f)
+
+    worker_ids = [f"worker-{i + 1}" for i in range(args.workers)]
+    processes = {}
+    for worker_id in worker_ids:
+        processes[worker_id] = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "benchmarks.cluster_demo", "--worker", worker_id, "--shared", shared, cwd=ROOT
+        )
+
+    try:
+        deadline = time.time() + 30
+        while len(live_workers(db)) < args.workers:
+            if time.time() > deadline:
+                raise RuntimeError("воркеры не поднялись за 30 с")
+            await asyncio.sleep(0.2)
+        before = ownership(creators, worker_ids)
+        print(f"воркеров {args.workers}, каналов {len(creators)}: " + ", ".join(f"{w} {n}" for w, n in sorted(before.items())))
+
+        went_live = set()
+        clips = 0
+
+        async def traffic(seconds):
+            nonlocal clips
+            finish = time.time() + seconds
+            while time.time() < finish:
+                idle = [login for login in creators if login not in went_live]
+                if idle:
+                    login = random.choice(idle)
+                    went_live.add(login)
+                    fake.apply({"type": "online", "creator": login}, time.time())
+                fake.apply({"type": "clip", "creator": random.choice(creators)}, time.time())
+                clips += 1
+                await asyncio.sleep(args.interval)
+
+        await traffic(args.seconds / 2)
+        victim = worker_ids[0]
+        killed = processes.pop(victim)
+        killed.kill()
+        await killed.wait()
+        killed_at = time.time()
+        print(f"💀 {victim} убит SIGKILL, его каналов было {before[victim]}")
+
+        await traffic(args.seconds / 2)
+        survivors = live_workers(db)
+        print(f"живые воркеры через {time.time() - killed_at:.1f} с: {', '.join(survivors)}")
+        after = ownership(creators, survivors)
+        print("после перебалансировки: " + ", ".join(f"{w} {n}" for w, n in sorted(after.items())))
+
+        # Даём очередям и последним опросам дойти
+        await asyncio.sleep(LEASE_SECONDS + 4 * TICK)
+    finally:
+        for process in processes.values():
+            process.send_signal(signal.SIGTERM)
+        await asyncio.gather(*(process.wait() for process in processes.values()))
+        await fake.stop()
+
+    expected = {("stream", login) for login in went_live}
+    expected |= {("clip", clip["id"]) for items in fake.clips.values() for clip in items}
+    missed = expected - set(fake.announced)
+    duplicates = {key: count for key, count in fake.announced.items() if count > 1}
+    print(f"анонсов ожидалось {len(expected)} (стримов {len(went_live)}, клипов {clips}), отправлено {sum(fake.announced.values())}")
+    print("по воркерам: " + ", ".join(f"{w} {n}" for w, n in sorted(fake.by_worker.items())))
+    print(f"пропущено {len(missed)}, дублей {len(duplicates)}")
+    for key in sorted(missed)[:5]:
+        print(f"  пропущен {key[0]} {key[1]}")
+    for key, count in sorted(duplicates.items())[:5]:
+        print(f"  {key[0]} {key[1]} отправлен {count} раз(а)")
+    print("вызовов API: " + ", ".join(f"{provider} {count}" for provider, count in sorted(fake.calls.items())))
+
+    if args.keep:
+        print(f"каталог воркеров с логами: {shared}")
+    else:
+        shutil.rmtree(shared, ignore_errors=True)
+    return not missed and not duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Несколько воркеров с общим кластерным SQLite и отказом одного из них")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--creators", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=12, help="сколько секунд идут события")
+    parser.add_argument("--interval", type=float, default=0.1, help="пауза между событиями")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="не удалять каталоги воркеров с логами")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--shared", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(run_worker(args.worker, args.shared))
+        return
+    if args.workers < 2:
+        parser.error("нужно хотя бы два воркера")
+    sys.exit(0 if asyncio.run(run_demo(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
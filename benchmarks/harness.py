@@ -0,0 +1,646 @@
+# Офлайн-прогон бота против локальных заглушек Twitch, YouTube, TikWM, Telegram и Discord.
+# Настоящие cogs загружаются как в main.py, а их задачи планировщика и очередь анонсов
+# крутятся по виртуальным часам: простой между тиками пропускается, а время обработки
+# учитывается, поэтому задержки анонсов получаются такими же, как в проде при тех же
+# интервалах. Сценарий — синтетический (по seed) или записанный JSON.
+#
+# Запуск из корня репозитория (нужны зависимости из requirements.txt):
+#     python -m benchmarks.harness
+#     python -m benchmarks.harness --creators 1,100,1000 --minutes 30
+#     python -m benchmarks.harness --creators 100 --record scenario.json
+#     python -m benchmarks.harness --scenario scenario.json
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import importlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+from utils import endpoints, metrics, persist
+from utils.http import HttpClient
+
+COGS = ("twitch_notify", "twitch_to_telegram", "twitch_clips_notify", "youtube_notify", "tiktok_notify")
+CHANNELS = {"streams": 1, "clips": 2, "youtube": 3, "tiktok": 4}
+YOUTUBE_CHANNEL = "UCharness000000000000000"
+TIKTOK_USER = "harness"
+UNLIMITED = {"rate": 1e9, "capacity": 1e9}
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# Виртуальное время: time.time() = точка, до которой промотали часы,
+# плюс реально прошедшее с тех пор время обработки
+class VirtualClock:
+    def __init__(self, start):
+        self.base = start
+        self.mark = time.perf_counter()
+        self._real_time = time.time
+
+    def now(self):
+        return self.base + (time.perf_counter() - self.mark)
+
+    def advance_to(self, timestamp):
+        if timestamp > self.now():
+            self.base = timestamp
+            self.mark = time.perf_counter()
+
+    def install(self):
+        time.time = self.now
+
+    def uninstall(self):
+        time.time = self._real_time
+
+
+def generate_scenario(count, minutes, seed):
+    rng = random.Random(seed)
+    duration = minutes * 60
+    creators = [f"creator{i}" for i in range(count)]
+    events = []
+    # Примерно каждый десятый канал выходит в эфир, у половины из них — шквал клипов
+    for login in rng.sample(creators, max(1, count // 10)):
+        online = rng.uniform(0, duration * 0.5)
+        offline = min(duration - 60, online + rng.uniform(duration * 0.2, duration * 0.4))
+        events.append({"at": online, "type": "online", "creator": login})
+        events.append({"at": offline, "type": "offline", "creator": login})
+        if rng.random() < 0.5:
+            spree = rng.uniform(online, offline)
+            for _ in range(rng.randint(3, 30)):
+                # Клип появляется в API с задержкой до двух минут
+                events.append({"at": spree + rng.uniform(0, 120), "type": "clip", "creator": login, "delay": rng.uniform(0, 120)})
+    burst = rng.uniform(0, duration * 0.8)
+    for i in range(3):
+        events.append({"at": burst + i, "type": "upload"})
+    for _ in range(2):
+        events.append({"at": rng.uniform(0, duration * 0.9), "type": "tiktok"})
+    events.sort(key=lambda event: event["at"])
+    return {"creators": creators, "minutes": minutes, "events": events}
+
+
+# Все внешние API на одном локальном порту, каждый под своим префиксом
+class FakeUpstream:
+    def __init__(self, creators):
+        self.users = {login: str(100000 + i) for i, login in enumerate(creators)}
+        self.logins = {user_id: login for login, user_id in self.users.items()}
+        self.live = {}
+        self.clips = {}
+        self.uploads = []
+        self.tiktoks = []
+        self.calls = {}
+        self.deliveries = {"discord": 0, "telegram": 0}
+        self._seq = 0
+        self.runner = None
+        self.base = None
+
+    def next_id(self, prefix):
+        self._seq += 1
+        return f"{prefix}{self._seq}"
+
+    def count(self, provider):
+        self.calls[provider] = self.calls.get(provider, 0) + 1
+
+    def apply(self, event, now):
+        kind = event["type"]
+        if kind == "online":
+            self.live[event["creator"]] = now
+        elif kind == "offline":
+            self.live.pop(event["creator"], None)
+        elif kind == "clip":
+            clip_id = self.next_id("clip")
+            self.clips.setdefault(self.users[event["creator"]], []).append({
+                "id": clip_id,
+                "url": f"https://clips.twitch.tv/{clip_id}",
+                "title": f"Клип {clip_id}",
+                "thumbnail_url": f"https://clips-media.example/{clip_id}.jpg",
+                "created_at": iso(now),
+                "visible_at": now + event.get("delay", 0),
+                "views": random.randint(0, 1000),
+            })
+        elif kind == "upload":
+            self.uploads.insert(0, {"video_id": self.next_id("yt"), "published": iso(now)})
+        elif kind == "tiktok":
+            self.tiktoks.insert(0, {"video_id": self.next_id("tt"), "create_time": int(now)})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/twitch/oauth2/token", self.token)
+        app.router.add_get("/twitch/helix/users", self.helix_users)
+        app.router.add_get("/twitch/helix/streams", self.helix_streams)
+        app.router.add_get("/twitch/helix/clips", self.helix_clips)
+        app.router.add_get("/twitch/helix/channels", self.helix_channels)
+        app.router.add_get("/youtube/feeds/videos.xml", self.youtube_feed)
+        app.router.add_get("/youtube/v3/playlistItems", self.youtube_playlist)
+        app.router.add_get("/tikwm/api/user/posts", self.tikwm_posts)
+        app.router.add_post("/telegram/{bot}/{method}", self.telegram_send)
+        app.router.add_post("/discord/channels/{channel_id}/messages", self.discord_send)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        await web.SockSite(self.runner, sock).start()
+        self.base = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        return {
+            "twitch_helix": f"{self.base}/twitch/helix",
+            "twitch_oauth": f"{self.base}/twitch/oauth2",
+            "youtube_feed": f"{self.base}/youtube/feeds/videos.xml",
+            "youtube_api": f"{self.base}/youtube/v3",
+            "youtube_hub": f"{self.base}/youtube/hub",
+            "tikwm": f"{self.base}/tikwm",
+            "telegram": f"{self.base}/telegram",
+            "discord": f"{self.base}/discord",
+        }
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def token(self, request):
+        self.count("twitch")
+        return web.json_response({"access_token": "harness", "expires_in": 60 * 86400})
+
+    async def helix_users(self, request):
+        self.count("twitch")
+        logins = request.query.getall("login", [])
+        return web.json_response({"data": [
+            {"id": self.users[login], "login": login, "display_name": login, "profile_image_url": None}
+            for login in logins if login in self.users
+        ]})
+
+    async def helix_streams(self, request):
+        self.count("twitch")
+        data = []
+        for user_id in request.query.getall("user_id", []):
+            login = self.logins.get(user_id)
+            if login in self.live:
+                data.append({
+                    "user_id": user_id, "user_login": login, "title": "Стрим", "game_name": "Just Chatting",
+                    "viewer_count": 10, "started_at": iso(self.live[login]),
+                    "thumbnail_url": f"https://static-cdn.example/live_user_{login}-{{width}}x{{height}}.jpg",
+                })
+        return web.json_response({"data": data, "pagination": {}})
+
+    async def helix_channels(self, request):
+        self.count("twitch")
+        user_id = request.query["broadcaster_id"]
+        return web.json_response({"data": [
+            {"broadcaster_id": user_id, "broadcaster_login": self.logins.get(user_id), "title": "Стрим", "game_name": "Just Chatting"}
+        ]})
+
+    async def helix_clips(self, request):
+        self.count("twitch")
+        query = request.query
+        now = time.time()
+        started_at = query.get("started_at", "")
+        ended_at = query.get("ended_at", "9999")
+        # Helix отдаёт клипы окна по просмотрам, а не по дате
+        clips = sorted(
+            (clip for clip in self.clips.get(query["broadcaster_id"], [])
+             if clip["visible_at"] <= now and started_at <= clip["created_at"] <= ended_at),
+            key=lambda clip: -clip["views"]
+        )
+        offset = int(query.get("after", 0))
+        first = int(query.get("first", 20))
+        page = clips[offset:offset + first]
+        cursor = str(offset + first) if offset + first < len(clips) else None
+        return web.json_response({
+            "data": [{key: value for key, value in clip.items() if key not in ("visible_at", "views")} for clip in page],
+            "pagination": {"cursor": cursor} if cursor else {},
+        })
+
+    async def youtube_feed(self, request):
+        self.count("youtube")
+        etag = f'"{len(self.uploads)}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        entries = "".join(
+            f"<entry><yt:videoId>{video['video_id']}</yt:videoId><title>{escape('Видео ' + video['video_id'])}</title>"
+            f"<published>{video['published']}</published>"
+            f"<media:group><media:thumbnail url=\"https://i.ytimg.com/vi/{video['video_id']}/hqdefault.jpg\"/></media:group></entry>"
+            for video in self.uploads[:15]
+        )
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:yt="http://www.youtube.com/xml/schemas/2015" '
+            f'xmlns:media="http://search.yahoo.com/mrss/">{entries}</feed>'
+        )
+        return web.Response(text=body, content_type="application/atom+xml", headers={"ETag": etag})
+
+    async def youtube_playlist(self, request):
+        self.count("youtube")
+        offset = int(request.query.get("pageToken", 0) or 0)
+        size = int(request.query.get("maxResults", 5))
+        data = {"etag": f'"{len(self.uploads)}"', "items": [
+            {"snippet": {
+                "title": f"Видео {video['video_id']}", "publishedAt": video["published"], "channelTitle": "Harness",
+                "resourceId": {"videoId": video["video_id"]}, "thumbnails": {},
+            }}
+            for video in self.uploads[offset:offset + size]
+        ]}
+        if offset + size < len(self.uploads):
+            data["nextPageToken"] = str(offset + size)
+        return web.json_response(data)
+
+    async def tikwm_posts(self, request):
+        self.count("tikwm")
+        offset = int(request.query.get("cursor", 0) or 0)
+        count = int(request.query.get("count", 10))
+        page = self.tiktoks[offset:offset + count]
+        return web.json_response({"code": 0, "msg": "success", "data": {
+            "videos": [
+                {**video, "title": f"TikTok {video['video_id']}", "cover": "https://p16.example/cover.jpg", "is_top": 0}
+                for video in page
+            ],
+            "cursor": offset + len(page),
+            "hasMore": offset + count < len(self.tiktoks),
+        }})
+
+    async def telegram_send(self, request):
+        self.count("telegram")
+        # sendMessage/sendPhoto приходят JSON, sendMediaGroup с карточками — multipart
+        await request.read()
+        self.deliveries["telegram"] += 1
+        if request.match_info["method"] == "sendMediaGroup":
+            return web.json_response({"ok": True, "result": [{"message_id": self._seq}]})
+        return web.json_response({"ok": True, "result": {"message_id": self._seq}})
+
+    async def discord_send(self, request):
+        self.count("discord")
+        payload = await request.json()
+        self.deliveries["discord"] += len(payload.get("embeds") or [None])
+        return web.json_response({"id": self.next_id("")})
+
+
+# Канал Discord, который шлёт сообщения в заглушку тем же REST-вызовом, что и disnake
+class FakeChannel:
+    def __init__(self, http, channel_id):
+        self.http = http
+        self.id = channel_id
+
+    async def send(self, content=None, embed=None, embeds=None, file=None, files=None):
+        embeds = embeds or ([embed] if embed is not None else [])
+        payload = {"content": content, "embeds": [item.to_dict() for item in embeds]}
+        async with self.http.post(f"{endpoints.base_url('discord')}/channels/{self.id}/messages", json=payload) as resp:
+            data = await resp.json()
+        return SimpleNamespace(id=int(data["id"]))
+
+
+class HarnessBot:
+    def __init__(self, loop):
+        self.loop = loop
+        self.cogs = {}
+        self.http_client = HttpClient()
+        self._never_ready = asyncio.Event()
+
+    async def wait_until_ready(self):
+        # Собственные циклы планировщика и очереди не стартуют — их ведёт харнесс
+        await self._never_ready.wait()
+
+    def add_listener(self, func, name=None):
+        pass
+
+    def dispatch(self, event, *args):
+        pass
+
+    def add_cog(self, cog):
+        self.cogs[type(cog).__name__] = cog
+
+    def get_channel(self, channel_id):
+        return FakeChannel(self.http_client, channel_id)
+
+
+# Отправитель EventSub: подписывает сообщения так же, как Twitch, и шлёт их
+# на вебхук бота (challenge, уведомления, отзыв подписки)
+class FakeEventSub:
+    def __init__(self, http, url, secret):
+        self.http = http
+        self.url = url
+        self.secret = secret
+
+    async def send(self, message_type, payload, message_id=None, sent_at=None, secret=None):
+        body = json.dumps(payload).encode()
+        message_id = message_id or str(uuid.uuid4())
+        timestamp = datetime.fromtimestamp(sent_at or time.time(), timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f000Z")
+        signature = hmac.new((secret or self.secret).encode(), (message_id + timestamp).encode() + body, hashlib.sha256)
+        headers = {
+            "Content-Type": "application/json",
+            "Twitch-Eventsub-Message-Id": message_id,
+            "Twitch-Eventsub-Message-Timestamp": timestamp,
+            "Twitch-Eventsub-Message-Signature": f"sha256={signature.hexdigest()}",
+            "Twitch-Eventsub-Message-Type": message_type,
+        }
+        async with self.http.post(self.url, data=body, headers=headers) as resp:
+            return resp.status, await resp.text()
+
+    @staticmethod
+    def subscription(sub_type, user_id, status="enabled"):
+        return {
+            "id": str(uuid.uuid4()), "type": sub_type, "version": "1", "status": status,
+            "condition": {"broadcaster_user_id": user_id},
+            "transport": {"method": "webhook", "callback": "https://example.com/twitch/eventsub"},
+        }
+
+    def notification(self, sub_type, user_id, login, stream_id=None):
+        event = {"broadcaster_user_id": user_id, "broadcaster_user_login": login, "broadcaster_user_name": login}
+        if sub_type == "stream.online":
+            event.update(id=stream_id, type="live", started_at=iso(time.time()))
+        return {"subscription": self.subscription(sub_type, user_id), "event": event}
+
+
+class EventSubBot(HarnessBot):
+    def __init__(self, loop):
+        super().__init__(loop)
+        self.dispatched = []
+
+    def dispatch(self, event, *args):
+        self.dispatched.append((event, *args))
+
+
+def write_configs(creators):
+    def dump(name, data):
+        with open(os.path.join("config", name), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    os.makedirs("config", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    twitch = {"client_id": "harness", "client_secret": "harness", "broadcaster_login": creators}
+    dump("twitch.json", {**twitch, "discord_channel_id": CHANNELS["streams"], "poll_seconds": 60})
+    dump("twitch_clips.json", {**twitch, "discord_channel_id": CHANNELS["clips"]})
+    dump("youtube.json", {"channel_id": YOUTUBE_CHANNEL, "discord_channel_id": CHANNELS["youtube"]})
+    dump("tiktok.json", {"username": TIKTOK_USER, "discord_channel_id": CHANNELS["tiktok"]})
+    # Лимиты провайдеров и темп отправки в чат меряем отдельно — здесь они не должны ждать реальное время
+    dump("telegram.json", {"token": "harness", "chat_id": 1, "private_interval": 0, "group_interval": 0})
+    dump("routing.json", {"channel_window": 0, "global_rate": 0})
+    dump("scheduler.json", {"providers": {name: UNLIMITED for name in ("twitch", "youtube", "tikwm", "telegram")}})
+
+
+async def run_job(job):
+    # То же, что делает Scheduler._run между ожиданиями
+    started = time.perf_counter()
+    failed = False
+    try:
+        await job.func()
+    except Exception:
+        failed = True
+    job.stats.record(time.perf_counter() - started, failed)
+    return failed
+
+
+async def simulate(scenario, seed):
+    random.seed(seed)
+    creators = scenario["creators"]
+    fake = FakeUpstream(creators)
+    urls = await fake.start()
+    endpoints.configure(urls)
+    write_configs(creators)
+
+    lags = {}
+    original_observe = metrics.observe_lag
+
+    def observe_lag(source, published):
+        published_at = metrics.to_timestamp(published)
+        if published_at is not None:
+            lags.setdefault(source, []).append(time.time() - published_at)
+        original_observe(source, published)
+
+    clock = VirtualClock(time.time())
+    end = clock.now() + scenario["minutes"] * 60
+    start = clock.now()
+    events = [{**event, "at": start + event["at"]} for event in scenario["events"]]
+    expected = {"streams": 0, "clips": 0, "youtube": 0, "tiktok": 0}
+    kinds = {"online": "streams", "clip": "clips", "upload": "youtube", "tiktok": "tiktok"}
+    for event in events:
+        if event["type"] in kinds:
+            expected[kinds[event["type"]]] += 1
+
+    metrics.observe_lag = observe_lag
+    clock.install()
+    bot = HarnessBot(asyncio.get_running_loop())
+    job_errors = 0
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name in COGS:
+                importlib.import_module(f"cogs.{name}").setup(bot)
+            scheduler = bot.scheduler
+            outbox = bot.outbox
+            next_run = {name: clock.now() for name in scheduler.jobs}
+
+            while True:
+                now = clock.now()
+                while events and events[0]["at"] <= now:
+                    fake.apply(events.pop(0), now)
+
+                due = [scheduler.jobs[name] for name, at in next_run.items() if at <= now]
+                failures = await asyncio.gather(*(run_job(job) for job in due))
+                job_errors += sum(failures)
+                for job in due:
+                    next_run[job.name] = clock.now() + scheduler.next_delay(job)
+
+                await asyncio.gather(*(outbox.drain(channel_id) for channel_id in outbox.due_channels(clock.now())))
+
+                upcoming = list(next_run.values()) + [entry["next_attempt"] for entry in outbox.pending]
+                if events:
+                    upcoming.append(events[0]["at"])
+                wake = min(upcoming)
+                if wake > end:
+                    break
+                clock.advance_to(wake)
+    finally:
+        elapsed = time.perf_counter() - started
+        clock.uninstall()
+        metrics.observe_lag = original_observe
+        for name in list(getattr(bot, "scheduler", SimpleNamespace(jobs={})).jobs):
+            bot.scheduler.remove_job(name)
+        if getattr(bot, "outbox", None) is not None:
+            bot.outbox.stop()
+        await persist.flush_all()
+        if getattr(bot, "seen_store", None) is not None:
+            bot.seen_store.close()
+        await bot.http_client.close()
+        await fake.stop()
+
+    return {
+        "creators": len(creators),
+        "expected": expected,
+        "lags": lags,
+        "calls": fake.calls,
+        "deliveries": fake.deliveries,
+        "pending": len(bot.outbox.pending) if getattr(bot, "outbox", None) is not None else 0,
+        "job_errors": job_errors,
+        "elapsed": elapsed,
+        "virtual": end - start,
+    }
+
+
+async def check_eventsub():
+    # Настоящий cog EventSub за локальным веб-сервером: подпись, challenge, повтор
+    # по Twitch-Eventsub-Message-Id, устаревшее сообщение, отзыв подписки
+    fake = FakeUpstream(["eventsub"])
+    endpoints.configure(await fake.start())
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    secret = "harness-eventsub-secret"
+    os.makedirs("config", exist_ok=True)
+    with open(os.path.join("config", "web.json"), "w", encoding="utf-8") as f:
+        json.dump({"host": "127.0.0.1", "port": port}, f)
+    with open(os.path.join("config", "twitch.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "client_id": "harness", "client_secret": "harness", "broadcaster_login": ["eventsub"],
+            "eventsub": {"enabled": True, "subscribe": False, "secret": secret, "callback_url": "https://example.com/twitch/eventsub"},
+        }, f)
+
+    bot = EventSubBot(asyncio.get_running_loop())
+    sender = FakeEventSub(bot.http_client, f"http://127.0.0.1:{port}/twitch/eventsub", secret)
+    user_id = fake.users["eventsub"]
+    checks = []
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            importlib.import_module("cogs.twitch_eventsub").setup(bot)
+            await bot.cogs["TwitchEventSub"].start()
+
+            challenge = {"challenge": "pogchamp-kappa-360noscope", "subscription": sender.subscription(
+                "stream.online", user_id, "webhook_callback_verification_pending")}
+            status, text = await sender.send("webhook_callback_verification", challenge)
+            checks.append(("challenge подтверждён", status == 200 and text == challenge["challenge"]))
+
+            online = sender.notification("stream.online", user_id, "eventsub", "40000000001")
+            status, _ = await sender.send("notification", online, secret="wrong-secret")
+            checks.append(("неверная подпись отклонена", status == 403 and not bot.dispatched))
+
+            status, _ = await sender.send("notification", online, message_id="online-1")
+            stream = bot.dispatched[-1][1] if bot.dispatched else {}
+            checks.append(("stream.online -> on_twitch_stream_online", status == 204 and len(bot.dispatched) == 1
+                           and bot.dispatched[0][0] == "twitch_stream_online"))
+            checks.append(("у стрима id и название из /channels", stream.get("id") == "40000000001"
+                           and stream.get("title") == "Стрим" and stream.get("user_login") == "eventsub"))
+
+            await sender.send("notification", online, message_id="online-1")
+            checks.append(("повтор того же Message-Id отброшен", len(bot.dispatched) == 1))
+
+            await sender.send("notification", online, sent_at=time.time() - 3600)
+            checks.append(("устаревшее сообщение отброшено", len(bot.dispatched) == 1))
+
+            status, _ = await sender.send("notification", sender.notification("stream.offline", user_id, "eventsub"))
+            checks.append(("stream.offline -> on_twitch_stream_offline", status == 204 and len(bot.dispatched) == 2
+                           and bot.dispatched[1] == ("twitch_stream_offline", "eventsub")))
+
+            revoked = {"subscription": sender.subscription("stream.online", user_id, "authorization_revoked")}
+            status, _ = await sender.send("revocation", revoked)
+            checks.append(("отзыв подписки принят без события", status == 204 and len(bot.dispatched) == 2))
+    finally:
+        if getattr(bot, "web_server", None) is not None:
+            await bot.web_server.stop()
+        await persist.flush_all()
+        await bot.http_client.close()
+        await fake.stop()
+    return checks
+
+
+def report_eventsub(checks):
+    passed = sum(ok for _, ok in checks)
+    print(f"\n=== EventSub: проверок пройдено {passed}/{len(checks)} ===")
+    for name, ok in checks:
+        print(f"  {'✅' if ok else '❌'} {name}")
+    return passed == len(checks)
+
+
+def report(result):
+    events = sum(result["expected"].values())
+    delivered = {
+        "streams": len(result["lags"].get("streams", [])),
+        "clips": len(result["lags"].get("clips", [])),
+        "youtube": len(result["lags"].get("youtube", [])),
+        "tiktok": len(result["lags"].get("tiktok", [])),
+    }
+    upstream = sum(result["calls"].get(provider, 0) for provider in ("twitch", "youtube", "tikwm"))
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\n=== {result['creators']} каналов Twitch, {result['virtual'] / 60:.0f} виртуальных минут ===")
+    print(
+        f"событий {events}, обработано за {result['elapsed']:.2f} с реального времени "
+        f"({sum(delivered.values()) / result['elapsed']:.1f} анонсов/с), ошибок задач {result['job_errors']}, "
+        f"в очереди осталось {result['pending']}"
+    )
+    calls = ", ".join(f"{provider} {count}" for provider, count in sorted(result["calls"].items()))
+    print(f"вызовов API: {calls}; к источникам на событие: {upstream / max(1, events):.1f}")
+    # Анонс стрима в Discord идёт через очередь, его задержка — до подтверждённой отправки ("streams")
+    for kind, source in (("streams", "streams"), ("streams", "twitch_telegram"),
+                         ("clips", "clips"), ("youtube", "youtube"), ("tiktok", "tiktok")):
+        lags = result["lags"].get(source, [])
+        line = f"  {source:<16} доставлено {len(lags)}/{result['expected'][kind]}"
+        if lags:
+            line += (
+                f", задержка p50 {percentile(lags, 0.5):.0f} с, p95 {percentile(lags, 0.95):.0f} с, "
+                f"p99 {percentile(lags, 0.99):.0f} с, макс {max(lags):.0f} с"
+            )
+        print(line)
+    print(f"пиковая RSS процесса: {maxrss:.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-прогон бота против локальных заглушек API")
+    parser.add_argument("--creators", default="1,100,1000", help="число каналов Twitch через запятую")
+    parser.add_argument("--minutes", type=int, default=30, help="длительность сценария в виртуальных минутах")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenario", help="воспроизвести записанный сценарий из JSON")
+    parser.add_argument("--record", help="сохранить сгенерированный сценарий в JSON")
+    args = parser.parse_args()
+
+    if args.scenario:
+        with open(args.scenario, "r", encoding="utf-8") as f:
+            scenarios = [json.load(f)]
+    else:
+        scenarios = [generate_scenario(int(count), args.minutes, args.seed) for count in args.creators.split(",")]
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump(scenarios[-1], f, ensure_ascii=False, indent=2)
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="streambot-eventsub-")
+    os.chdir(workdir)
+    persist._json_stores.clear()
+    try:
+        eventsub_ok = report_eventsub(asyncio.run(check_eventsub()))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for scenario in scenarios:
+        # Каждый прогон — в своём каталоге, чтобы базы и кэши не пересекались
+        workdir = tempfile.mkdtemp(prefix="streambot-harness-")
+        os.chdir(workdir)
+        persist._json_stores.clear()
+        try:
+            report(asyncio.run(simulate(scenario, args.seed)))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+    if not eventsub_ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
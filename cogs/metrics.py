@@ -0,0 +1,53 @@
+import disnake
+from aiohttp import web
+from disnake.ext import commands
+from utils import metrics
+from utils.webserver import WebServer
+
+# Отдаёт метрики всех cogs в текстовом формате Prometheus на отдельном веб-сервере
+# (не на общем сервере вебхуков, по умолчанию 127.0.0.1) и краткую сводку
+# по слэш-команде /metrics (только для администраторов).
+class Metrics(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.config = metrics.load_config()
+        self.enabled = self.config["enabled"]
+        self.ready = False
+
+        if self.enabled:
+            # Сервер переживает перезагрузку cog и останавливается вместе с ботом
+            self.server = getattr(bot, "metrics_server", None)
+            if self.server is None:
+                self.server = bot.metrics_server = WebServer({
+                    "host": self.config["host"],
+                    "port": self.config["port"],
+                })
+            self.server.add_route("GET", self.config["path"], self.handle)
+
+    def cog_unload(self):
+        if self.enabled:
+            self.server.remove_route("GET", self.config["path"])
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if not self.enabled or self.ready:
+            return
+        self.ready = True
+        await self.server.start()
+
+    async def handle(self, request):
+        return web.Response(
+            body=metrics.registry.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    @commands.slash_command(
+        name="metrics",
+        description="Сводка по опросам, запросам к API и задержке анонсов",
+        default_member_permissions=disnake.Permissions(administrator=True)
+    )
+    async def metrics_summary(self, inter):
+        await inter.response.send_message(f"```\n{metrics.format_summary()[:1900]}\n```", ephemeral=True)
+
+def setup(bot):
+    bot.add_cog(Metrics(bot))
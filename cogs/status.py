@@ -0,0 +1,153 @@
+import disnake
+import time
+from disnake.ext import commands
+from utils import metrics
+from utils.snapshots import get_snapshots
+
+def ago(seconds):
+    if seconds < 90:
+        return f"{seconds:.0f} с назад"
+    if seconds < 90 * 60:
+        return f"{seconds / 60:.0f} мин назад"
+    return f"{seconds / 3600:.1f} ч назад"
+
+def freshness(snapshot):
+    origin = "по запросу" if snapshot.origin == "refresh" else "опрос"
+    line = f"-# обновлено {ago(snapshot.age)} ({origin})"
+    if not snapshot.fresh:
+        line += " · ⚠️ данные устарели"
+    return line
+
+def video_lines(videos):
+    lines = []
+    for video in videos:
+        when = f" · <t:{int(video['published_at'])}:R>" if video.get("published_at") else ""
+        lines.append(f"• [{video['title'] or 'Без названия'}]({video['url']}){when}")
+    return lines or ["Видео пока нет."]
+
+# Слэш-команды /status: отвечают из общего кэша снимков (utils/snapshots.py),
+# который наполняют опросы. К API обращаются, только если снимок устарел, и
+# одновременные команды по одному каналу ждут один общий запрос.
+class Status(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.snapshots = get_snapshots(bot)
+
+    def twitch_logins(self):
+        watcher = getattr(self.bot, "stream_watcher", None)
+        return watcher.logins if watcher is not None else self.snapshots.names("twitch")
+
+    async def reply(self, inter, key, render):
+        # Обновление может занять до таймаута HTTP — в таком случае сначала откладываем ответ
+        if not self.snapshots.needs_refresh(key):
+            snapshot = self.snapshots.get(key)
+            text = render(snapshot) + "\n" + freshness(snapshot) if snapshot else "Данных ещё нет: опрос не прошёл ни разу."
+            await inter.response.send_message(text, ephemeral=True)
+            return
+        await inter.response.defer(ephemeral=True)
+        snapshot = await self.snapshots.fetch(key)
+        text = render(snapshot) + "\n" + freshness(snapshot) if snapshot else "Данных нет, а источник сейчас не отвечает."
+        await inter.edit_original_response(text)
+
+    def pick(self, names, name):
+        if name:
+            return name.lower()
+        return names[0] if len(names) == 1 else None
+
+    @commands.slash_command(
+        name="status",
+        description="Состояние источников без запросов к их API",
+        default_member_permissions=disnake.Permissions(administrator=True)
+    )
+    async def status(self, inter):
+        pass
+
+    @status.sub_command(name="stream", description="Идёт ли стрим на канале Twitch")
+    async def stream(self, inter, login: str = None):
+        login = self.pick(self.twitch_logins(), login)
+        if login is None or login not in self.twitch_logins():
+            await inter.response.send_message("Укажите канал из config/twitch.json.", ephemeral=True)
+            return
+
+        def render(snapshot):
+            stream = snapshot.value
+            if not stream["live"]:
+                return f"⚪ **{login}** не в эфире"
+            started = metrics.to_timestamp(stream.get("started_at"))
+            line = f"🔴 **{login}** в эфире: {stream.get('title') or 'Без названия'}"
+            line += f"\n🕹 {stream.get('game') or 'Игра не указана'}"
+            if stream.get("viewers") is not None:
+                line += f" · 👀 {stream['viewers']}"
+            if started:
+                line += f" · начался <t:{int(started)}:R>"
+            return line
+
+        await self.reply(inter, f"twitch:{login}", render)
+
+    @status.sub_command(name="clips", description="Последний клип канала Twitch")
+    async def clips(self, inter, login: str = None):
+        login = self.pick(self.snapshots.names("clips"), login)
+        if login is None:
+            await inter.response.send_message("Укажите канал из config/twitch_clips.json.", ephemeral=True)
+            return
+
+        def render(snapshot):
+            clip = snapshot.value["latest"]
+            if clip is None:
+                return f"🎬 У **{login}** за последнее окно проверки клипов не было"
+            views = f" · 👁 {clip['views']}" if clip.get("views") is not None else ""
+            return f"🎬 Последний клип **{login}**: [{clip['title']}]({clip['url']}) · <t:{int(clip['published_at'])}:R>{views}"
+
+        await self.reply(inter, f"clips:{login}", render)
+
+    @status.sub_command(name="youtube", description="Последние загрузки на YouTube")
+    async def youtube(self, inter):
+        names = self.snapshots.names("youtube")
+        if not names:
+            await inter.response.send_message("YouTube ещё не опрашивался.", ephemeral=True)
+            return
+        await self.reply(inter, f"youtube:{names[0]}", lambda snapshot: "\n".join(
+            ["📺 Последние видео на YouTube:"] + video_lines(snapshot.value["videos"])
+        ))
+
+    @status.sub_command(name="tiktok", description="Последние видео в TikTok")
+    async def tiktok(self, inter):
+        names = self.snapshots.names("tiktok")
+        if not names:
+            await inter.response.send_message("TikTok ещё не опрашивался.", ephemeral=True)
+            return
+        await self.reply(inter, f"tiktok:{names[0]}", lambda snapshot: "\n".join(
+            [f"🎵 Последние видео @{names[0]}:"] + video_lines(snapshot.value["videos"])
+        ))
+
+    @status.sub_command(name="polls", description="Когда и как прошли последние опросы")
+    async def polls(self, inter):
+        lines = []
+        scheduler = getattr(self.bot, "scheduler", None)
+        for name, job in sorted(scheduler.jobs.items() if scheduler else []):
+            stats = job.stats
+            last = ago(time.time() - stats.last_run) if stats.last_run else "ещё не было"
+            line = f"• {name}: последний {last}, запусков {stats.runs}, ошибок {stats.errors}"
+            if stats.consecutive_errors:
+                line += f" (подряд {stats.consecutive_errors})"
+            lines.append(line)
+        http = getattr(self.bot, "http_client", None)
+        for name, breaker in sorted(http.health.stats().items() if http else []):
+            if breaker["state"] != "closed":
+                lines.append(f"🔌 {name}: недоступен, проверка через {breaker['retry_in']:.0f} с")
+        watchdog = getattr(self.bot, "watchdog", None)
+        if watchdog is not None:
+            stats = watchdog.stats()
+            lines.append(f"🐶 Цикл событий: зависаний {stats['stalls']}, макс. задержка {stats['max_lag'] * 1000:.0f} мс")
+        await inter.response.send_message("\n".join(lines)[:1900] or "Задач нет.", ephemeral=True)
+
+    @stream.autocomplete("login")
+    async def stream_logins(self, inter, value: str):
+        return [login for login in self.twitch_logins() if value.lower() in login][:25]
+
+    @clips.autocomplete("login")
+    async def clip_logins(self, inter, value: str):
+        return [login for login in self.snapshots.names("clips") if value.lower() in login][:25]
+
+def setup(bot):
+    bot.add_cog(Status(bot))
@@ -1,75 +1,123 @@
 import disnake
-import os
 import json
 import random
-from disnake.ext import commands, tasks
-import aiohttp
-
-DB_PATH = "data/video_db_tiktok.json"
+import time
+from disnake.ext import commands
+from utils.cards import get_card_renderer
+from utils.catchup import get_catchup
+from utils.cluster import get_cluster
+from utils.config_watcher import get_config_watcher
+from utils.health import CircuitOpenError
+from utils.http import get_http_client
+from utils.outbox import get_outbox
+from utils.routing import get_router
+from utils.scheduler import get_scheduler
+from utils.seen_store import get_seen_store
+from utils.snapshots import get_snapshots
+from utils.tiktok import TikTokFeed
+
+LEGACY_DB_PATH = "data/video_db_tiktok.json"
 CONFIG_PATH = "config/tiktok.json"
 
 class TikTokNotifier(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.http = get_http_client(bot).acquire()
         self.config = self.load_config()
-        self.video_db_tiktok = self.load_db()
-        self.check_new_videos.start()
+        self.seen = get_seen_store(bot)
+        self.seen.migrate_json("tiktok", LEGACY_DB_PATH, "tiktok", "video_id")
+        self.outbox = get_outbox(bot)
+        self.router = get_router(bot)
+        self.cards = get_card_renderer(bot)
+        self.scheduler = get_scheduler(bot)
+        self.cluster = get_cluster(bot)
+        self.catchup = get_catchup(bot)
+        self.snapshots = get_snapshots(bot)
+        # Каждая страница ленты проходит через тот же токен-бакет TikWM, что и планировщик
+        self.feed = TikTokFeed.from_config(self.http, self.config, bucket=self.scheduler.limiter("tikwm"))
+        self.configure(self.config)
+        self.scheduler.add_job("tiktok", self.check_new_videos, self.interval, provider="tikwm", interval_fn=self.next_interval)
+        get_config_watcher(bot).watch(CONFIG_PATH, self.apply_config, self.validate_config)
+        self.snapshots.register("tiktok", self.refresh_snapshot, self.interval)
+
+    def cog_unload(self):
+        self.scheduler.remove_job("tiktok")
+        self.snapshots.unregister("tiktok")
+        get_config_watcher(self.bot).unwatch(CONFIG_PATH, self.apply_config)
+        self.http.release()
 
     def load_config(self):
         with open(CONFIG_PATH, "r", encoding="utf-8") as f:
             return json.load(f)
 
-    def load_db(self):
-        if not os.path.exists(DB_PATH):
-            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-            with open(DB_PATH, "w", encoding="utf-8") as f:
-                json.dump({"tiktok": [], "messages": []}, f, indent=1)
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if "tiktok" not in data:
-            data["tiktok"] = []
-            with open(DB_PATH, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-        return data
-
-    def save_db(self):
-        with open(DB_PATH, "w", encoding="utf-8") as f:
-            json.dump(self.video_db_tiktok, f, indent=2)
-
-    @tasks.loop(minutes=60)
+    def home(self):
+        # Канал из tiktok.json — маршрут по умолчанию, остальные каналы берутся из routing.json
+        return self.config["discord_channel_id"], self.config.get("mention", "@everyone")
+
+    def configure(self, config):
+        self.config = config
+        # Недавно публиковавшийся автор опрашивается чаще, затихший — с базовым интервалом
+        self.interval = config.get("poll_minutes", 60) * 60
+        self.active_interval = config.get("active_poll_minutes", 10) * 60
+        self.active_window = config.get("active_window_hours", 48) * 3600
+
+    @staticmethod
+    def validate_config(config):
+        if not config.get("username") or not config.get("discord_channel_id"):
+            raise ValueError("нужны username и discord_channel_id")
+
+    def apply_config(self, config, old):
+        # Интервалы и канал Discord действуют со следующего опроса; лента пересоздаётся
+        # только при смене источника, а новый автор опрашивается сразу
+        self.configure(config)
+        feed_keys = ("username", "base_url", "page_size", "max_pages", "cache_ttl_seconds", "retry_budget")
+        if all(config.get(key) == old.get(key) for key in feed_keys):
+            return
+        latest_post = self.feed.latest_post
+        self.feed = TikTokFeed.from_config(self.http, config, bucket=self.scheduler.limiter("tikwm"))
+        if config["username"] == old.get("username"):
+            self.feed.latest_post = latest_post
+            return
+        self.snapshots.clear("tiktok")
+        self.scheduler.add_job("tiktok", self.check_new_videos, self.interval, provider="tikwm", interval_fn=self.next_interval)
+        print(f"♻️ [TikTok] Теперь отслеживается @{config['username']}")
+
+    def next_interval(self):
+        latest = self.feed.latest_post
+        if latest and time.time() - latest < self.active_window:
+            return self.active_interval
+        return self.interval
+
     async def check_new_videos(self):
         username = self.config["username"]
-        channel_id = self.config["discord_channel_id"]
+        if self.cluster and not self.cluster.owns(f"tiktok:{username}"):
+            return
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"https://www.tikwm.com/api/user/posts?unique_id={username}") as resp:
-                    data = await resp.json()
-
-            if data["code"] != 0:
-                print(f"❌ Ошибка от API TikWM: {data['msg']}")
-                return
-
-            all_videos = data["data"]["videos"]
-            new_videos = []
-
-            for video in all_videos:
-                video_id = video["video_id"]
-                if video_id not in self.video_db_tiktok["tiktok"]:
-                    new_videos.append({
-                        "video_id": video_id,
-                        "video_url": f"https://www.tiktok.com/@{username}/video/{video_id}",
-                        "cover": video["cover"],
-                        "title": video["title"]
-                    })
+            self.feed.clear_cache()
+            started = time.time()
+            # Пустая база: берём только первую страницу, а не всю историю автора
+            max_pages = 1 if self.seen.count("tiktok") == 0 else None
+            since = limit = None
+            catching_up = await self.catchup.pending("tiktok")
+            if catching_up:
+                # Первый опрос после простоя: листаем ленту до отметки прошлой успешной проверки
+                max_pages = self.catchup.config["max_pages"]
+                since = await self.catchup.since("tiktok")
+                limit = self.catchup.config["max_items"]
+            pages_before = self.feed.pages_fetched
+            new_videos = await self.feed.fetch_new(lambda ids: self.outbox.filter_new("tiktok", ids), max_pages, since, limit)
+            print(f"📊 TikTok: страниц запрошено {self.feed.pages_fetched - pages_before}, новых видео {len(new_videos)}")
+            await self.catchup.mark("tiktok", started)
+            # Первая страница уже в кэше ленты — снимок для /status без лишнего запроса
+            self.snapshots.put(f"tiktok:{username}", await self.snapshot(), self.next_interval() * 1.2)
 
             if not new_videos:
                 print("Новых видео нет.")
                 return
 
-            channel = self.bot.get_channel(channel_id)
-            if not channel:
-                print("❌ Discord-канал не найден.")
+            if catching_up and self.catchup.wants_digest(len(new_videos)):
+                await self.announce_digest(username, new_videos)
                 return
 
             random_messages = [
@@ -81,30 +129,60 @@ class TikTokNotifier(commands.Cog):
             ]
 
             for video in reversed(new_videos):
+                video_url = self.feed.video_url(video["video_id"])
                 embed_title = f"🎬 {video['title'][:253]}..." if len(video['title']) > 256 else f"🎬 {video['title']}"
                 embed = disnake.Embed(
                     title=embed_title,
-                    description=f"{random.choice(random_messages)}\n\n🔗 [Перейти к видео]({video['video_url']})",
+                    description=f"{random.choice(random_messages)}\n\n🔗 [Перейти к видео]({video_url})",
                     color=disnake.Color.green()
                 )
                 embed.set_image(url=video["cover"])
+                card = await self.cards.attach(embed, video["cover"], video["title"], "TikTok", username, "#25F4EE")
 
-                msg = await channel.send(content="@everyone <@&1350526068494307369>", embed=embed)
-                print(f"✅ Видео TikTok отправлено: {video['title']}")
-
-                self.video_db_tiktok["tiktok"].append(video["video_id"])
-                self.video_db_tiktok["messages"].append({
-                    "video_id": video["video_id"],
-                    "message_id": msg.id
-                })
-                self.save_db()
+                # Отметка "опубликовано" ставится очередью после подтверждённой отправки
+                targets = self.router.resolve("tiktok", username, {"title": video["title"], "url": video_url}, self.home())
+                await self.outbox.enqueue(targets, embed, "tiktok", video["video_id"], video.get("create_time"), card)
+                print(f"📨 Видео TikTok поставлено в очередь: {video['title']} ({len(targets)} канал(ов))")
 
+        except CircuitOpenError:
+            # Предохранитель TikWM разомкнут — не ошибка задачи, пауза у него своя
+            raise
         except Exception as e:
-            print(f"❌ Ошибка при обработке TikTok: {e}")
-
-    @check_new_videos.before_loop
-    async def before_check(self):
-        await self.bot.wait_until_ready()
+            # Пробрасываем, чтобы планировщик увеличил паузу перед следующей попыткой
+            raise RuntimeError(f"Ошибка при обработке TikTok: {e}") from e
+
+    async def snapshot(self):
+        page, _ = await self.feed.fetch_page(0, 0)
+        videos = [video for video in page.get("videos", []) if not video.get("is_top")][:3]
+        return {"videos": [
+            {"title": video["title"], "url": self.feed.video_url(video["video_id"]), "published_at": video.get("create_time")}
+            for video in videos
+        ]}
+
+    async def refresh_snapshot(self, username):
+        # Для команд: одна страница TikWM через тот же кэш ответов и токен-бакет, что и опрос
+        if username != self.config["username"]:
+            return None
+        self.feed.clear_cache()
+        return await self.snapshot()
+
+    async def announce_digest(self, username, videos):
+        # Хвост после простоя — одно сообщение со списком вместо @everyone на каждое видео
+        claimed = set(await self.outbox.claim("tiktok", [video["video_id"] for video in videos]))
+        items = [
+            {"id": video["video_id"], "title": video["title"], "url": self.feed.video_url(video["video_id"]),
+             "published_at": video.get("create_time")}
+            for video in reversed(videos) if video["video_id"] in claimed
+        ]
+        if not items:
+            return
+        routed = [(username, {"title": item["title"], "url": item["url"]}, item) for item in items]
+        for selected, targets in self.router.resolve_digest("tiktok", routed, self.home()):
+            pages = self.catchup.digest_pages(
+                f"🎬 Новые видео в TikTok: {len(selected)}", selected, disnake.Color.green(), videos[0].get("cover")
+            )
+            self.outbox.enqueue_digest(targets, pages, "tiktok", videos[0].get("create_time"))
+        print(f"📦 Дайджест TikTok поставлен в очередь: {len(items)} видео")
 
 def setup(bot):
     bot.add_cog(TikTokNotifier(bot))
@@ -1,133 +1,250 @@
 import disnake
-import aiohttp
 import json
-import os
-from disnake.ext import commands, tasks
-
-DB_PATH = "data/video_db_clips.json"
+import time
+from datetime import datetime, timedelta, timezone
+from disnake.ext import commands
+from utils.endpoints import base_url
+from utils import metrics
+from utils.cards import get_card_renderer
+from utils.catchup import get_catchup
+from utils.cluster import get_cluster
+from utils.config_watcher import get_config_watcher
+from utils.http import get_http_client
+from utils.outbox import get_outbox
+from utils.persist import open_json_store
+from utils.routing import get_router
+from utils.scheduler import get_scheduler
+from utils.seen_store import get_seen_store
+from utils.snapshots import get_snapshots
+from utils.twitch_auth import get_twitch_auth
+from utils.twitch_users import BroadcasterDirectory, check_config, config_logins
+
+LEGACY_DB_PATH = "data/video_db_clips.json"
 CONFIG_PATH = "config/twitch_clips.json"
+STATE_PATH = "data/clips_state.json"
+PAGE_SIZE = 100  # максимум /helix/clips за страницу
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 
 class TwitchClipsNotifier(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.http = get_http_client(bot).acquire()
         self.config = self.load_config()
-        self.video_db_clips = self.load_db()
-        self.token = None
-        self.headers = None
-        self.check_new_clips.start()
+        self.seen = get_seen_store(bot)
+        self.seen.migrate_json("clips", LEGACY_DB_PATH, "clips", "clip_id")
+        self.outbox = get_outbox(bot)
+        self.router = get_router(bot)
+        self.cards = get_card_renderer(bot)
+        self.auth = get_twitch_auth(bot, self.config["client_id"], self.config["client_secret"])
+        self.directory = BroadcasterDirectory(self.auth)
+        self.configure(self.config)
+        self.state = open_json_store(STATE_PATH, {"broadcasters": {}})
+        self.scheduler = get_scheduler(bot)
+        self.cluster = get_cluster(bot)
+        self.catchup = get_catchup(bot)
+        self.snapshots = get_snapshots(bot)
+        self.job = self.scheduler.add_job("twitch_clips", self.check_new_clips, 60, provider="twitch")
+        get_config_watcher(bot).watch(CONFIG_PATH, self.apply_config, self.validate_config)
+
+    def cog_unload(self):
+        self.scheduler.remove_job("twitch_clips")
+        get_config_watcher(self.bot).unwatch(CONFIG_PATH, self.apply_config)
+        self.state.flush_sync()
+        self.http.release()
 
     def load_config(self):
         with open(CONFIG_PATH, "r", encoding="utf-8") as f:
             return json.load(f)
 
-    def load_db(self):
-        if not os.path.exists(DB_PATH):
-            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-            with open(DB_PATH, "w", encoding="utf-8") as f:
-                json.dump({"clips": [], "messages": []}, f, indent=2)
-
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if "clips" not in data:
-            data["clips"] = []
-        if "messages" not in data:
-            data["messages"] = []
-
-        return data
-
-    def save_db(self):
-        with open(DB_PATH, "w", encoding="utf-8") as f:
-            json.dump(self.video_db_clips, f, indent=2)
-
-    async def get_oauth_token(self):
-        print("🔑 Получение OAuth токена...")
-        url = "https://id.twitch.tv/oauth2/token"
-        params = {
-            "client_id": self.config["client_id"],
-            "client_secret": self.config["client_secret"],
-            "grant_type": "client_credentials"
-        }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, params=params) as resp:
-                data = await resp.json()
-                print("📦 Ответ Twitch OAuth:", data)
-                self.token = data["access_token"]
-                self.headers = {
-                    "Client-ID": self.config["client_id"],
-                    "Authorization": f"Bearer {self.token}"
-                }
-
-    async def fetch_broadcaster_id(self):
-        login = self.config["broadcaster_login"]
-        url = f"https://api.twitch.tv/helix/users?login={login}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers) as resp:
-                data = await resp.json()
-                return data["data"][0]["id"] if data["data"] else None
-
-    @tasks.loop(minutes=1)
+    def home(self):
+        # Канал из twitch_clips.json — маршрут по умолчанию, остальные каналы берутся из routing.json
+        return self.config["discord_channel_id"], self.config.get("mention", "@everyone")
+
+    @staticmethod
+    def context(clip):
+        # Для фильтров маршрутов: у клипа есть только id игры, без названия
+        return {"title": clip["title"], "url": clip["url"], "game_id": clip.get("game_id")}
+
+    def configure(self, config):
+        self.config = config
+        self.logins = config_logins(config)
+        # Клип попадает в API с задержкой, поэтому каждое окно перекрывает предыдущее
+        self.overlap = timedelta(minutes=config.get("overlap_minutes", 10))
+        self.max_pages = config.get("max_pages", 20)
+
+    @staticmethod
+    def validate_config(config):
+        check_config(config)
+        if not config.get("discord_channel_id"):
+            raise ValueError("не задан discord_channel_id")
+
+    def apply_config(self, config, old):
+        # Задача планировщика не перезапускается: следующая проверка просто возьмёт новый список каналов
+        removed = set(self.logins) - set(config_logins(config))
+        self.configure(config)
+        if (config["client_id"], config["client_secret"]) != (old.get("client_id"), old.get("client_secret")):
+            self.auth = self.directory.auth = get_twitch_auth(self.bot, config["client_id"], config["client_secret"])
+        broadcasters = self.state.data["broadcasters"]
+        for broadcaster_id in [key for key, state in broadcasters.items() if state.get("login") in removed]:
+            del broadcasters[broadcaster_id]
+        for login in removed:
+            self.snapshots.forget(f"clips:{login}")
+        if removed:
+            self.state.mark_dirty()
+
     async def check_new_clips(self):
         print("🔁 check_new_clips: запуск проверки...")
-        if not self.headers:
-            await self.get_oauth_token()
 
-        broadcaster_id = await self.fetch_broadcaster_id()
-        if not broadcaster_id:
-            print("❌ Ошибка: не удалось получить broadcaster_id.")
+        # В кластере каждый воркер проверяет только свою долю каналов
+        logins = self.cluster.filter_owned(self.logins) if self.cluster else self.logins
+        if not logins:
+            print("📭 check_new_clips: все каналы сейчас у других воркеров.")
             return
-
-        url = f"https://api.twitch.tv/helix/clips?broadcaster_id={broadcaster_id}&first=5"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers) as resp:
-                data = await resp.json()
-
-        if "data" not in data:
-            print("❌ Нет поля 'data' в ответе Twitch API")
+        # id каналов берутся из постоянного кэша, /users дёргается только для новых логинов
+        ids = await self.directory.resolve(logins)
+        if not ids:
+            print("❌ Ошибка: не удалось получить broadcaster_id.")
             return
 
-        new_clips = []
-        for clip in data["data"]:
-            clip_id = clip["id"]
-            if clip_id not in self.video_db_clips["clips"]:
-                print(f"🆕 Найден новый клип: {clip['title']}")
-                self.video_db_clips["clips"].append(clip_id)
-                new_clips.append({
-                    "id": clip_id,
-                    "title": clip["title"],
-                    "url": clip["url"],
-                    "thumbnail_url": clip["thumbnail_url"]
-                })
-
-        channel = self.bot.get_channel(self.config["discord_channel_id"])
-        if not channel:
-            print("❌ Канал Discord не найден!")
+        started = time.time()
+        catching_up = await self.catchup.pending("clips")
+        # После долгого простоя окно не уходит дальше max_age_hours
+        floor = datetime.fromtimestamp(await self.catchup.since("clips"), timezone.utc) if catching_up else None
+
+        # /helix/clips принимает только один broadcaster_id за запрос
+        found = []
+        pages = 0
+        for login, broadcaster_id in ids.items():
+            clips, fetched = await self.check_broadcaster(login, broadcaster_id, floor)
+            found.extend((login, clip) for clip in clips)
+            pages += fetched
+        print(f"📊 check_new_clips: новых клипов {len(found)}, страниц запрошено {pages}")
+
+        # Старые клипы раньше, чтобы в канале сохранялся хронологический порядок
+        found.sort(key=lambda item: item[1]["created_at"])
+        if catching_up and self.catchup.wants_digest(len(found)):
+            await self.announce_digest(found)
+        else:
+            for login, clip in found:
+                await self.announce(login, clip)
+        await self.catchup.mark("clips", started)
+
+    async def announce(self, login, clip):
+        print(f"🆕 Найден новый клип: {clip['title']}")
+        embed = disnake.Embed(
+            title="🎬 Новый клип на Twitch!",
+            description=f"**{clip['title']}**\n[➡️ Смотреть]({clip['url']})",
+            color=disnake.Color.purple()
+        )
+        embed.set_image(url=clip["thumbnail_url"])
+        user = self.directory.get(login) or {}
+        card = await self.cards.attach(embed, clip["thumbnail_url"], clip["title"], "Клип", user.get("display_name", login))
+
+        # Клип отмечается опубликованным только после подтверждённой отправки
+        targets = self.router.resolve("clips", login, self.context(clip), self.home())
+        await self.outbox.enqueue(targets, embed, "clips", clip["id"], clip.get("created_at"), card)
+        print(f"📨 Клип поставлен в очередь: {clip['title']} ({len(targets)} канал(ов))")
+
+    async def announce_digest(self, found):
+        # Хвост после простоя — одно сообщение со списком вместо @everyone на каждый клип
+        claimed = set(await self.outbox.claim("clips", [clip["id"] for _, clip in found]))
+        routed = [
+            (login, self.context(clip), {
+                "id": clip["id"], "title": f"{(self.directory.get(login) or {}).get('display_name', login)}: {clip['title']}",
+                "url": clip["url"], "published_at": metrics.to_timestamp(clip.get("created_at")),
+            })
+            for login, clip in found if clip["id"] in claimed
+        ]
+        if not routed:
             return
+        # Каналы с одинаковым набором клипов получают одни и те же страницы
+        for selected, targets in self.router.resolve_digest("clips", routed, self.home()):
+            pages = self.catchup.digest_pages(
+                f"🎬 Новые клипы на Twitch: {len(selected)}", selected, disnake.Color.purple(), found[-1][1]["thumbnail_url"]
+            )
+            self.outbox.enqueue_digest(targets, pages, "clips", found[-1][1].get("created_at"))
+        print(f"📦 Дайджест клипов поставлен в очередь: {len(routed)} клипов")
+
+    async def fetch_window(self, broadcaster_id, started_at, ended_at):
+        # /helix/clips сортирует по просмотрам, а не по дате, поэтому окно
+        # выбирается целиком, страница за страницей по курсору
+        clips = []
+        cursor = None
+        pages = 0
+        while pages < self.max_pages:
+            params = {
+                "broadcaster_id": broadcaster_id,
+                "started_at": started_at.strftime(TIME_FORMAT),
+                "ended_at": ended_at.strftime(TIME_FORMAT),
+                "first": PAGE_SIZE,
+            }
+            if cursor:
+                params["after"] = cursor
+            data = await self.auth.request("GET", f"{base_url('twitch_helix')}/clips", params=params)
+            pages += 1
+            if "data" not in data:
+                raise RuntimeError(f"Нет поля 'data' в ответе Twitch API: {data}")
+            clips.extend(data["data"])
+            cursor = data.get("pagination", {}).get("cursor")
+            if not cursor or not data["data"]:
+                break
+        else:
+            print(f"⚠️ Достигнут предел в {self.max_pages} страниц клипов, остаток придёт со следующим окном.")
+            return clips, pages, False
+        return clips, pages, True
+
+    async def check_broadcaster(self, login, broadcaster_id, floor=None):
+        state = self.state.data["broadcasters"].setdefault(broadcaster_id, {"login": login})
+        now = datetime.fromtimestamp(time.time(), timezone.utc)
+        started = state.get("started_at")
+        if self.cluster is not None:
+            # Отметка общая: канал, переехавший с другого воркера, продолжает с его окна
+            started = await self.cluster.checkpoint(f"clips:{broadcaster_id}") or started
+        if started:
+            mark = datetime.strptime(started, TIME_FORMAT).replace(tzinfo=timezone.utc)
+        else:
+            # Первый запуск: не вываливаем всю историю канала, начинаем с текущего момента
+            mark = now
+        if floor is not None:
+            mark = max(mark, floor)
+        started_at = mark - self.overlap
+
+        clips, pages, complete = await self.fetch_window(broadcaster_id, started_at, now)
+        self.update_snapshot(login, clips)
+
+        new_ids = set(await self.outbox.filter_new("clips", [clip["id"] for clip in clips]))
+        new_clips = {}
+        for clip in clips:
+            if clip["id"] in new_ids:
+                new_clips[clip["id"]] = clip
 
         if not new_clips:
-            print("📭 Новых клипов нет.")
+            print(f"📭 [{login}] Новых клипов нет.")
+
+        # Отметка двигается только после полностью выбранного окна; при обрыве
+        # на пределе страниц окно повторится, а дубли отсеет filter_new
+        if complete:
+            state["login"] = login
+            state["started_at"] = now.strftime(TIME_FORMAT)
+            self.state.mark_dirty()
+            if self.cluster is not None:
+                await self.cluster.set_checkpoint(f"clips:{broadcaster_id}", state["started_at"])
+        return list(new_clips.values()), pages
+
+    def update_snapshot(self, login, clips):
+        # Последний клип канала для /status; без новых клипов снимок просто освежается
+        key = f"clips:{login}"
+        ttl = self.job.interval * 1.2 + 5
+        latest = max(clips, key=lambda clip: clip["created_at"], default=None)
+        if latest is None and self.snapshots.get(key) is not None:
+            self.snapshots.touch(key, ttl)
             return
-
-        for clip in reversed(new_clips):
-            embed = disnake.Embed(
-                title="🎬 Новый клип на Twitch!",
-                description=f"**{clip['title']}**\n[➡️ Смотреть]({clip['url']})",
-                color=disnake.Color.purple()
-            )
-            embed.set_image(url=clip["thumbnail_url"])
-
-            msg = await channel.send(content="@everyone", embed=embed)
-            self.video_db_clips["messages"].append({
-                "clip_id": clip["id"],
-                "message_id": msg.id
-            })
-            print(f"✅ Клип отправлен: {clip['title']}")
-
-        self.save_db()
-
-    @check_new_clips.before_loop
-    async def before_check(self):
-        await self.bot.wait_until_ready()
+        self.snapshots.put(key, {"latest": latest and {
+            "title": latest["title"],
+            "url": latest["url"],
+            "published_at": metrics.to_timestamp(latest["created_at"]),
+            "views": latest.get("view_count"),
+        }}, ttl)
 
 def setup(bot):
     bot.add_cog(TwitchClipsNotifier(bot))
@@ -0,0 +1,115 @@
+import json
+from disnake.ext import commands
+from utils.config_watcher import get_config_watcher
+from utils.endpoints import base_url
+from utils.eventsub import EventSubWebhook, ensure_subscriptions
+from utils.twitch_auth import get_twitch_auth
+from utils.twitch_users import BroadcasterDirectory, config_logins
+from utils.webserver import get_web_server
+
+CONFIG_PATH = "config/twitch.json"
+ROUTE = "/twitch/eventsub"
+
+# Принимает stream.online / stream.offline от Twitch EventSub и рассылает их
+# событиями бота: on_twitch_stream_online(stream) и on_twitch_stream_offline(login).
+# Опрос в TwitchNotifier / TwitchToTelegram остаётся медленной страховкой.
+class TwitchEventSub(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.ready = False
+        self.started = False
+        self.configure(self.config)
+        get_config_watcher(bot).watch(CONFIG_PATH, self.apply_config)
+
+    def configure(self, config):
+        self.config = config
+        self.settings = config.get("eventsub", {})
+        self.enabled = self.settings.get("enabled", False)
+        if self.enabled:
+            self.auth = get_twitch_auth(self.bot, config["client_id"], config["client_secret"])
+            self.directory = BroadcasterDirectory(self.auth)
+            self.server = get_web_server(self.bot)
+            self.webhook = EventSubWebhook(self.settings["secret"], self.on_event)
+            self.server.add_route("POST", self.settings.get("path", ROUTE), self.webhook.handle)
+
+    def cog_unload(self):
+        get_config_watcher(self.bot).unwatch(CONFIG_PATH, self.apply_config)
+        if self.enabled:
+            self.server.remove_route("POST", self.settings.get("path", ROUTE))
+
+    async def apply_config(self, config, old):
+        # Блок eventsub поменялся — перевешиваем маршрут и подписки на лету;
+        # поменялись только каналы — досоздаём подписки для новых
+        if config.get("eventsub", {}) != self.settings or config.get("client_id") != old.get("client_id"):
+            if self.enabled:
+                self.server.remove_route("POST", self.settings.get("path", ROUTE))
+            self.configure(config)
+            self.started = False
+        elif config_logins(config) != config_logins(old):
+            self.config = config
+            self.started = False
+        else:
+            self.config = config
+            return
+        if self.ready:
+            await self.start()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.ready = True
+        await self.start()
+
+    async def start(self):
+        if not self.enabled or self.started:
+            return
+        self.started = True
+        await self.server.start()
+
+        if not self.settings.get("subscribe", True):
+            return
+        try:
+            ids = await self.directory.resolve(config_logins(self.config))
+            await ensure_subscriptions(
+                self.auth,
+                list(ids.values()),
+                self.settings["callback_url"],
+                self.settings["secret"]
+            )
+        except Exception as e:
+            print(f"❌ [EventSub] Ошибка при создании подписок: {e}")
+
+    async def fetch_stream(self, event):
+        # В stream.online нет названия и игры — берём их из /channels одним запросом
+        login = event["broadcaster_user_login"]
+        stream = {
+            "id": event["id"],
+            "user_id": event["broadcaster_user_id"],
+            "user_login": login,
+            "title": "",
+            "game_name": "",
+            "viewer_count": 0,
+            "started_at": event.get("started_at"),
+            "thumbnail_url": f"https://static-cdn.jtvnw.net/previews-ttv/live_user_{login}-{{width}}x{{height}}.jpg"
+        }
+        try:
+            data = await self.auth.request("GET", f"{base_url('twitch_helix')}/channels", params={"broadcaster_id": event["broadcaster_user_id"]})
+            if data.get("data"):
+                stream["title"] = data["data"][0]["title"]
+                stream["game_name"] = data["data"][0]["game_name"]
+        except Exception as e:
+            print(f"⚠️ [EventSub] Не удалось получить данные канала: {e}")
+        return stream
+
+    async def on_event(self, sub_type, event):
+        login = event["broadcaster_user_login"]
+        if sub_type == "stream.online":
+            print(f"📡 [EventSub] {login} начал стрим")
+            self.bot.dispatch("twitch_stream_online", await self.fetch_stream(event))
+        elif sub_type == "stream.offline":
+            print(f"📡 [EventSub] {login} завершил стрим")
+            self.bot.dispatch("twitch_stream_offline", login)
+
+def setup(bot):
+    bot.add_cog(TwitchEventSub(bot))
@@ -0,0 +1,57 @@
+import disnake
+import signal
+import asyncio
+from disnake.ext import commands
+from utils.watchdog import get_watchdog
+
+# Сторож цикла событий и профайлер (utils/watchdog.py). Профиль включается
+# и выключается слэш-командой /profile (только владелец бота) или сигналом
+# SIGUSR2; результат — файл свёрнутых стеков для flamegraph.pl / speedscope.
+class Watchdog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.watchdog = get_watchdog(bot)
+        self.ready = False
+        # Перезагрузка расширения на работающем боте: on_ready уже не придёт
+        if bot.is_ready():
+            self.activate()
+
+    def cog_unload(self):
+        self.watchdog.stop()
+        try:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR2)
+        except (RuntimeError, NotImplementedError, AttributeError):
+            pass
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.activate()
+
+    def activate(self):
+        if self.ready:
+            return
+        self.ready = True
+        if self.watchdog.config["enabled"]:
+            self.watchdog.start()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, self.watchdog.toggle_profile)
+        except (NotImplementedError, AttributeError):
+            pass  # Windows: только через /profile
+
+    @commands.slash_command(
+        name="profile",
+        description="Запустить или остановить профайлер цикла событий",
+        default_member_permissions=disnake.Permissions(administrator=True)
+    )
+    @commands.is_owner()
+    async def profile(self, inter, action: str = commands.Param(choices=["start", "stop"])):
+        if action == "start":
+            started = self.watchdog.start_profile()
+            text = "🔬 Профайлер запущен" if started else "Профайлер уже работает"
+        else:
+            path = self.watchdog.stop_profile()
+            text = f"🔬 Профиль сохранён: `{path}`" if path else "Профайлер не запущен"
+        await inter.response.send_message(text, ephemeral=True)
+
+def setup(bot):
+    bot.add_cog(Watchdog(bot))
@@ -1,112 +1,208 @@
 import disnake
-from disnake.ext import commands, tasks
-import aiohttp
+from disnake.ext import commands
 import json
-import os
-
-DB_PATH = "data/video_db_youtube.json"
+import asyncio
+import time
+from utils import metrics
+from utils.cards import get_card_renderer
+from utils.catchup import get_catchup
+from utils.cluster import get_cluster
+from utils.config_watcher import get_config_watcher
+from utils.http import get_http_client
+from utils.outbox import get_outbox
+from utils.routing import get_router
+from utils.scheduler import get_scheduler
+from utils.seen_store import get_seen_store
+from utils.snapshots import get_snapshots
+from utils.webserver import get_web_server
+from utils.youtube import YouTubeFeed, WebSubReceiver
+
+LEGACY_DB_PATH = "data/video_db_youtube.json"
 CONFIG_PATH = "config/youtube.json"
 
 class YouTubeNotifier(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.http = get_http_client(bot).acquire()
         self.config = self.load_config()
-        self.video_db_youtube = self.load_db()
-        self.check_new_videos.start()
+        self.seen = get_seen_store(bot)
+        self.seen.migrate_json("youtube", LEGACY_DB_PATH, "youtube", "video_id")
+        self.outbox = get_outbox(bot)
+        self.router = get_router(bot)
+        self.cards = get_card_renderer(bot)
+        self.announce_lock = asyncio.Lock()
+        self.cluster = get_cluster(bot)
+        self.catchup = get_catchup(bot)
+        self.scheduler = get_scheduler(bot)
+        self.snapshots = get_snapshots(bot)
+        self.setup_feed()
+        self.scheduler.add_job("youtube", self.check_new_videos, self.interval, provider="youtube", interval_fn=self.next_interval)
+        get_config_watcher(bot).watch(CONFIG_PATH, self.apply_config)
+
+    def setup_feed(self, quota=None):
+        self.feed = None
+        if self.config.get("channel_id"):
+            self.feed = YouTubeFeed(
+                self.http, self.config["channel_id"], self.config.get("api_key"), quota, self.scheduler.limiter("youtube")
+            )
+
+        # WebSub: хаб сам присылает новые загрузки, опрос остаётся страховкой
+        self.websub = None
+        interval = 600
+        websub = self.config.get("websub", {})
+        if self.feed and websub.get("enabled"):
+            self.websub = WebSubReceiver(
+                self.http, self.feed.feed_url, websub["callback_url"], websub["secret"], self.announce
+            )
+            self.websub_path = websub.get("path", "/youtube/websub")
+            self.server = get_web_server(self.bot)
+            self.server.add_route("GET", self.websub_path, self.websub.handle_verify)
+            self.server.add_route("POST", self.websub_path, self.websub.handle_notify)
+            interval = websub.get("fallback_poll_minutes", 30) * 60
+        self.interval = interval
+        if self.feed:
+            self.snapshots.register("youtube", self.refresh_snapshot, self.interval)
+
+    def remove_websub(self):
+        if self.websub:
+            self.server.remove_route("GET", self.websub_path)
+            self.server.remove_route("POST", self.websub_path)
+            self.websub = None
+
+    def cog_unload(self):
+        self.scheduler.remove_job("youtube")
+        self.snapshots.unregister("youtube")
+        get_config_watcher(self.bot).unwatch(CONFIG_PATH, self.apply_config)
+        self.remove_websub()
+        self.http.release()
+
+    def apply_config(self, config, old):
+        # Канал Discord читается при каждом анонсе; фид и WebSub пересобираются,
+        # только если поменялся сам источник. Квота за сутки переносится в новый фид
+        self.config = config
+        if all(config.get(key) == old.get(key) for key in ("channel_id", "api_key", "websub")):
+            return
+        quota = self.feed.quota if self.feed else None
+        self.snapshots.clear("youtube")
+        self.remove_websub()
+        self.setup_feed(quota)
+        self.scheduler.add_job("youtube", self.check_new_videos, self.interval, provider="youtube", interval_fn=self.next_interval)
+        print(f"♻️ [YouTube] Источник обновлён: {config.get('channel_id') or 'не задан'}")
 
     def load_config(self):
         with open(CONFIG_PATH, "r", encoding="utf-8") as f:
             return json.load(f)
 
-    def load_db(self):
-        if not os.path.exists(DB_PATH):
-            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-            with open(DB_PATH, "w", encoding="utf-8") as f:
-                json.dump({"youtube": [], "messages": []}, f, indent=2)
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+    def home(self):
+        # Канал из youtube.json — маршрут по умолчанию, остальные каналы берутся из routing.json
+        return self.config["discord_channel_id"], self.config.get("mention", "@everyone")
 
-    def save_db(self):
-        with open(DB_PATH, "w", encoding="utf-8") as f:
-            json.dump(self.video_db_youtube, f, indent=2)
+    def next_interval(self):
+        # Когда дневная квота почти израсходована, опрашиваем в 4 раза реже
+        if self.feed:
+            spent = sum(self.feed.quota.spent.values())
+            if spent > self.config.get("daily_quota", 10000) * 0.8:
+                return self.interval * 4
+        return self.interval
 
-    @tasks.loop(minutes=10)
     async def check_new_videos(self):
-        channel_id = self.config.get("channel_id")
-        api_key = self.config.get("api_key")
-        discord_channel_id = self.config.get("discord_channel_id")
-
-        if not channel_id or not api_key or not discord_channel_id:
-            print("❌ Не указан channel_id, api_key или discord_channel_id в config/youtube.json")
+        if not self.feed or not self.config.get("discord_channel_id"):
+            print("❌ Не указан channel_id или discord_channel_id в config/youtube.json")
             return
 
-        url = (
-            f"https://www.googleapis.com/youtube/v3/search"
-            f"?key={api_key}&channelId={channel_id}"
-            f"&part=snippet,id&order=date&maxResults=5"
-        )
-
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    data = await resp.json()
-                    if resp.status != 200:
-                        print(f"❌ Ошибка от YouTube API ({resp.status}): {data}")
-                        return
-        except Exception as e:
-            print(f"❌ Ошибка при запросе к YouTube API: {e}")
+        # В кластере канал опрашивает один воркер; уведомления WebSub дедуплицирует очередь
+        if self.cluster and not self.cluster.owns(f"youtube:{self.config['channel_id']}"):
             return
 
-        if "items" not in data:
-            print("❌ Нет поля 'items' в ответе YouTube API.")
-            return
-
-        new_items = [
-            item for item in data["items"]
-            if item["id"]["kind"] == "youtube#video"
-            and item["id"]["videoId"] not in self.video_db_youtube["youtube"]
+        if self.websub:
+            await self.server.start()
+            if self.websub.needs_renewal():
+                await self.websub.subscribe()
+
+        # Ошибки запроса уходят в планировщик, он увеличит паузу перед повтором
+        started = time.time()
+        videos = await self.feed.fetch()
+        # Пустой ответ — 304 от RSS: последние загрузки те же, снимок просто свежий
+        if videos:
+            self.snapshots.put(f"youtube:{self.feed.channel_id}", self.snapshot(videos), self.next_interval() * 1.2)
+        else:
+            self.snapshots.touch(f"youtube:{self.feed.channel_id}", self.next_interval() * 1.2)
+
+        if await self.catchup.pending("youtube"):
+            # Первый опрос после запуска: всё, что вышло с прошлой успешной проверки
+            config = self.catchup.config
+            videos = await self.feed.backfill(videos, await self.catchup.since("youtube"), config["max_items"], config["max_pages"])
+            await self.announce(videos, catch_up=True)
+        else:
+            await self.announce(videos[:5])
+        await self.catchup.mark("youtube", started)
+
+    @staticmethod
+    def snapshot(videos):
+        return {"videos": [
+            {"title": video["title"], "url": video["url"], "published_at": metrics.to_timestamp(video.get("published"))}
+            for video in videos[:3]
+        ]}
+
+    async def refresh_snapshot(self, channel_id):
+        # Для команд: RSS без квоты и без условных заголовков опроса
+        if not self.feed or channel_id != self.feed.channel_id:
+            return None
+        return self.snapshot(await self.feed.fetch_rss(conditional=False))
+
+    async def announce_digest(self, videos):
+        # Хвост после простоя — одно сообщение со списком вместо @everyone на каждое видео
+        claimed = set(await self.outbox.claim("youtube", [video["video_id"] for video in videos]))
+        items = [
+            {"id": video["video_id"], "title": video["title"], "url": video["url"],
+             "published_at": metrics.to_timestamp(video.get("published"))}
+            for video in reversed(videos) if video["video_id"] in claimed
         ]
-
-        if not new_items:
-            print("📭 Нет новых видео для отправки.")
+        if not items:
             return
-
-        channel = self.bot.get_channel(discord_channel_id)
-        if not channel:
-            print("❌ Не удалось найти канал Discord.")
-            return
-
-        for item in reversed(new_items):
-            video_id = item["id"]["videoId"]
-            title = item["snippet"]["title"]
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-            thumbnail = item["snippet"]["thumbnails"]["high"]["url"]
-
-            embed = disnake.Embed(
-                title="📺 Новое видео на YouTube!",
-                description=f"**{title}**\nСмотри сейчас 👉 [перейти к видео]({video_url})",
-                color=disnake.Color.red()
+        routed = [(self.feed.channel_id, {"title": item["title"], "url": item["url"]}, item) for item in items]
+        for selected, targets in self.router.resolve_digest("youtube", routed, self.home()):
+            pages = self.catchup.digest_pages(
+                f"📺 Новые видео на YouTube: {len(selected)}", selected, disnake.Color.red(), videos[0]["thumbnail"]
             )
-            embed.set_image(url=thumbnail)
-
-            try:
-                sent = await channel.send(content="@everyone <@&1350526068494307369>", embed=embed)
-                print(f"✅ Видео отправлено: {title}")
-
-                # Только после успешной отправки — сохраняем в базу
-                self.video_db_youtube["youtube"].append(video_id)
-                self.video_db_youtube["messages"].append({
-                    "video_id": video_id,
-                    "message_id": sent.id
-                })
-                self.save_db()
-
-            except Exception as e:
-                print(f"❌ Ошибка при отправке видео {video_id}: {e}")
-
-    @check_new_videos.before_loop
-    async def before_check(self):
-        await self.bot.wait_until_ready()
+            self.outbox.enqueue_digest(targets, pages, "youtube", videos[0].get("published"))
+        print(f"📦 Дайджест YouTube поставлен в очередь: {len(items)} видео")
+
+    async def announce(self, videos, catch_up=False):
+        async with self.announce_lock:
+            new_ids = set(await self.outbox.filter_new("youtube", [video["video_id"] for video in videos]))
+            new_videos = [video for video in videos if video["video_id"] in new_ids]
+
+            if not new_videos:
+                print("📭 Нет новых видео для отправки.")
+                return
+
+            if self.config.get("enrich"):
+                new_videos = await self.feed.enrich(new_videos)
+
+            if catch_up and self.catchup.wants_digest(len(new_videos)):
+                await self.announce_digest(new_videos)
+                return
+
+            for video in reversed(new_videos):
+                video_id = video["video_id"]
+                title = video["title"]
+
+                embed = disnake.Embed(
+                    title="📺 Новое видео на YouTube!",
+                    description=f"**{title}**\nСмотри сейчас 👉 [перейти к видео]({video['url']})",
+                    color=disnake.Color.red()
+                )
+                embed.set_image(url=video["thumbnail"])
+                card = await self.cards.attach(embed, video["thumbnail"], title, "YouTube", video.get("author"), "#FF0000")
+
+                # Эмбед и карточка одни на все каналы; в базу видео попадёт после первой успешной отправки
+                targets = self.router.resolve("youtube", self.feed.channel_id, {"title": title, "url": video["url"]}, self.home())
+                await self.outbox.enqueue(targets, embed, "youtube", video_id, video.get("published"), card)
+                print(f"📨 Видео поставлено в очередь: {title} ({len(targets)} канал(ов))")
+
+            if self.feed.quota.spent:
+                print(self.feed.quota.report())
 
 def setup(bot):
     bot.add_cog(YouTubeNotifier(bot))
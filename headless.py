@@ -0,0 +1,54 @@
+import time
+started = time.perf_counter()
+
+import argparse
+import asyncio
+import signal
+import sys
+from utils.headless import HeadlessBot
+from utils.runtime import StartupTimer
+
+# Безголовый режим: те же cogs и очередь анонсов, но доставка в Discord идёт
+# через вебхуки каналов (config/webhooks.json) без подключения к шлюзу.
+#     python headless.py          — постоянный процесс с планировщиком
+#     python headless.py --once   — один проход всех опросов и выход (для cron)
+
+sys.stdout.reconfigure(encoding='utf-8')
+
+timer = StartupTimer(started)
+timer.mark("импорты")
+
+
+async def main(once):
+    bot = HeadlessBot(asyncio.get_running_loop(), ready=not once)
+    if not bot.webhooks:
+        print("⚠️ config/webhooks.json пуст — отправлять в Discord некуда")
+    timer.mark("конфиги")
+    bot.load_cogs("cogs")
+    timer.mark("загрузка cogs")
+    print(timer.report())
+
+    try:
+        if once:
+            await bot.run_once()
+            return
+
+        bot.dispatch("ready")
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+        scheduler = getattr(bot, "scheduler", None)
+        print(f"✅ Безголовый режим запущен, задач: {len(scheduler.jobs) if scheduler else 0}")
+        await stop.wait()
+    finally:
+        await bot.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Уведомления через вебхуки Discord без подключения к шлюзу")
+    parser.add_argument("--once", action="store_true", help="один проход всех опросов и выход (для cron)")
+    args = parser.parse_args()
+    asyncio.run(main(args.once))
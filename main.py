@@ -1,8 +1,18 @@
+import time
+started = time.perf_counter()
+
 import disnake
 import os
 import sys
 from disnake.ext import commands
 from dotenv import load_dotenv
+from utils import endpoints
+from utils.http import HttpClient
+from utils.persist import flush_all
+from utils.runtime import StartupTimer, bot_options, load_config
+
+timer = StartupTimer(started)
+timer.mark("импорты")
 
 # Устанавливаем кодировку UTF-8 для консоли
 sys.stdout.reconfigure(encoding='utf-8')
@@ -17,15 +27,50 @@ activity = disnake.Activity(
     url="https://twitch.tv/pika_dev"
 )
 
+class StreamBot(commands.Bot):
+    async def close(self):
+        # Дописываем отложенные изменения на диск, закрываем общий HTTP-пул
+        # и веб-сервер вебхуков вместе с ботом
+        # Незаконченный профиль дописывается в файл, потоки сторожа останавливаются
+        watchdog = getattr(self, "watchdog", None)
+        if watchdog is not None:
+            watchdog.stop()
+        await flush_all()
+        web_server = getattr(self, "web_server", None)
+        if web_server is not None:
+            await web_server.stop()
+        metrics_server = getattr(self, "metrics_server", None)
+        if metrics_server is not None:
+            await metrics_server.stop()
+        card_renderer = getattr(self, "card_renderer", None)
+        if card_renderer is not None:
+            card_renderer.close()
+        # Освобождаем аренду сразу, не дожидаясь её истечения: каналы переедут к другим воркерам
+        cluster = getattr(self, "cluster", None)
+        if cluster is not None:
+            cluster.close()
+        await self.http_client.close()
+        await super().close()
+
+# Профиль запуска из config/bot.json: по умолчанию только нужные intents и без кэшей участников и сообщений
+runtime_config = load_config()
+
 # Инициализация бота
-bot = commands.Bot(
-    command_prefix="$",  # Префикс для команд
-    intents=disnake.Intents.all(),
+bot = StreamBot(
     activity=activity,
     reload=True,
-    help_command=None
+    help_command=None,
+    **bot_options(runtime_config, prefix="$")  # Префикс для команд
 )
 
+# Адрес Discord API можно подменить в config/endpoints.json (например, на локальную заглушку)
+if endpoints.is_overridden("discord"):
+    disnake.http.Route.BASE = endpoints.base_url("discord")
+
+# Общий HTTP-клиент для всех cogs (keep-alive пулы, DNS-кэш, таймауты)
+bot.http_client = HttpClient.from_config()
+timer.mark("конфиги")
+
 # Загружаем cogs (расширения)
 def load_cogs(path):
     for file in os.listdir(path):
@@ -37,13 +82,15 @@ def load_cogs(path):
             try:
                 cog_name = os.path.splitext(file)[0]
                 cog_extension = f"cogs.{cog_name}"
+                cog_started = time.perf_counter()
                 bot.load_extension(cog_extension)
-                print(f"[Extension]> {cog_extension} loaded")
+                print(f"[Extension]> {cog_extension} loaded ({(time.perf_counter() - cog_started) * 1000:.0f} мс)")
             except Exception as e:
                 print(f"Error while loading cog > {cog_extension}: {type(e).__name__} - {e}")
 
 # Загрузка всех cogs из папки 'cogs'
 load_cogs("cogs")
+timer.mark("загрузка cogs")
 
 # Событие on_ready, когда бот успешно подключился
 @bot.event
@@ -51,6 +98,10 @@ async def on_ready():
     await bot.change_presence(status=disnake.Status.dnd, activity=activity)
     print(f"{bot.user.name} was successfully launched")
     print(f"Extensions loaded: {len(bot.cogs)}")
+    # on_ready приходит и после переподключений — отчёт печатаем один раз
+    if not timer.reported:
+        timer.mark("подключение к шлюзу")
+        print(timer.report())
 
 # Запуск бота с токеном из .env
 bot.run(os.getenv("TOKEN"))
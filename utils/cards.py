@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.http import get_http_client
+
+try:
+    from PIL import Image, ImageDraw, ImageFont, ImageOps
+except ImportError:  # Pillow необязателен: без него анонсы идут с обычными превью
+    Image = None
+
+CONFIG_PATH = "config/cards.json"
+FONT_PATH = "fonts/BigNoodleTitlingCyr.ttf"
+CARD_VERSION = 1  # меняется вместе с оформлением, чтобы старый кэш не переиспользовался
+CARD_SIZE = (1280, 720)
+
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "cache_dir": "data/cards",
+    "max_cache_mb": 200,
+    "workers": 0,        # 0 — по числу ядер
+    "quality": 88,
+}
+
+
+def is_available():
+    return Image is not None
+
+
+def hex_color(value):
+    value = value.lstrip("#")
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def fit_text(draw, text, font_path, size, max_width, min_size=28):
+    # Уменьшаем кегль, пока строка не влезет, и обрезаем с многоточием в крайнем случае
+    while size > min_size:
+        font = ImageFont.truetype(font_path, size)
+        if draw.textlength(text, font=font) <= max_width:
+            return font, text
+        size -= 4
+    font = ImageFont.truetype(font_path, min_size)
+    while text and draw.textlength(text + "…", font=font) > max_width:
+        text = text[:-1]
+    return font, text + "…"
+
+
+def render_card(path, thumbnail, title, subtitle, creator, accent, font_path=FONT_PATH, quality=88):
+    # Выполняется в отдельном процессе: декодирование, масштабирование и JPEG — чистый CPU
+    width, height = CARD_SIZE
+    card = Image.new("RGB", CARD_SIZE, (18, 18, 24))
+    if thumbnail:
+        try:
+            with Image.open(io.BytesIO(thumbnail)) as source:
+                card.paste(ImageOps.fit(source.convert("RGB"), CARD_SIZE, Image.BILINEAR))
+        except Exception:
+            pass
+
+    # Затемнение снизу под текст
+    shade = Image.linear_gradient("L").resize((width, height // 2))
+    card.paste((0, 0, 0), (0, height - shade.height), shade)
+
+    draw = ImageDraw.Draw(card)
+    color = hex_color(accent)
+    draw.rectangle((0, 0, 14, height), fill=color)
+
+    margin = 56
+    if creator:
+        font, creator = fit_text(draw, creator.upper(), font_path, 48, width // 2)
+        box = draw.textbbox((margin, margin), creator, font=font)
+        draw.rounded_rectangle((box[0] - 18, box[1] - 12, box[2] + 18, box[3] + 12), radius=12, fill=color)
+        draw.text((margin, margin), creator, font=font, fill=(255, 255, 255))
+
+    bottom = height - margin
+    if subtitle:
+        font, subtitle = fit_text(draw, subtitle, font_path, 52, width - margin * 2)
+        bottom -= font.size
+        draw.text((margin, bottom), subtitle, font=font, fill=color)
+        bottom -= 16
+    if title:
+        font, title = fit_text(draw, title, font_path, 96, width - margin * 2, min_size=48)
+        bottom -= font.size
+        draw.text((margin, bottom), title, font=font, fill=(255, 255, 255))
+
+    tmp_path = f"{path}.tmp"
+    card.save(tmp_path, "JPEG", quality=quality, optimize=True)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+# Брендированные карточки анонсов. Рендер идёт в пуле процессов, результат
+# кладётся на диск по хэшу содержимого (превью + тексты), поэтому повторный
+# анонс и рассылка в несколько каналов используют один файл. Кэш ограничен
+# по размеру и вытесняет давно не использованные карточки.
+class CardRenderer:
+    def __init__(self, http, config=None):
+        self.http = http
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.enabled = self.config["enabled"] and is_available()
+        self.cache_dir = self.config["cache_dir"]
+        self.max_bytes = self.config["max_cache_mb"] * 1024 * 1024
+        self.index = OrderedDict()
+        self.total = 0
+        self._inflight = {}
+        self._pool = None
+        if self.config["enabled"] and not is_available():
+            print("⚠️ Карточки анонсов включены, но Pillow не установлен — используем обычные превью.")
+        if self.enabled:
+            self.load_index()
+
+    @classmethod
+    def from_config(cls, http, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(http, config)
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.config["workers"] or None)
+        return self._pool
+
+    def load_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self.index[path] = size
+            self.total += size
+
+    def touch(self, path):
+        self.index.move_to_end(path)
+        try:
+            os.utime(path)  # порядок LRU переживает перезапуск
+        except OSError:
+            pass
+
+    def evict(self):
+        while self.total > self.max_bytes and len(self.index) > 1:
+            path, size = self.index.popitem(last=False)
+            self.total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def card_key(self, thumbnail, title, subtitle, creator, accent):
+        digest = hashlib.sha256()
+        digest.update(str(CARD_VERSION).encode())
+        digest.update(hashlib.sha256(thumbnail or b"").digest())
+        for value in (title, subtitle, creator, accent):
+            digest.update(b"\0" + (value or "").encode())
+        return digest.hexdigest()[:32]
+
+    async def fetch_thumbnail(self, url):
+        if not url:
+            return None
+        try:
+            async with self.http.get(url) as resp:
+                if resp.status == 200:
+                    return await resp.read()
+        except Exception as e:
+            print(f"⚠️ Не удалось скачать превью для карточки: {e}")
+        return None
+
+    async def render(self, thumbnail_url, title, subtitle="", creator="", accent="#9146FF"):
+        if not self.enabled:
+            return None
+        thumbnail = await self.fetch_thumbnail(thumbnail_url)
+        key = self.card_key(thumbnail, title, subtitle, creator, accent)
+        path = os.path.join(self.cache_dir, f"{key}.jpg")
+        if path in self.index and os.path.exists(path):
+            self.touch(path)
+            return path
+
+        # Одна и та же карточка, запрошенная параллельно, рендерится один раз
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(self._render(path, thumbnail, title, subtitle, creator, accent))
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            return await asyncio.shield(future)
+        except Exception as e:
+            print(f"❌ Ошибка рендера карточки: {type(e).__name__} - {e}")
+            return None
+
+    async def _render(self, path, thumbnail, title, subtitle, creator, accent):
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(
+            self.pool, render_card, path, thumbnail, title, subtitle, creator, accent,
+            os.path.abspath(FONT_PATH), self.config["quality"]
+        )
+        self.total += size - self.index.pop(path, 0)
+        self.index[path] = size
+        self.evict()
+        return path
+
+    async def attach(self, embed, thumbnail_url, title, subtitle="", creator="", accent="#9146FF"):
+        # Картинка эмбеда ссылается на вложение; при ошибке эмбед остаётся с исходным превью
+        path = await self.render(thumbnail_url, title, subtitle, creator, accent)
+        if path is None:
+            return None
+        embed.set_image(url=f"attachment://{os.path.basename(path)}")
+        return {"path": path, "fallback": thumbnail_url}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def get_card_renderer(bot):
+    renderer = getattr(bot, "card_renderer", None)
+    if renderer is None:
+        renderer = bot.card_renderer = CardRenderer.from_config(get_http_client(bot))
+    return renderer
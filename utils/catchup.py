@@ -0,0 +1,109 @@
+import json
+import os
+import time
+
+import disnake
+
+from utils.cluster import get_cluster
+from utils.config_watcher import get_config_watcher
+from utils.persist import open_json_store
+
+CONFIG_PATH = "config/catchup.json"
+STATE_PATH = "data/checkpoints.json"
+
+DEFAULT_CONFIG = {
+    "enabled": True,
+    "digest_threshold": 3,   # пропущено больше — один дайджест вместо отдельных анонсов с @everyone
+    "items_per_embed": 15,
+    "max_items": 150,        # не больше стольких элементов за догонялку на источник
+    "max_pages": 20,
+    "max_age_hours": 72,     # более старое после долгого простоя уже не анонсируем
+    "overlap_seconds": 300,  # источники отдают время с точностью до секунды; повторы отсеет очередь
+}
+
+
+def digest_line(item):
+    title = item["title"] or "Без названия"
+    if len(title) > 80:
+        title = title[:79] + "…"
+    title = title.replace("[", "(").replace("]", ")")
+    line = f"• [{title}]({item['url']})"
+    if item.get("published_at"):
+        line += f" · <t:{int(item['published_at'])}:R>"
+    return line
+
+
+# Догонялка после простоя: для каждого источника хранится время последнего
+# успешного опроса. Первый опрос после запуска выбирает всё, что вышло с этой
+# отметки (с пределами по числу и возрасту), а большой хвост уходит одним
+# дайджестом на канал вместо N отдельных сообщений с упоминаниями.
+class CatchUp:
+    def __init__(self, config=None, cluster=None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.cluster = cluster
+        self.store = open_json_store(STATE_PATH, {"sources": {}})
+        self.done = set()
+
+    @classmethod
+    def from_config(cls, cluster=None, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config, cluster)
+
+    def apply_config(self, config, old=None):
+        self.config = {**DEFAULT_CONFIG, **config}
+
+    async def checkpoint(self, source):
+        if self.cluster is not None:
+            value = await self.cluster.checkpoint(f"catchup:{source}")
+            if value is not None:
+                return float(value)
+        return self.store.data["sources"].get(source)
+
+    async def pending(self, source):
+        # Догоняем один раз за запуск и только если источник уже опрашивался раньше
+        return self.config["enabled"] and source not in self.done and await self.checkpoint(source) is not None
+
+    async def since(self, source):
+        oldest = time.time() - self.config["max_age_hours"] * 3600
+        checkpoint = await self.checkpoint(source)
+        if checkpoint is None:
+            return oldest
+        return max(checkpoint - self.config["overlap_seconds"], oldest)
+
+    async def mark(self, source, timestamp):
+        # timestamp — начало успешного опроса, чтобы вышедшее во время него не потерялось
+        self.done.add(source)
+        self.store.data["sources"][source] = timestamp
+        self.store.mark_dirty()
+        if self.cluster is not None:
+            await self.cluster.set_checkpoint(f"catchup:{source}", str(timestamp))
+
+    def wants_digest(self, count):
+        return count > self.config["digest_threshold"]
+
+    def digest_pages(self, title, items, color, thumbnail=None):
+        # items — [{"id", "title", "url", "published_at"}] от старых к новым; страница — один эмбед
+        size = self.config["items_per_embed"]
+        chunks = [items[start:start + size] for start in range(0, len(items), size)]
+        pages = []
+        for number, chunk in enumerate(chunks, 1):
+            embed = disnake.Embed(
+                title=title if len(chunks) == 1 else f"{title} ({number}/{len(chunks)})",
+                description="\n".join(digest_line(item) for item in chunk),
+                color=color
+            )
+            if number == 1 and thumbnail:
+                embed.set_thumbnail(url=thumbnail)
+            pages.append((embed, [item["id"] for item in chunk]))
+        return pages
+
+
+def get_catchup(bot):
+    catchup = getattr(bot, "catchup", None)
+    if catchup is None:
+        catchup = bot.catchup = CatchUp.from_config(get_cluster(bot))
+        get_config_watcher(bot).watch(CONFIG_PATH, catchup.apply_config)
+    return catchup
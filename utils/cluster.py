@@ -0,0 +1,249 @@
+import asyncio
+import bisect
+import functools
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.scheduler import get_scheduler
+
+CONFIG_PATH = "config/cluster.json"
+
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "path": "data/cluster.sqlite3",   # общий для всех воркеров файл на одной машине / общем томе
+    "worker_id": None,                # по умолчанию <hostname>-<pid>, можно задать WORKER_ID
+    "lease_seconds": 30,              # воркер без heartbeat дольше этого считается мёртвым
+    "heartbeat_seconds": 10,
+    "replicas": 64,                   # виртуальных узлов на воркер в кольце
+}
+
+
+def ring_hash(value):
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+
+
+# Консистентное хэширование: при уходе воркера переезжают только его ключи
+class HashRing:
+    def __init__(self, nodes, replicas=64):
+        self.nodes = sorted(nodes)
+        self.points = sorted((ring_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self.keys = [point for point, _ in self.points]
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        index = bisect.bisect(self.keys, ring_hash(key)) % len(self.points)
+        return self.points[index][1]
+
+
+# Координация нескольких процессов бота через общий SQLite: аренда (heartbeat)
+# определяет живых воркеров, кольцо из живых делит между ними каналы, а таблица
+# claims гарантирует, что каждый элемент анонсирует ровно один воркер. Заявка
+# мёртвого воркера, не успевшего доставить анонс, переходит к живому.
+#
+# sqlite3 блокирует поток, пока ждёт чужую блокировку базы (до timeout), поэтому
+# все запросы идут в одном отдельном потоке, а цикл событий бота только ждёт
+# результат: методы с базой — корутины, кольцо и состав воркеров — в памяти.
+class Cluster:
+    def __init__(self, path, worker_id, lease_seconds=30, replicas=64):
+        self.path = path
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.replicas = replicas
+        self._ring = None
+        self._members = ()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cluster-db")
+        # При создании цикл ещё не обслуживает события — ждём открытия базы прямо здесь
+        self.executor.submit(self._open).result()
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims ("
+            " source TEXT NOT NULL,"
+            " item_id TEXT NOT NULL,"
+            " worker_id TEXT NOT NULL,"
+            " state TEXT NOT NULL,"          # claimed | delivered
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (source, item_id)"
+            ") WITHOUT ROWID"
+        )
+        # Отметки прогресса (окна клипов и т.п.), чтобы новый владелец канала продолжил с того же места
+        self.conn.execute("CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._heartbeat()
+
+    @classmethod
+    def from_config(cls, config):
+        worker_id = os.getenv("WORKER_ID") or config["worker_id"] or f"{socket.gethostname()}-{os.getpid()}"
+        return cls(config["path"], worker_id, config["lease_seconds"], config["replicas"])
+
+    def __repr__(self):
+        return f"<Cluster {self.worker_id} @ {self.path}>"
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def heartbeat(self):
+        await self.run(self._heartbeat)
+
+    def _heartbeat(self):
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO workers (worker_id, heartbeat) VALUES (?, ?) "
+            "ON CONFLICT (worker_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+            (self.worker_id, now)
+        )
+        members = self._live_workers(now)
+        if members != self._members:
+            if self._members:
+                print(f"🔀 [Cluster] Состав воркеров изменился: {', '.join(members)}")
+            self._members = members
+            self._ring = HashRing(members, self.replicas)
+
+    @property
+    def members(self):
+        return self._members
+
+    def _live_workers(self, now=None):
+        now = now or time.time()
+        rows = self.conn.execute(
+            "SELECT worker_id FROM workers WHERE heartbeat > ? ORDER BY worker_id", (now - self.lease_seconds,)
+        )
+        return tuple(row[0] for row in rows)
+
+    def is_live(self, worker_id):
+        return worker_id in self._members
+
+    def owner(self, key):
+        return self._ring.owner(str(key).lower())
+
+    def owns(self, key):
+        return self.owner(key) == self.worker_id
+
+    def filter_owned(self, keys):
+        return [key for key in keys if self.owns(key)]
+
+    async def filter_unclaimed(self, source, item_ids):
+        return await self.run(self._filter_unclaimed, source, item_ids)
+
+    def _filter_unclaimed(self, source, item_ids):
+        item_ids = [str(item_id) for item_id in item_ids]
+        taken = set()
+        for start in range(0, len(item_ids), 500):
+            chunk = item_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT item_id, worker_id, state FROM claims WHERE source = ? AND item_id IN ({placeholders})",
+                (source, *chunk)
+            )
+            for item_id, worker_id, state in rows:
+                # Свои незавершённые заявки (например, после падения до отправки) снова считаются новыми, как и без кластера
+                if state == "delivered" or (worker_id != self.worker_id and self.is_live(worker_id)):
+                    taken.add(item_id)
+        return [item_id for item_id in item_ids if item_id not in taken]
+
+    async def claim(self, source, item_id):
+        return await self.run(self._claim, source, item_id)
+
+    async def claim_all(self, source, item_ids):
+        # Пачка заявок за один переход в поток базы
+        return await self.run(lambda: [item_id for item_id in item_ids if self._claim(source, item_id)])
+
+    def _claim(self, source, item_id):
+        item_id = str(item_id)
+        now = time.time()
+        inserted = self.conn.execute(
+            "INSERT OR IGNORE INTO claims (source, item_id, worker_id, state, updated_at) VALUES (?, ?, ?, 'claimed', ?)",
+            (source, item_id, self.worker_id, now)
+        ).rowcount
+        if inserted:
+            return True
+        row = self.conn.execute(
+            "SELECT worker_id, state FROM claims WHERE source = ? AND item_id = ?", (source, item_id)
+        ).fetchone()
+        worker_id, state = row
+        if worker_id == self.worker_id:
+            return state == "claimed"
+        if state == "delivered" or self.is_live(worker_id):
+            return False
+        # Забираем недоставленное у мёртвого воркера: условие по старому владельцу
+        # не даст двум живым воркерам перехватить заявку одновременно
+        return self.conn.execute(
+            "UPDATE claims SET worker_id = ?, updated_at = ? WHERE source = ? AND item_id = ? AND worker_id = ? AND state = 'claimed'",
+            (self.worker_id, now, source, item_id, worker_id)
+        ).rowcount == 1
+
+    async def holds(self, source, item_ids):
+        return await self.run(lambda: all(self._holds(source, item_id) for item_id in item_ids))
+
+    def _holds(self, source, item_id):
+        row = self.conn.execute(
+            "SELECT worker_id, state FROM claims WHERE source = ? AND item_id = ?", (source, str(item_id))
+        ).fetchone()
+        # Своя доставленная заявка тоже годится: анонс мог уйти в Discord раньше, чем в Telegram
+        return row is None or row[0] == self.worker_id
+
+    async def confirm(self, source, *item_ids):
+        await self.run(lambda: [self._confirm(source, item_id) for item_id in item_ids])
+
+    def _confirm(self, source, item_id):
+        self.conn.execute(
+            "UPDATE claims SET state = 'delivered', updated_at = ? WHERE source = ? AND item_id = ? AND worker_id = ?",
+            (time.time(), source, str(item_id), self.worker_id)
+        )
+
+    async def checkpoint(self, name):
+        return await self.run(self._checkpoint, name)
+
+    def _checkpoint(self, name):
+        row = self.conn.execute("SELECT value FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    async def set_checkpoint(self, name, value):
+        await self.run(self._set_checkpoint, name, value)
+
+    def _set_checkpoint(self, name, value):
+        self.conn.execute(
+            "INSERT INTO checkpoints (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+            (name, value)
+        )
+
+    def _leave(self):
+        self.conn.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+        self.conn.close()
+
+    def close(self):
+        # При остановке: дожидаемся очереди запросов и освобождаем аренду сразу
+        self.executor.submit(self._leave).result()
+        self.executor.shutdown()
+
+
+def load_config(path=CONFIG_PATH):
+    config = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    return {**DEFAULT_CONFIG, **config}
+
+
+def get_cluster(bot):
+    # None — обычный режим одного процесса, все проверки кластера пропускаются
+    if not hasattr(bot, "cluster"):
+        config = load_config()
+        bot.cluster = None
+        if config["enabled"]:
+            bot.cluster = Cluster.from_config(config)
+            print(f"🔀 [Cluster] Воркер {bot.cluster.worker_id}, живых воркеров: {len(bot.cluster.members)}")
+            # Аренду продлеваем и пока бот подключается к Discord: иначе за долгий
+            # коннект она истечёт, и каналы этого воркера заберёт другой
+            get_scheduler(bot).add_job("cluster_heartbeat", bot.cluster.heartbeat, config["heartbeat_seconds"], wait_ready=False)
+    return bot.cluster
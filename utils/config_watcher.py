@@ -0,0 +1,111 @@
+import inspect
+import json
+import os
+
+from utils.scheduler import CONFIG_PATH as SCHEDULER_CONFIG_PATH, get_scheduler, validate_config as validate_scheduler
+
+CONFIG_DIR = "config"
+CHECK_INTERVAL = 5  # можно поменять в scheduler.json: {"jobs": {"config_watch": {"interval": ...}}}
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("ожидается JSON-объект")
+    return config
+
+
+# Горячая перезагрузка config/*.json без перезапуска процесса. Раз в несколько
+# секунд сверяет mtime и размер файлов; изменённый файл разбирается и проверяется
+# валидаторами подписчиков, и только целиком корректный отдаётся подписчикам
+# (новая и прежняя версии), чтобы они применили разницу к работающим задачам.
+# Шлюз, HTTP-пул, кэши и токены при этом не трогаются.
+class ConfigWatcher:
+    def __init__(self, directory=CONFIG_DIR):
+        self.directory = directory
+        self.handlers = {}
+        self.configs = {}
+        self.stamps = self.scan()
+
+    def scan(self):
+        stamps = {}
+        if not os.path.isdir(self.directory):
+            return stamps
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def watch(self, path, handler, validate=None):
+        # handler(config, old) может быть и корутиной; validate(config) бросает ValueError
+        path = os.path.normpath(path)
+        self.handlers.setdefault(path, []).append((handler, validate))
+        if path not in self.configs and os.path.exists(path):
+            try:
+                self.configs[path] = load(path)
+            except (OSError, ValueError):
+                pass
+
+    def unwatch(self, path, handler):
+        path = os.path.normpath(path)
+        self.handlers[path] = [entry for entry in self.handlers.get(path, []) if entry[0] != handler]
+
+    async def check(self):
+        stamps = self.scan()
+        changed = [path for path, stamp in stamps.items() if self.stamps.get(path) != stamp]
+        # Отметки обновляем сразу: битый файл не перечитывается каждый тик, а ждёт следующей правки
+        self.stamps = stamps
+        for path in sorted(changed):
+            await self.reload(path)
+
+    async def reload(self, path):
+        try:
+            config = load(path)
+        except (OSError, ValueError) as e:
+            print(f"❌ [Config] {path} не применён, остаётся прежняя версия: {e}")
+            return
+        old = self.configs.get(path)
+        if config == old:
+            return
+
+        handlers = self.handlers.get(path, [])
+        if not handlers:
+            self.configs[path] = config
+            print(f"⚠️ [Config] {path} изменён, но применится только после перезапуска")
+            return
+        try:
+            for _, validate in handlers:
+                if validate is not None:
+                    validate(config)
+        except Exception as e:
+            # Валидатор мог споткнуться о неожиданную форму JSON раньше своей проверки —
+            # это тоже битый конфиг, а не повод ронять задачу наблюдателя
+            print(f"❌ [Config] {path} не применён, остаётся прежняя версия: {type(e).__name__} - {e}")
+            return
+
+        self.configs[path] = config
+        for handler, _ in handlers:
+            try:
+                result = handler(config, old or {})
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"❌ [Config] Ошибка применения {path}: {type(e).__name__} - {e}")
+        print(f"♻️ [Config] {path} применён без перезапуска")
+
+
+def get_config_watcher(bot):
+    watcher = getattr(bot, "config_watcher", None)
+    if watcher is None:
+        watcher = bot.config_watcher = ConfigWatcher()
+        scheduler = get_scheduler(bot)
+        watcher.watch(SCHEDULER_CONFIG_PATH, scheduler.apply_config, validate_scheduler)
+        scheduler.add_job("config_watch", watcher.check, CHECK_INTERVAL, run_immediately=False)
+    return watcher
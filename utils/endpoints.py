@@ -0,0 +1,44 @@
+import json
+import os
+
+CONFIG_PATH = "config/endpoints.json"
+
+DEFAULT_CONFIG = {
+    "twitch_helix": "https://api.twitch.tv/helix",
+    "twitch_oauth": "https://id.twitch.tv/oauth2",
+    "youtube_feed": "https://www.youtube.com/feeds/videos.xml",
+    "youtube_api": "https://www.googleapis.com/youtube/v3",
+    "youtube_hub": "https://pubsubhubbub.appspot.com/subscribe",
+    "tikwm": "https://www.tikwm.com",
+    "telegram": "https://api.telegram.org",
+    "discord": "https://discord.com/api/v10",
+}
+
+_config = None
+
+
+# Базовые адреса всех внешних API в одном месте: config/endpoints.json
+# позволяет направить бота на локальные заглушки (см. benchmarks/harness.py).
+# Адрес читается в момент запроса, поэтому configure() действует сразу.
+def load_config(path=CONFIG_PATH):
+    config = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    return {**DEFAULT_CONFIG, **config}
+
+
+def configure(overrides=None, path=CONFIG_PATH):
+    global _config
+    _config = {**load_config(path), **(overrides or {})}
+    return _config
+
+
+def base_url(name):
+    if _config is None:
+        configure()
+    return _config[name].rstrip("/")
+
+
+def is_overridden(name):
+    return base_url(name) != DEFAULT_CONFIG[name].rstrip("/")
@@ -0,0 +1,117 @@
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from aiohttp import web
+
+from utils.endpoints import base_url
+
+MAX_MESSAGE_AGE = 600  # Twitch рекомендует отбрасывать сообщения старше 10 минут
+SEEN_MESSAGES_LIMIT = 1000
+
+STREAM_EVENTS = ("stream.online", "stream.offline")
+
+
+def verify_signature(secret, headers, body):
+    message_id = headers.get("Twitch-Eventsub-Message-Id", "")
+    timestamp = headers.get("Twitch-Eventsub-Message-Timestamp", "")
+    signature = headers.get("Twitch-Eventsub-Message-Signature", "")
+    digest = hmac.new(secret.encode(), (message_id + timestamp).encode() + body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={digest}", signature)
+
+
+def message_age(timestamp):
+    # Twitch присылает RFC3339 с наносекундами: 2023-01-01T12:00:00.123456789Z
+    try:
+        sent = datetime.fromisoformat(timestamp[:19] + "+00:00").timestamp()
+    except ValueError:
+        return float("inf")
+    return time.time() - sent
+
+
+# Приёмник EventSub через вебхук: проверяет подпись, отвечает на challenge,
+# отбрасывает повторы и передаёт события в callback(subscription_type, event).
+class EventSubWebhook:
+    def __init__(self, secret, callback):
+        self.secret = secret
+        self.callback = callback
+        self.seen_messages = OrderedDict()
+
+    def is_duplicate(self, message_id):
+        if message_id in self.seen_messages:
+            return True
+        self.seen_messages[message_id] = True
+        if len(self.seen_messages) > SEEN_MESSAGES_LIMIT:
+            self.seen_messages.popitem(last=False)
+        return False
+
+    async def handle(self, request):
+        body = await request.read()
+        if not verify_signature(self.secret, request.headers, body):
+            print("❌ [EventSub] Неверная подпись сообщения, отклоняем.")
+            raise web.HTTPForbidden()
+
+        if message_age(request.headers.get("Twitch-Eventsub-Message-Timestamp", "")) > MAX_MESSAGE_AGE:
+            print("⚠️ [EventSub] Устаревшее сообщение, пропускаем.")
+            return web.Response(status=204)
+
+        message_type = request.headers.get("Twitch-Eventsub-Message-Type")
+        payload = await request.json()
+
+        if message_type == "webhook_callback_verification":
+            print(f"✅ [EventSub] Подписка подтверждена: {payload['subscription']['type']}")
+            return web.Response(text=payload["challenge"], content_type="text/plain")
+
+        if message_type == "revocation":
+            subscription = payload["subscription"]
+            print(f"⚠️ [EventSub] Подписка {subscription['type']} отозвана: {subscription['status']}")
+            return web.Response(status=204)
+
+        if message_type == "notification":
+            if not self.is_duplicate(request.headers.get("Twitch-Eventsub-Message-Id")):
+                await self.callback(payload["subscription"]["type"], payload["event"])
+            return web.Response(status=204)
+
+        return web.Response(status=204)
+
+
+async def list_subscriptions(auth, helix_url=None):
+    helix_url = helix_url or base_url("twitch_helix")
+    subscriptions = []
+    params = {}
+    while True:
+        data = await auth.request("GET", f"{helix_url}/eventsub/subscriptions", params=params)
+        subscriptions.extend(data.get("data", []))
+        cursor = data.get("pagination", {}).get("cursor")
+        if not cursor:
+            return subscriptions
+        params = {"after": cursor}
+
+
+async def ensure_subscriptions(auth, user_ids, callback_url, secret, types=STREAM_EVENTS, helix_url=None):
+    helix_url = helix_url or base_url("twitch_helix")
+    # Один постраничный список всех подписок вместо запроса на каждый канал
+    existing = {
+        (sub["type"], sub["condition"].get("broadcaster_user_id"))
+        for sub in await list_subscriptions(auth, helix_url)
+        if sub["transport"].get("callback") == callback_url
+        and sub["status"] in ("enabled", "webhook_callback_verification_pending")
+    }
+
+    for user_id in user_ids:
+        for sub_type in types:
+            if (sub_type, user_id) in existing:
+                continue
+            body = {
+                "type": sub_type,
+                "version": "1",
+                "condition": {"broadcaster_user_id": user_id},
+                "transport": {"method": "webhook", "callback": callback_url, "secret": secret}
+            }
+            result = await auth.request("POST", f"{helix_url}/eventsub/subscriptions", json=body)
+            if "data" in result:
+                print(f"📡 [EventSub] Создана подписка {sub_type} для {user_id}")
+            else:
+                print(f"❌ [EventSub] Не удалось создать подписку {sub_type}: {result}")
@@ -0,0 +1,168 @@
+import asyncio
+import importlib
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import aiohttp
+
+from utils.http import HttpClient
+from utils.persist import flush_all
+
+CONFIG_PATH = "config/webhooks.json"
+
+
+class WebhookError(RuntimeError):
+    pass
+
+
+# "Канал" Discord поверх вебхука: тот же send(), что у disnake, но обычным
+# HTTP-запросом без шлюза. ?wait=true возвращает созданное сообщение с id.
+class WebhookChannel:
+    def __init__(self, http, channel_id, webhook):
+        if isinstance(webhook, str):
+            webhook = {"url": webhook}
+        self.http = http
+        self.id = channel_id
+        self.url = webhook["url"]
+        self.username = webhook.get("username")
+        self.avatar_url = webhook.get("avatar_url")
+
+    async def send(self, content=None, embed=None, embeds=None, file=None, files=None):
+        embeds = embeds or ([embed] if embed is not None else [])
+        files = files or ([file] if file is not None else [])
+        payload = {"content": content, "embeds": [item.to_dict() for item in embeds]}
+        if self.username:
+            payload["username"] = self.username
+        if self.avatar_url:
+            payload["avatar_url"] = self.avatar_url
+
+        kwargs = {"json": payload}
+        if files:
+            # Вложения (карточки анонсов) — multipart с payload_json, как у обычного сообщения
+            payload["attachments"] = [{"id": index, "filename": item.filename} for index, item in enumerate(files)]
+            form = aiohttp.FormData()
+            form.add_field("payload_json", json.dumps(payload), content_type="application/json")
+            for index, item in enumerate(files):
+                form.add_field(f"files[{index}]", item.fp, filename=item.filename)
+            kwargs = {"data": form}
+        try:
+            return await self.post(kwargs)
+        finally:
+            for item in files:
+                item.close()
+
+    async def post(self, kwargs):
+        async with self.http.post(self.url, params={"wait": "true"}, **kwargs) as resp:
+            if resp.status == 429:
+                retry_after = (await resp.json(content_type=None) or {}).get("retry_after")
+                raise WebhookError(f"Вебхук канала {self.id}: лимит Discord, повтор через {retry_after} с")
+            if resp.status >= 300:
+                raise WebhookError(f"Вебхук канала {self.id} вернул {resp.status}: {await resp.text()}")
+            data = await resp.json()
+        return SimpleNamespace(id=int(data["id"]))
+
+
+# Минимальная замена commands.Bot для cogs-уведомлений: без шлюза, кэшей и
+# логина. Cogs грузятся теми же setup(bot), get_channel() отдаёт вебхуки из
+# config/webhooks.json ({"<discord_channel_id>": "https://discord.com/api/webhooks/..."}).
+class HeadlessBot:
+    def __init__(self, loop, webhooks=None, ready=True):
+        self.loop = loop
+        self.webhooks = webhooks if webhooks is not None else self.load_webhooks()
+        self.http_client = HttpClient.from_config()
+        self.cogs = {}
+        self.extra_events = {}
+        self._ready = asyncio.Event()
+        if ready:
+            self._ready.set()
+
+    @staticmethod
+    def load_webhooks(path=CONFIG_PATH):
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def wait_until_ready(self):
+        await self._ready.wait()
+
+    def add_listener(self, func, name=None):
+        self.extra_events.setdefault(name or func.__name__, []).append(func)
+
+    def dispatch(self, event, *args):
+        for func in self.extra_events.get(f"on_{event}", []):
+            asyncio.ensure_future(func(*args))
+
+    def add_cog(self, cog):
+        self.cogs[type(cog).__name__] = cog
+        for name, func in cog.get_listeners():
+            self.add_listener(func, name)
+
+    def load_cogs(self, path="cogs"):
+        for file in sorted(os.listdir(path)):
+            if not file.endswith(".py"):
+                continue
+            extension = f"{path.replace(os.sep, '.')}.{os.path.splitext(file)[0]}"
+            started = time.perf_counter()
+            try:
+                importlib.import_module(extension).setup(self)
+                print(f"[Extension]> {extension} loaded ({(time.perf_counter() - started) * 1000:.0f} мс)")
+            except Exception as e:
+                print(f"Error while loading cog > {extension}: {type(e).__name__} - {e}")
+
+    def get_channel(self, channel_id):
+        webhook = self.webhooks.get(str(channel_id))
+        if webhook is None:
+            return None
+        return WebhookChannel(self.http_client, channel_id, webhook)
+
+    async def run_once(self):
+        # Один проход для cron: каждая задача планировщика по разу, затем очередь до пустой
+        scheduler = getattr(self, "scheduler", None)
+        jobs = list(scheduler.jobs.values()) if scheduler else []
+        results = await asyncio.gather(*(job.func() for job in jobs), return_exceptions=True)
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                print(f"❌ [{job.name}] Ошибка задачи: {type(result).__name__} - {result}")
+
+        outbox = getattr(self, "outbox", None)
+        if outbox is not None:
+            while True:
+                due = outbox.due_channels(time.time())
+                if not due:
+                    break
+                await asyncio.gather(*(outbox.drain(channel_id) for channel_id in due))
+            if outbox.pending:
+                print(f"⏳ В очереди осталось {len(outbox.pending)} анонс(ов) — уйдут при следующем запуске")
+
+    async def close(self):
+        scheduler = getattr(self, "scheduler", None)
+        if scheduler is not None:
+            for name in list(scheduler.jobs):
+                scheduler.remove_job(name)
+        outbox = getattr(self, "outbox", None)
+        if outbox is not None:
+            outbox.stop()
+        # Незаконченный профиль дописывается в файл, потоки сторожа останавливаются
+        watchdog = getattr(self, "watchdog", None)
+        if watchdog is not None:
+            watchdog.stop()
+        await flush_all()
+        seen_store = getattr(self, "seen_store", None)
+        if seen_store is not None:
+            seen_store.close()
+        web_server = getattr(self, "web_server", None)
+        if web_server is not None:
+            await web_server.stop()
+        metrics_server = getattr(self, "metrics_server", None)
+        if metrics_server is not None:
+            await metrics_server.stop()
+        card_renderer = getattr(self, "card_renderer", None)
+        if card_renderer is not None:
+            card_renderer.close()
+        cluster = getattr(self, "cluster", None)
+        if cluster is not None:
+            cluster.close()
+        await self.http_client.close()
@@ -0,0 +1,176 @@
+import json
+import os
+import time
+
+import aiohttp
+
+from utils import endpoints, metrics
+
+CONFIG_PATH = "config/health.json"
+
+DEFAULT_CONFIG = {
+    "failure_threshold": 5,     # столько неудач подряд — и провайдер считается лежащим
+    "reset_seconds": 15,        # пауза до первого пробного запроса
+    "max_reset_seconds": 600,   # после каждой неудачной пробы пауза удваивается до этого предела
+    "providers": ["twitch", "youtube", "tikwm", "telegram"],
+}
+
+STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, provider, retry_in):
+        super().__init__(f"{provider} недоступен, пробный запрос через {retry_in:.0f} с")
+        self.provider = provider
+
+
+# Предохранитель одного провайдера: closed — запросы идут, open — сразу
+# отказываем без сокетов и DNS, по истечении паузы один пробный запрос
+# (half_open) решает, вернуться в closed или разомкнуться с удвоенной паузой.
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_seconds=15, max_reset_seconds=600):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.max_reset_seconds = max_reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.pause = reset_seconds
+        self.retry_at = 0
+        self.opened = 0
+        self.set_state("closed")
+
+    def set_state(self, state):
+        self.state = state
+        metrics.circuit_state.set(STATES[state], self.name)
+
+    def retry_in(self):
+        if self.state != "open":
+            return 0
+        return max(0, self.retry_at - time.monotonic())
+
+    def available(self):
+        # Для планировщика: пора ли запускать задачу (пробный запрос тоже считается)
+        return self.state == "closed" or (self.state == "open" and time.monotonic() >= self.retry_at)
+
+    def allow(self):
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() >= self.retry_at:
+            self.set_state("half_open")
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        if self.state != "closed":
+            print(f"✅ [Health] {self.name} снова доступен")
+            self.pause = self.reset_seconds
+            self.set_state("closed")
+
+    def failure(self):
+        self.failures += 1
+        if self.state == "half_open":
+            self.pause = min(self.max_reset_seconds, self.pause * 2)
+            self.trip()
+        elif self.state == "closed" and self.failures >= self.failure_threshold:
+            self.trip()
+
+    def abandon(self):
+        # Пробный запрос отменили, не дождавшись ответа: следующий запрос проверит снова
+        if self.state == "half_open":
+            self.retry_at = 0
+            self.set_state("open")
+
+    def trip(self):
+        self.retry_at = time.monotonic() + self.pause
+        self.opened += 1
+        self.set_state("open")
+        print(f"🔌 [Health] {self.name} недоступен ({self.failures} ошибок подряд), следующая проверка через {self.pause:.0f} с")
+
+    def as_dict(self):
+        return {"state": self.state, "failures": self.failures, "retry_in": round(self.retry_in(), 1), "opened": self.opened}
+
+
+# Состояние внешних API для всего бота: HTTP-клиент узнаёт провайдера по
+# адресу запроса (utils/endpoints.py) и сообщает исход, планировщик по
+# available() пропускает опросы лежащего провайдера.
+class Health:
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.breakers = {
+            name: CircuitBreaker(
+                name, self.config["failure_threshold"], self.config["reset_seconds"], self.config["max_reset_seconds"]
+            )
+            for name in self.config["providers"]
+        }
+
+    @classmethod
+    def from_config(cls, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config)
+
+    def breaker_for(self, url):
+        # twitch_helix, twitch_oauth -> twitch и т.д.; Discord и прочее идут без предохранителя
+        url = str(url)
+        for name in endpoints.DEFAULT_CONFIG:
+            breaker = self.breakers.get(name.split("_")[0])
+            if breaker is not None and url.startswith(endpoints.base_url(name)):
+                return breaker
+        return None
+
+    def available(self, provider):
+        breaker = self.breakers.get(provider)
+        return breaker is None or breaker.available()
+
+    def retry_in(self, provider):
+        breaker = self.breakers.get(provider)
+        return breaker.retry_in() if breaker is not None else 0
+
+    def stats(self):
+        return {name: breaker.as_dict() for name, breaker in self.breakers.items()}
+
+
+def is_failure(status):
+    # 429 и 4xx — ответ живого сервера, предохранитель реагирует только на 5xx и сетевые ошибки
+    return status >= 500
+
+
+# Обёртка над aiohttp-запросом: отказ ещё до соединения, если провайдер лежит,
+# и учёт исхода, включая таймаут при чтении тела внутри async with
+class GuardedRequest:
+    def __init__(self, breaker, open_request):
+        self.breaker = breaker
+        self.open_request = open_request
+        self.request = None
+
+    async def __aenter__(self):
+        if self.breaker is None:
+            self.request = self.open_request()
+            return await self.request.__aenter__()
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_in())
+        try:
+            self.request = self.open_request()
+            response = await self.request.__aenter__()
+        except (aiohttp.ClientError, TimeoutError):
+            self.breaker.failure()
+            raise
+        except BaseException:
+            self.breaker.abandon()
+            raise
+        if is_failure(response.status):
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        return response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # raise_for_status() внутри блока — уже учтённый ответ сервера, а не сбой сети
+        if self.breaker is not None and exc_type is not None and not issubclass(exc_type, aiohttp.ClientResponseError) \
+                and issubclass(exc_type, (aiohttp.ClientError, TimeoutError)):
+            self.breaker.failure()
+        return await self.request.__aexit__(exc_type, exc, tb)
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+from utils import metrics
+from utils.health import GuardedRequest, Health
+
+CONFIG_PATH = "config/http.json"
+
+DEFAULT_CONFIG = {
+    "limit": 100,               # всего соединений в пуле
+    "limit_per_host": 10,       # keep-alive пул на один хост
+    "keepalive_timeout": 75,    # сколько держим простаивающее соединение
+    "dns_cache_ttl": 300,       # кэш DNS, секунд
+    "resolver": "auto",         # aiodns, если установлен, иначе getaddrinfo в пуле потоков; цикл не блокируется
+    "timeout_total": 30,
+    "timeout_connect": 10,
+    "timeout_read": 20,
+}
+
+
+class HostStats:
+    __slots__ = ("requests", "connections_created", "connections_reused", "dns_hits", "dns_misses", "errors")
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+        self.errors = 0
+
+    def as_dict(self):
+        opened = self.connections_created + self.connections_reused
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["reuse_ratio"] = round(self.connections_reused / opened, 3) if opened else 0.0
+        return data
+
+
+# Общий для всех cogs HTTP-клиент с keep-alive пулами на хост.
+# Сессия создаётся лениво внутри работающего event loop и закрывается,
+# когда её отпускает последний cog (или при остановке бота). Запросы к
+# провайдерам проходят через предохранители utils/health.py.
+class HttpClient:
+    def __init__(self, config=None, health=None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.health = health if health is not None else Health()
+        self._session = None
+        self._users = 0
+        self.host_stats = {}
+        # host -> (остаток запросов, время сброса окна) из заголовков Ratelimit-* / Retry-After
+        self.rate_limits = {}
+
+    @classmethod
+    def from_config(cls, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config, Health.from_config())
+
+    def resolver(self):
+        kind = self.config["resolver"]
+        if kind == "aiodns" or (kind == "auto" and aiohttp.resolver.aiodns is not None):
+            return aiohttp.AsyncResolver()
+        return aiohttp.ThreadedResolver()
+
+    def _stats_for(self, host):
+        stats = self.host_stats.get(host)
+        if stats is None:
+            stats = self.host_stats[host] = HostStats()
+        return stats
+
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host
+            ctx.started = time.monotonic()
+            self._stats_for(ctx.host).requests += 1
+
+        async def on_request_end(session, ctx, params):
+            metrics.http_requests.inc(ctx.host, params.response.status)
+            metrics.http_latency.observe(time.monotonic() - ctx.started, ctx.host)
+            headers = params.response.headers
+            if params.response.status == 429 and "Retry-After" in headers:
+                try:
+                    self.rate_limits[ctx.host] = (0, time.time() + float(headers["Retry-After"]))
+                except ValueError:
+                    pass
+            elif "Ratelimit-Remaining" in headers and "Ratelimit-Reset" in headers:
+                self.rate_limits[ctx.host] = (int(headers["Ratelimit-Remaining"]), float(headers["Ratelimit-Reset"]))
+
+        async def on_request_exception(session, ctx, params):
+            self._stats_for(ctx.host).errors += 1
+            metrics.http_errors.inc(ctx.host)
+
+        async def on_connection_create_end(session, ctx, params):
+            self._stats_for(ctx.host).connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self._stats_for(ctx.host).connections_reused += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self._stats_for(params.host).dns_hits += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self._stats_for(params.host).dns_misses += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.config["limit"],
+                limit_per_host=self.config["limit_per_host"],
+                keepalive_timeout=self.config["keepalive_timeout"],
+                ttl_dns_cache=self.config["dns_cache_ttl"],
+                use_dns_cache=True,
+                resolver=self.resolver(),
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.config["timeout_total"],
+                sock_connect=self.config["timeout_connect"],
+                sock_read=self.config["timeout_read"],
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={"Accept-Encoding": "gzip, deflate"},
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    def acquire(self):
+        self._users += 1
+        return self
+
+    def release(self):
+        self._users = max(0, self._users - 1)
+        if self._users == 0 and self._session is not None:
+            try:
+                asyncio.get_running_loop().create_task(self.close())
+            except RuntimeError:
+                pass
+
+    def request(self, method, url, **kwargs):
+        # Сессия открывается только если предохранитель пропустил запрос
+        return GuardedRequest(self.health.breaker_for(url), lambda: self.session.request(method, url, **kwargs))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        return {host: stats.as_dict() for host, stats in self.host_stats.items()}
+
+    def format_stats(self):
+        lines = []
+        for host, stats in sorted(self.stats().items()):
+            lines.append(
+                f"{host}: запросов {stats['requests']}, "
+                f"новых соединений {stats['connections_created']}, "
+                f"переиспользовано {stats['connections_reused']} ({stats['reuse_ratio']:.0%})"
+            )
+        return "\n".join(lines)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            if self.host_stats:
+                print(f"[HTTP] Статистика соединений:\n{self.format_stats()}")
+            await self._session.close()
+        self._session = None
+
+
+def get_http_client(bot):
+    client = getattr(bot, "http_client", None)
+    if client is None:
+        client = bot.http_client = HttpClient.from_config()
+    return client
+
@@ -0,0 +1,226 @@
+import bisect
+import json
+import os
+import time
+from datetime import datetime
+
+CONFIG_PATH = "config/metrics.json"
+
+DEFAULT_CONFIG = {
+    "enabled": False,    # отдавать /metrics на отдельном веб-сервере
+    "host": "127.0.0.1", # по умолчанию только локально, наружу метрики не торчат
+    "port": 9108,
+    "path": "/metrics",
+}
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LOOP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+LAG_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1800, 3600, 3 * 3600)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# Метрики хранятся в словаре "значения меток -> число": в горячих местах
+# это один dict-lookup и сложение, текст Prometheus собирается только по запросу.
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def label_string(self, values, extra=None):
+        pairs = list(zip(self.labels, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs) + "}"
+
+    def samples(self):
+        for values, value in sorted(self.values.items()):
+            yield self.name, self.label_string(values), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, value=1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def total(self):
+        return sum(self.values.values())
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.function = None
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def set_function(self, function):
+        # Значение считается в момент сбора, например размер очереди
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                return
+            if isinstance(value, dict):
+                for labels, item in sorted(value.items()):
+                    labels = labels if isinstance(labels, tuple) else (labels,)
+                    yield self.name, self.label_string(labels), item
+            else:
+                yield self.name, "", value
+            return
+        yield from super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            # [счётчики по корзинам (последняя — +Inf), сумма, количество]
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q, *labels):
+        series = self.values.get(labels)
+        if not series or not series[2]:
+            return None
+        rank = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", self.label_string(values, ("le", format_value(float(bound)))), cumulative
+            yield f"{self.name}_sum", self.label_string(values), total
+            yield f"{self.name}_count", self.label_string(values), count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter("streambot_http_requests_total", "Исходящие HTTP-запросы", ("host", "status"))
+http_errors = registry.counter("streambot_http_errors_total", "Исходящие HTTP-запросы, завершившиеся исключением", ("host",))
+http_latency = registry.histogram("streambot_http_request_seconds", "Время исходящего HTTP-запроса", ("host",))
+job_runs = registry.counter("streambot_job_runs_total", "Запуски задач планировщика", ("job", "result"))
+job_duration = registry.histogram("streambot_job_seconds", "Длительность задачи планировщика", ("job",))
+youtube_quota = registry.counter("streambot_youtube_quota_units_total", "Потраченные единицы квоты YouTube", ("method",))
+youtube_quota_today = registry.gauge("streambot_youtube_quota_units_today", "Единицы квоты YouTube за текущие сутки")
+announce_lag = registry.histogram(
+    "streambot_announce_lag_seconds", "Задержка анонса относительно публикации у источника", ("source",), LAG_BUCKETS
+)
+loop_lag = registry.histogram(
+    "streambot_loop_lag_seconds", "Задержка цикла событий относительно расписания", buckets=LOOP_BUCKETS
+)
+loop_stalls = registry.counter("streambot_loop_stalls_total", "Зависания цикла событий выше порога", ("task",))
+circuit_state = registry.gauge(
+    "streambot_circuit_state", "Предохранитель провайдера: 0 — закрыт, 1 — пробный запрос, 2 — разомкнут", ("provider",)
+)
+outbox_pending = registry.gauge("streambot_outbox_pending", "Анонсы в очереди на отправку")
+outbox_dead = registry.gauge("streambot_outbox_dead", "Недоставленные анонсы")
+
+
+def to_timestamp(value):
+    # started_at / publishedAt приходят строкой ISO 8601, create_time TikWM — числом
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def observe_lag(source, published):
+    published_at = to_timestamp(published)
+    if published_at is not None:
+        announce_lag.observe(max(0.0, time.time() - published_at), source)
+
+
+def load_config(path=CONFIG_PATH):
+    config = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    return {**DEFAULT_CONFIG, **config}
+
+
+def format_summary():
+    lines = []
+    hosts = sorted({labels[0] for labels in http_requests.values})
+    for host in hosts:
+        count = sum(value for labels, value in http_requests.values.items() if labels[0] == host)
+        p95 = http_latency.quantile(0.95, host)
+        lines.append(f"{host}: запросов {count}, ошибок {http_errors.values.get((host,), 0)}, p95 ≤ {format_value(p95)} с")
+    for (job,), (_, total, count) in sorted(job_duration.values.items()):
+        errors = job_runs.values.get((job, "error"), 0)
+        lines.append(f"{job}: запусков {count}, ошибок {errors}, среднее {total / count:.2f} с")
+    if youtube_quota.values:
+        lines.append(f"Квота YouTube: {format_value(youtube_quota_today.values.get((), 0))} ед. за сутки")
+    for (source,) in sorted(announce_lag.values):
+        p50 = announce_lag.quantile(0.5, source)
+        p95 = announce_lag.quantile(0.95, source)
+        lines.append(f"Задержка {source}: p50 ≤ {format_value(p50)} с, p95 ≤ {format_value(p95)} с")
+    return "\n".join(lines) or "Метрик пока нет."
@@ -0,0 +1,414 @@
+import asyncio
+import contextlib
+import itertools
+import os
+import time
+import uuid
+from collections import Counter, deque
+
+import disnake
+
+from utils import metrics
+from utils.cluster import get_cluster
+from utils.persist import open_json_store
+from utils.routing import get_router
+from utils.seen_store import get_seen_store
+from utils.telegram import TelegramError, chat_key, chat_of, get_telegram, is_chat_key
+
+OUTBOX_PATH = "data/outbox.json"
+MAX_EMBEDS = 10          # Discord: до 10 эмбедов в одном сообщении
+MAX_EMBED_CHARS = 6000   # и не больше 6000 символов на все эмбеды сообщения
+MAX_ATTEMPTS = 5
+MAX_DEAD = 200          # сколько недоставленных анонсов храним для разбора
+RETRY_BASE = 5
+RETRY_MAX = 600
+
+
+# Не больше limit запросов за любые window секунд по часам Discord. Discord
+# считает лимиты окнами, и токен-бакет тут не подходит: полный бакет плюс
+# пополнение за окно его превышают. Запрос занимает место с начала и до window
+# секунд после ответа — так окно соблюдается, когда бы запрос ни дошёл до
+# Discord, даже если он ждал свободного соединения в пуле.
+class SlidingWindow:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.active = 0
+        self.finished = deque()
+        self.released = asyncio.Event()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        while True:
+            now = time.monotonic()
+            while self.finished and now - self.finished[0] >= self.window:
+                self.finished.popleft()
+            if self.active + len(self.finished) < self.limit:
+                break
+            # Все места заняты запросами в пути — ждём ответа, иначе старейшее место освободится по времени
+            timeout = self.window - (now - self.finished[0]) if self.finished else None
+            self.released.clear()
+            try:
+                await asyncio.wait_for(self.released.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.finished.append(time.monotonic())
+            self.released.set()
+
+
+# Очередь исходящих анонсов: переживает перезапуск, отправляет по одному
+# воркеру на канал, склеивает соседние анонсы с одинаковым текстом в одно
+# сообщение и отмечает контент опубликованным только после успешной отправки.
+# В кластере (utils/cluster.py) элемент сначала заявляется в общей базе, и
+# анонс отправляет только воркер, который его заявил. Источники из sources в
+# telegram.json дублируются в чаты Telegram отдельными очередями "tg:<chat_id>".
+#
+# Один анонс на сотни каналов (utils/routing.py) хранит эмбед и карточку один
+# раз в payloads, а элементы очереди ссылаются на них. Параллельно работают
+# max_concurrency каналов из routing.json, а отправку в Discord сдерживают
+# окна лимитов на канал и на бота в целом.
+class Outbox:
+    def __init__(self, bot, path=OUTBOX_PATH):
+        self.bot = bot
+        self.seen = get_seen_store(bot)
+        self.cluster = get_cluster(bot)
+        self.telegram = get_telegram(bot)
+        self.router = get_router(bot)
+        self.channel_limits = {}
+        self.global_limit = None
+        self.store = open_json_store(path, {"pending": [], "dead": [], "payloads": {}})
+        self.store.data.setdefault("payloads", {})
+        self.concurrency = self.router.max_concurrency
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.embeds = {}
+        self.refs = Counter(entry.get("payload") for entry in self.pending)
+        self.queues = {}
+        for entry in sorted(self.pending, key=lambda entry: (entry["created_at"], entry.get("seq", 0))):
+            self.queues.setdefault(entry["channel_id"], []).append(entry)
+        self.workers = {}
+        self._wakeup = asyncio.Event()
+        self._seq = itertools.count()
+        self._task = None
+        metrics.outbox_pending.set_function(lambda: len(self.pending))
+        metrics.outbox_dead.set_function(lambda: len(self.store.data["dead"]))
+
+    @property
+    def pending(self):
+        return self.store.data["pending"]
+
+    @property
+    def payloads(self):
+        return self.store.data["payloads"]
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run(), loop=self.bot.loop)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        for worker in self.workers.values():
+            worker.cancel()
+        self.store.flush_sync()
+
+    @staticmethod
+    def entry_items(entry):
+        # Обычный анонс несёт один элемент, страница дайджеста — несколько
+        return entry.get("item_ids") or [entry["item_id"]]
+
+    async def filter_new(self, source, item_ids):
+        # Новое — то, чего нет ни в опубликованном, ни в очереди на отправку
+        queued = {item for entry in self.pending if entry["source"] == source for item in self.entry_items(entry)}
+        fresh = self.seen.filter_new(source, item_ids)
+        if self.cluster is not None:
+            # Локальная база знает только своё — заявки других воркеров смотрим в общей
+            fresh = await self.cluster.filter_unclaimed(source, fresh)
+        return [item_id for item_id in fresh if item_id not in queued]
+
+    async def claim(self, source, item_ids):
+        # Какие из элементов анонсирует этот процесс (без кластера — все)
+        if self.cluster is None:
+            return list(item_ids)
+        return await self.cluster.claim_all(source, item_ids)
+
+    def enqueue_digest(self, targets, pages, source, published_at=None):
+        # targets — [(channel_id, текст)] из RoutingTable.resolve(); pages — [(embed, [item_id, ...]), ...].
+        # Страницы с одинаковым текстом склеятся в одно сообщение до 10 эмбедов.
+        # Элементы должны быть заранее заявлены через claim()
+        for embed, item_ids in pages:
+            ids = [str(item_id) for item_id in item_ids]
+            payload = self.share(embed, None)
+            for channel_id, content in self.targets(targets, source):
+                self._append(channel_id, content, payload, source, ids[0], published_at)
+                self.pending[-1]["item_ids"] = ids
+
+    async def enqueue(self, targets, embed, source, item_id, published_at=None, card=None):
+        # Один эмбед на все каналы; embed=None — сообщение без эмбеда (конец стрима)
+        if self.cluster is not None and not await self.cluster.claim(source, item_id):
+            print(f"🔀 Анонс {source}:{item_id} уже взял другой воркер")
+            return False
+        targets = self.targets(targets, source)
+        if not targets:
+            # Фильтры всех маршрутов отсеяли анонс — отмечаем его, чтобы не разбирать на каждом опросе
+            self.seen.add(source, item_id)
+            if self.cluster is not None:
+                await self.cluster.confirm(source, item_id)
+            return True
+        payload = self.share(embed, card)
+        for channel_id, content in targets:
+            self._append(channel_id, content, payload, source, item_id, published_at)
+        return True
+
+    def targets(self, targets, source):
+        # Чаты Telegram получают копию с текстом первого (домашнего) маршрута
+        content = targets[0][1] if targets else ""
+        return list(targets) + [(chat_key(chat_id), content) for chat_id in self.telegram.chats_for(source)]
+
+    def share(self, embed, card):
+        payload = uuid.uuid4().hex
+        self.payloads[payload] = {"embed": embed.to_dict() if embed is not None else None, "card": card}
+        return payload
+
+    def payload(self, entry):
+        # Старые элементы очереди хранили эмбед и карточку внутри себя
+        if "payload" not in entry:
+            return {"embed": entry.get("embed"), "card": entry.get("card")}
+        return self.payloads[entry["payload"]]
+
+    def embed(self, entry):
+        # Один объект Embed на все каналы анонса, из словаря он собирается один раз
+        key = entry.get("payload") or entry["id"]
+        embed = self.embeds.get(key)
+        if embed is None:
+            data = self.payload(entry)["embed"]
+            embed = self.embeds[key] = disnake.Embed.from_dict(data) if data is not None else None
+        return embed
+
+    def _append(self, channel_id, content, payload, source, item_id, published_at):
+        entry = {
+            "id": uuid.uuid4().hex,
+            "channel_id": channel_id,
+            "content": content,
+            "payload": payload,
+            "source": source,
+            "item_id": str(item_id),
+            "attempts": 0,
+            "next_attempt": 0,
+            "created_at": time.time(),
+            # Время публикации у источника — для метрики задержки анонса
+            "published_at": metrics.to_timestamp(published_at),
+            "seq": next(self._seq),
+        }
+        self.pending.append(entry)
+        self.queues.setdefault(channel_id, []).append(entry)
+        self.refs[payload] += 1
+        self.store.mark_dirty()
+        self._wakeup.set()
+
+    def remove(self, entry):
+        self.pending.remove(entry)
+        queue = self.queues[entry["channel_id"]]
+        queue.remove(entry)
+        if not queue:
+            del self.queues[entry["channel_id"]]
+        payload = entry.get("payload")
+        if payload is not None:
+            self.refs[payload] -= 1
+            if self.refs[payload] <= 0:
+                # Последний канал анонса обработан — общий эмбед больше не нужен
+                del self.refs[payload]
+                self.payloads.pop(payload, None)
+                self.embeds.pop(payload, None)
+        else:
+            self.embeds.pop(entry["id"], None)
+        self.store.mark_dirty()
+
+    def channel_queue(self, channel_id):
+        # Элементы добавляются по времени создания, так что очередь канала уже упорядочена
+        return self.queues.get(channel_id, [])
+
+    def due_channels(self, now):
+        return [channel_id for channel_id, queue in self.queues.items() if queue[0]["next_attempt"] <= now]
+
+    async def run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            now = time.time()
+            for channel_id in self.due_channels(now):
+                worker = self.workers.get(channel_id)
+                if worker is None or worker.done():
+                    self.workers[channel_id] = asyncio.ensure_future(self.drain(channel_id))
+                    self.workers[channel_id].set_name(f"outbox:{channel_id}")
+
+            # Канал ждёт, пока не уйдёт первый в очереди, — хватает голов очередей
+            upcoming = [queue[0]["next_attempt"] for queue in self.queues.values() if queue[0]["next_attempt"] > now]
+            timeout = min(upcoming) - now if upcoming else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def next_batch(self, channel_id):
+        # Порядок анонсов в канале сохраняется: пока первый ждёт повтора, остальные тоже ждут
+        now = time.time()
+        queue = self.channel_queue(channel_id)
+        if not queue or queue[0]["next_attempt"] > now:
+            return []
+        batch = [queue[0]]
+        chars = len(self.embed(queue[0]) or "")
+        for entry in queue[1:MAX_EMBEDS]:
+            if entry["content"] != batch[0]["content"] or entry["next_attempt"] > now:
+                break
+            size = len(self.embed(entry) or "")
+            if chars + size > MAX_EMBED_CHARS:
+                break
+            batch.append(entry)
+            chars += size
+        return batch
+
+    async def drain(self, channel_id):
+        if self.concurrency != self.router.max_concurrency:
+            # max_concurrency поменяли в routing.json: уже идущие воркеры доработают со старым
+            self.concurrency = self.router.max_concurrency
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            async with self.semaphore:
+                while True:
+                    batch = self.next_batch(channel_id)
+                    if not batch:
+                        return
+                    await self.deliver(channel_id, batch)
+        finally:
+            # Будим диспетчер: за время работы воркера могли прийти новые анонсы
+            self._wakeup.set()
+
+    def limits(self, channel_id):
+        # Лимиты Discord: channel_burst сообщений в канал за channel_window секунд и global_rate запросов бота в секунду
+        config = self.router.config
+        limits = []
+        if config["channel_window"] > 0:
+            limit = self.channel_limits.get(channel_id)
+            if limit is None or (limit.limit, limit.window) != (config["channel_burst"], config["channel_window"]):
+                limit = self.channel_limits[channel_id] = SlidingWindow(config["channel_burst"], config["channel_window"])
+            limits.append(limit)
+        if config["global_rate"] > 0:
+            if self.global_limit is None or self.global_limit.limit != config["global_rate"]:
+                self.global_limit = SlidingWindow(config["global_rate"], 1)
+            limits.append(self.global_limit)
+        return limits
+
+    async def send(self, channel_id, content, embeds, files=None):
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            raise RuntimeError(f"Канал Discord {channel_id} не найден")
+        async with contextlib.AsyncExitStack() as stack:
+            # Сначала место в окне канала, потом в общем — общее не простаивает, пока канал ждёт
+            for limit in self.limits(channel_id):
+                await stack.enter_async_context(limit.slot())
+            if files:
+                return await channel.send(content=content, embeds=embeds, files=files)
+            return await channel.send(content=content, embeds=embeds)
+
+    def attachments(self, batch):
+        files = []
+        for entry in batch:
+            card = self.payload(entry)["card"]
+            embed = self.embed(entry)
+            if not card or embed is None:
+                continue
+            if os.path.exists(card["path"]):
+                files.append(disnake.File(card["path"], filename=os.path.basename(card["path"])))
+            else:
+                embed.set_image(url=card["fallback"])
+        return files
+
+    async def drop_foreign(self, batch):
+        # Пока воркер лежал, его заявки перехватили живые воркеры — эти анонсы уже отправлены ими
+        held = []
+        for entry in batch:
+            if await self.cluster.holds(entry["source"], self.entry_items(entry)):
+                held.append(entry)
+            else:
+                self.remove(entry)
+                print(f"🔀 Анонс {entry['source']}:{entry['item_id']} перешёл к другому воркеру, убираем из очереди")
+        return held
+
+    async def deliver(self, channel_id, batch):
+        if self.cluster is not None:
+            batch = await self.drop_foreign(batch)
+            if not batch:
+                return
+        try:
+            if is_chat_key(channel_id):
+                entries = [{**entry, **self.payload(entry)} for entry in batch]
+                message = await self.telegram.send_entries(chat_of(channel_id), entries)
+            else:
+                files = self.attachments(batch)
+                embeds = [embed for embed in map(self.embed, batch) if embed is not None]
+                message = await self.send(channel_id, batch[0]["content"], embeds, files)
+        except (disnake.Forbidden, disnake.NotFound) as e:
+            # Повтор не поможет — сразу в список недоставленных
+            await self.fail(batch, e, permanent=True)
+            return
+        except TelegramError as e:
+            await self.fail(batch, e, permanent=e.permanent)
+            return
+        except Exception as e:
+            await self.fail(batch, e)
+            return
+
+        for entry in batch:
+            self.remove(entry)
+            for item_id in self.entry_items(entry):
+                self.seen.add(entry["source"], item_id, message.id)
+            if self.cluster is not None:
+                await self.cluster.confirm(entry["source"], *self.entry_items(entry))
+            source = f"{entry['source']}_telegram" if is_chat_key(channel_id) else entry["source"]
+            metrics.observe_lag(source, entry.get("published_at"))
+        self.store.mark_dirty()
+        print(f"✅ Отправлено в канал {channel_id}: {len(batch)} анонс(ов) одним сообщением")
+
+    async def fail(self, batch, error, permanent=False):
+        for entry in batch:
+            entry["attempts"] += 1
+            entry["last_error"] = f"{type(error).__name__}: {error}"
+            if permanent or entry["attempts"] >= MAX_ATTEMPTS:
+                # В списке недоставленных элемент хранит эмбед сам: общий payload уйдёт с последним каналом
+                dead = {key: value for key, value in entry.items() if key != "payload"}
+                dead.update(self.payload(entry))
+                self.remove(entry)
+                await self.bury(dead)
+                print(f"💀 Анонс {entry['source']}:{entry['item_id']} не доставлен: {entry['last_error']}")
+            else:
+                delay = min(RETRY_MAX, RETRY_BASE * 2 ** entry["attempts"])
+                entry["next_attempt"] = time.time() + delay
+                print(f"🔁 Анонс {entry['source']}:{entry['item_id']} не отправлен ({entry['last_error']}), повтор через {delay} с")
+        self.store.mark_dirty()
+        self._wakeup.set()
+
+    async def bury(self, dead):
+        # Недоставленный элемент отмечается опубликованным: иначе следующий опрос
+        # снова сочтёт его новым, и навсегда закрытый канал (403, удалён) будет
+        # получать его и пополнять список dead на каждом опросе
+        for item_id in self.entry_items(dead):
+            self.seen.add(dead["source"], item_id)
+        if self.cluster is not None:
+            await self.cluster.confirm(dead["source"], *self.entry_items(dead))
+        key = (dead["source"], dead["item_id"], dead["channel_id"])
+        entries = [entry for entry in self.store.data["dead"] if (entry["source"], entry["item_id"], entry["channel_id"]) != key]
+        entries.append(dead)
+        self.store.data["dead"] = entries[-MAX_DEAD:]
+
+
+def get_outbox(bot):
+    outbox = getattr(bot, "outbox", None)
+    if outbox is None:
+        outbox = bot.outbox = Outbox(bot)
+    outbox.start()
+    return outbox
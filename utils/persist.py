@@ -0,0 +1,139 @@
+import asyncio
+import copy
+import json
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+FLUSH_DELAY = 2.0  # секунды, за которые копятся изменения перед записью
+
+_stores = weakref.WeakSet()
+_json_stores = {}
+
+
+def atomic_write(path, payload):
+    # Пишем во временный файл, fsync и rename: при падении на диске остаётся
+    # либо старая, либо новая версия, но не обрезанный файл
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+# Отложенная запись: изменения помечаются грязными, а на диск уходят одной
+# записью через FLUSH_DELAY секунд в отдельном потоке, не блокируя event loop.
+class WriteBehind:
+    flush_delay = FLUSH_DELAY
+
+    def __init__(self):
+        self.dirty = False
+        self._flush_task = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        _stores.add(self)
+
+    def take_snapshot(self):
+        raise NotImplementedError
+
+    def write_snapshot(self, snapshot):
+        raise NotImplementedError
+
+    def restore_snapshot(self, snapshot):
+        pass
+
+    def snapshot_written(self, snapshot):
+        pass
+
+    def mark_dirty(self):
+        self.dirty = True
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # Изменения, пришедшие во время записи, уходят следующим заходом
+        while True:
+            await asyncio.sleep(self.flush_delay)
+            await self.flush()
+            if not self.dirty:
+                return
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        snapshot = self.take_snapshot()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.write_snapshot, snapshot)
+        except Exception as e:
+            print(f"❌ Ошибка записи {self}: {e}")
+            self.restore_snapshot(snapshot)
+            self.dirty = True
+        else:
+            self.snapshot_written(snapshot)
+
+    def flush_sync(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        snapshot = self.take_snapshot()
+        self.write_snapshot(snapshot)
+        self.snapshot_written(snapshot)
+
+
+class JsonStore(WriteBehind):
+    def __init__(self, path, default):
+        super().__init__()
+        self.path = path
+        self.data = self.load(default)
+
+    def __repr__(self):
+        return f"<JsonStore {self.path}>"
+
+    def load(self, default):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return {**copy.deepcopy(default), **json.load(f)}
+            except ValueError as e:
+                print(f"❌ {self.path} повреждён ({e}), начинаем с чистого состояния.")
+        return copy.deepcopy(default)
+
+    def take_snapshot(self):
+        # Сериализуем в потоке event loop, чтобы данные не менялись во время dumps
+        return dumps(self.data)
+
+    def write_snapshot(self, snapshot):
+        atomic_write(self.path, snapshot)
+
+
+def open_json_store(path, default):
+    # Один объект на файл: все cogs видят одно и то же состояние в памяти
+    key = os.path.abspath(path)
+    store = _json_stores.get(key)
+    if store is None:
+        store = _json_stores[key] = JsonStore(path, default)
+    return store
+
+
+async def flush_all():
+    for store in list(_stores):
+        await store.flush()
@@ -0,0 +1,215 @@
+import json
+import os
+
+from utils.config_watcher import get_config_watcher
+
+CONFIG_PATH = "config/routing.json"
+PLATFORMS = ("twitch", "clips", "youtube", "tiktok")
+ANY = "*"
+
+DEFAULT_CONFIG = {
+    "max_concurrency": 25,   # сколько каналов Discord очередь анонсов обслуживает параллельно
+    "channel_burst": 5,      # Discord: не больше 5 сообщений в канал
+    "channel_window": 5,     # за 5 секунд; 0 — не сдерживать
+    "global_rate": 50,       # и не больше 50 запросов бота в секунду; 0 — не сдерживать
+    "routes": [],
+    "templates": {},
+}
+
+# Текст сообщения над эмбедом; эмбед один на все каналы, язык меняет только этот текст.
+# Подстановки: {mention}, {creator}, {title}, {url}, {game}, {tagline} (пусто, если источник их не знает)
+DEFAULT_TEMPLATES = {
+    "ru": {
+        "twitch": "{mention} 🔴 Стрим начался!\n\n**{creator}** уже в эфире 👉 {url}\n\n{tagline}",
+        "twitch_offline": "⚫️ Стрим **{creator}** завершён.",
+        "clips": "{mention}",
+        "clips_digest": "{mention} Пока бот был офлайн, появились новые клипы",
+        "youtube": "{mention}",
+        "youtube_digest": "{mention} Пока бот был офлайн, вышли новые видео",
+        "tiktok": "{mention}",
+        "tiktok_digest": "{mention} Пока бот был офлайн, вышли новые TikTok-видео",
+    },
+    "en": {
+        "twitch": "{mention} 🔴 **{creator}** is live: {title}\n👉 {url}",
+        "twitch_offline": "⚫️ **{creator}**'s stream has ended.",
+        "clips": "{mention} 🎬 New clip from **{creator}**",
+        "clips_digest": "{mention} New clips while the bot was offline",
+        "youtube": "{mention} 📺 New YouTube video",
+        "youtube_digest": "{mention} New videos while the bot was offline",
+        "tiktok": "{mention} 🎵 New TikTok video",
+        "tiktok_digest": "{mention} New TikTok videos while the bot was offline",
+    },
+}
+
+
+class Blank(dict):
+    # format_map без KeyError: чего источник не знает, то подставляется пустой строкой
+    def __missing__(self, key):
+        return ""
+
+
+def words(values):
+    return tuple(str(value).lower() for value in values or ())
+
+
+def validate_config(config):
+    # Типы проверяются явно: битый routing.json отклоняется с понятной ошибкой, а таблица остаётся прежней
+    config = {**DEFAULT_CONFIG, **config}
+    for key in ("max_concurrency", "channel_burst", "channel_window", "global_rate"):
+        if isinstance(config[key], bool) or not isinstance(config[key], (int, float)):
+            raise ValueError(f"{key} должен быть числом")
+    if config["max_concurrency"] < 1:
+        raise ValueError("max_concurrency должен быть не меньше 1")
+    if config["channel_burst"] < 1 or config["channel_window"] < 0 or config["global_rate"] < 0:
+        raise ValueError("channel_burst должен быть не меньше 1, channel_window и global_rate — не меньше 0")
+    if not isinstance(config["routes"], list) or not isinstance(config["templates"], dict):
+        raise ValueError("routes должен быть списком, templates — объектом")
+    for language, templates in config["templates"].items():
+        if not isinstance(templates, dict) or not all(isinstance(text, str) for text in templates.values()):
+            raise ValueError(f"шаблоны языка {language} должны быть объектом со строками")
+    for number, route in enumerate(config["routes"], 1):
+        if not isinstance(route, dict):
+            raise ValueError(f"маршрут №{number} должен быть объектом")
+        try:
+            int(route.get("channel_id") or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"у маршрута №{number} channel_id не число") from None
+        if not route.get("channel_id"):
+            raise ValueError(f"у маршрута №{number} нет channel_id")
+        for key in ("platforms", "creators", "games", "keywords", "exclude_keywords"):
+            if not isinstance(route.get(key) or [], list):
+                raise ValueError(f"у маршрута №{number} {key} должен быть списком")
+        for key in ("mention", "language"):
+            if not isinstance(route.get(key, ""), str):
+                raise ValueError(f"у маршрута №{number} {key} должен быть строкой")
+        unknown = set(route.get("platforms") or PLATFORMS) - set(PLATFORMS)
+        if unknown:
+            raise ValueError(f"у маршрута №{number} неизвестные платформы: {', '.join(sorted(unknown))}")
+        language = route.get("language", "ru")
+        if language not in DEFAULT_TEMPLATES and language not in config["templates"]:
+            raise ValueError(f"у маршрута №{number} язык {language} без шаблонов")
+
+
+# Один канал Discord и условия, при которых анонс туда уходит. Фильтры уже
+# приведены к нижнему регистру: games сверяется с названием или id игры
+# (только у Twitch, у YouTube и TikTok игры нет), keywords — хотя бы одно
+# слово в названии, exclude_keywords — ни одного.
+class Route:
+    __slots__ = ("channel_id", "mention", "language", "games", "keywords", "exclude", "order")
+
+    def __init__(self, channel_id, mention="", language="ru", games=(), keywords=(), exclude=(), order=0):
+        self.channel_id = int(channel_id)
+        self.mention = mention
+        self.language = language
+        self.games = frozenset(words(games))
+        self.keywords = words(keywords)
+        self.exclude = words(exclude)
+        self.order = order
+
+    @classmethod
+    def from_config(cls, route, order):
+        return cls(
+            route["channel_id"], route.get("mention", ""), route.get("language", "ru"), route.get("games"),
+            route.get("keywords"), route.get("exclude_keywords"), order
+        )
+
+    def matches(self, context):
+        # context=None — без фильтров (например, конец стрима после перезапуска)
+        if context is None:
+            return True
+        if self.games and ("game" in context or "game_id" in context):
+            if str(context.get("game") or "").lower() not in self.games \
+                    and str(context.get("game_id") or "").lower() not in self.games:
+                return False
+        title = str(context.get("title") or "").lower()
+        if self.keywords and not any(word in title for word in self.keywords):
+            return False
+        return not any(word in title for word in self.exclude)
+
+
+# Таблица маршрутов из config/routing.json, один раз собранная в индекс
+# (платформа, автор) -> маршруты. Канал из discord_channel_id конфига cog
+# остаётся «домашним» маршрутом; запись в routing.json для того же канала
+# заменяет его. Эмбед анонса строится один раз, на каждый канал различается
+# только текст сообщения (упоминание и шаблон языка).
+class RoutingTable:
+    def __init__(self, config=None):
+        self.apply_config(config or {})
+
+    @classmethod
+    def from_config(cls, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config)
+
+    def apply_config(self, config, old=None):
+        self.config = {**DEFAULT_CONFIG, **config}
+        self.max_concurrency = int(self.config["max_concurrency"])
+        # Языки из routing.json дополняют встроенные; чего в языке нет, берётся из русского
+        self.templates = {}
+        for language in {*DEFAULT_TEMPLATES, *self.config["templates"]}:
+            self.templates[language] = {
+                **DEFAULT_TEMPLATES["ru"], **DEFAULT_TEMPLATES.get(language, {}), **self.config["templates"].get(language, {})
+            }
+        self.index = {}
+        for order, item in enumerate(self.config["routes"]):
+            route = Route.from_config(item, order)
+            creators = [str(creator).lower() for creator in item.get("creators") or [ANY]]
+            for platform in item.get("platforms") or PLATFORMS:
+                for creator in creators:
+                    self.index.setdefault((platform, creator), []).append(route)
+        # Слияние маршрутов автора и маршрутов "для всех" кэшируется до следующей перезагрузки
+        self.merged = {}
+        if old is not None:
+            print(f"🧭 [Routing] Маршрутов: {len(self.config['routes'])}")
+
+    def candidates(self, platform, creator):
+        key = (platform, str(creator).lower())
+        routes = self.merged.get(key)
+        if routes is None:
+            routes = self.index.get(key, []) + (self.index.get((platform, ANY), []) if key[1] != ANY else [])
+            routes = self.merged[key] = (sorted(routes, key=lambda route: route.order), {route.channel_id for route in routes})
+        return routes
+
+    def render(self, template, route, values):
+        text = self.templates.get(route.language, self.templates["ru"]).get(template, "{mention}")
+        return text.format_map(Blank(values, mention=route.mention)).strip()
+
+    def resolve(self, platform, creator, context, home=None, template=None):
+        # -> [(channel_id, текст)]; home — (discord_channel_id, упоминание) из конфига cog
+        routes, channels = self.candidates(platform, creator)
+        if home is not None and home[0] and int(home[0]) not in channels:
+            routes = [Route(home[0], home[1])] + routes
+        values = {"creator": creator, **(context or {})}
+        targets = {}
+        for route in routes:
+            # Один канал — одно сообщение: берётся первый подходящий маршрут в порядке routing.json
+            if route.channel_id not in targets and route.matches(context):
+                targets[route.channel_id] = self.render(template or platform, route, values)
+        return list(targets.items())
+
+    def resolve_digest(self, platform, items, home=None):
+        # Дайджест после простоя: items — [(автор, context, элемент)] от старых к новым.
+        # -> [([элемент, ...], [(channel_id, текст)])]: каналы с одинаковым набором
+        # элементов получают одни и те же страницы, собранные один раз
+        chosen = {}
+        texts = {}
+        for creator, context, item in items:
+            for channel_id, text in self.resolve(platform, creator, context, home, f"{platform}_digest"):
+                chosen.setdefault(channel_id, []).append(item)
+                texts.setdefault(channel_id, text)
+        groups = {}
+        for channel_id, selected in chosen.items():
+            group = groups.setdefault(tuple(map(id, selected)), (selected, []))
+            group[1].append((channel_id, texts[channel_id]))
+        return list(groups.values())
+
+
+def get_router(bot):
+    router = getattr(bot, "router", None)
+    if router is None:
+        router = bot.router = RoutingTable.from_config()
+        get_config_watcher(bot).watch(CONFIG_PATH, router.apply_config, validate_config)
+    return router
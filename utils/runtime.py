@@ -0,0 +1,76 @@
+import json
+import os
+import time
+
+import disnake
+from disnake.ext import commands
+
+CONFIG_PATH = "config/bot.json"
+
+DEFAULT_CONFIG = {
+    # lean — только то, что нужно уведомлениям; full — прежнее поведение (Intents.all и кэши по умолчанию)
+    "profile": "lean",
+    "extra_intents": [],       # например ["members", "message_content"] для будущих команд
+    "member_cache": False,
+    "max_messages": None,      # None — кэш сообщений выключен
+    "chunk_guilds_at_startup": False,
+}
+
+
+def load_config(path=CONFIG_PATH):
+    config = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    return {**DEFAULT_CONFIG, **config}
+
+
+def build_intents(config):
+    if config["profile"] == "full":
+        return disnake.Intents.all()
+    # Уведомлениям нужен только кэш каналов (get_channel), а он приходит с intent guilds.
+    # Слэш-команды работают без дополнительных intents.
+    intents = disnake.Intents.none()
+    intents.guilds = True
+    for name in config["extra_intents"]:
+        if not hasattr(intents, name):
+            raise ValueError(f"Неизвестный intent в {CONFIG_PATH}: {name}")
+        setattr(intents, name, True)
+    return intents
+
+
+def bot_options(config, prefix="$"):
+    intents = build_intents(config)
+    if config["profile"] == "full":
+        return {"intents": intents, "command_prefix": prefix}
+    return {
+        "intents": intents,
+        # Без message_content префикс-команды не видят текст сообщений, остаётся только упоминание бота
+        "command_prefix": prefix if intents.message_content else commands.when_mentioned,
+        # Кэш участников без intent members всё равно пуст — явно выключаем
+        "member_cache_flags": disnake.MemberCacheFlags.from_intents(intents) if config["member_cache"] else disnake.MemberCacheFlags.none(),
+        "max_messages": config["max_messages"],
+        "chunk_guilds_at_startup": config["chunk_guilds_at_startup"],
+    }
+
+
+# Замер фаз запуска: импорты, конфиги, загрузка cogs, готовность шлюза
+class StartupTimer:
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.last = self.started
+        self.phases = []
+        self.reported = False
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        self.reported = True
+        lines = ["⏱ Запуск по фазам:"]
+        for name, duration in self.phases:
+            lines.append(f"  {name}: {duration * 1000:.0f} мс")
+        lines.append(f"  всего: {(self.last - self.started) * 1000:.0f} мс")
+        return "\n".join(lines)
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+from utils import metrics
+from utils.health import CircuitOpenError
+
+CONFIG_PATH = "config/scheduler.json"
+
+DEFAULT_CONFIG = {
+    "jitter": 0.1,                # ±10% к интервалу, чтобы задачи не стреляли одновременно
+    "max_backoff_seconds": 1800,
+    "ratelimit_reserve": 10,      # при остатке лимита ниже — ждём сброса окна
+    "providers": {
+        # Twitch: 800 точек в минуту на app-токен
+        "twitch": {"rate": 13, "capacity": 800, "host": "api.twitch.tv"},
+        "youtube": {"rate": 1, "capacity": 10},
+        # Бесплатный TikWM: не чаще 1 запроса в секунду
+        "tikwm": {"rate": 1, "capacity": 1, "host": "www.tikwm.com"},
+        "telegram": {"rate": 30, "capacity": 30, "host": "api.telegram.org"},
+    },
+    "jobs": {},
+}
+
+
+def validate_config(config):
+    for name, provider in config.get("providers", {}).items():
+        if provider.get("rate", 1) <= 0 or provider.get("capacity", 1) <= 0:
+            raise ValueError(f"у провайдера {name} rate и capacity должны быть больше нуля")
+    for name, job in config.get("jobs", {}).items():
+        if "interval" in job and job["interval"] <= 0:
+            raise ValueError(f"интервал задачи {name} должен быть больше нуля")
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens=1):
+        while True:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+# Ограничитель запросов к одному провайдеру. Берётся клиентом API перед каждым
+# HTTP-запросом, а не раз на запуск задачи: один опрос клипов — это запрос на
+# каждый канал. Если остаток окна Ratelimit-* почти исчерпан, ждёт его сброса,
+# затем берёт токен из бакета провайдера (бакет ищется заново — его могли
+# добавить горячей перезагрузкой).
+class ProviderLimiter:
+    def __init__(self, scheduler, provider):
+        self.scheduler = scheduler
+        self.provider = provider
+
+    async def acquire(self):
+        wait = self.scheduler.ratelimit_wait(self.provider)
+        if wait:
+            print(f"⏳ [{self.provider}] Лимит почти исчерпан, ждём сброса окна {wait:.0f} с")
+            await asyncio.sleep(wait)
+        bucket = self.scheduler.buckets.get(self.provider)
+        if bucket is not None:
+            await bucket.acquire()
+
+
+class JobStats:
+    __slots__ = ("runs", "errors", "consecutive_errors", "last_duration", "avg_duration",
+                 "max_duration", "last_run", "next_run", "last_delay")
+
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.last_duration = 0.0
+        self.avg_duration = 0.0
+        self.max_duration = 0.0
+        self.last_run = None
+        self.next_run = None
+        self.last_delay = 0.0
+
+    def record(self, duration, failed):
+        self.runs += 1
+        self.last_run = time.time()
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        # Скользящее среднее, чтобы не хранить историю
+        self.avg_duration = duration if self.runs == 1 else self.avg_duration * 0.8 + duration * 0.2
+        if failed:
+            self.errors += 1
+            self.consecutive_errors += 1
+        else:
+            self.consecutive_errors = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Job:
+    def __init__(self, name, func, interval, provider=None, interval_fn=None, run_immediately=True, wait_ready=True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.default_interval = interval
+        self.provider = provider
+        self.interval_fn = interval_fn
+        self.run_immediately = run_immediately
+        self.wait_ready = wait_ready
+        self.stats = JobStats()
+        self.task = None
+
+
+# Один планировщик для всех опросов: джиттер, экспоненциальная пауза после
+# ошибок, токен-бакеты на провайдера и учёт заголовков Ratelimit-* из ответов
+# (через limiter() — на каждый запрос клиентов API).
+# Пока предохранитель провайдера разомкнут (utils/health.py), его задачи не запускаются.
+# Задача может сама подсказывать следующий интервал через interval_fn().
+class Scheduler:
+    def __init__(self, bot, config=None):
+        self.bot = bot
+        self.config = self.merge_config(config or {})
+        self.jobs = {}
+        self.buckets = {
+            name: TokenBucket(provider["rate"], provider["capacity"])
+            for name, provider in self.config["providers"].items()
+        }
+        self.limiters = {}
+
+    @staticmethod
+    def merge_config(config):
+        merged = {**DEFAULT_CONFIG, **config}
+        merged["providers"] = {**DEFAULT_CONFIG["providers"], **config.get("providers", {})}
+        return merged
+
+    @classmethod
+    def from_config(cls, bot, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(bot, config)
+
+    def limiter(self, provider):
+        limiter = self.limiters.get(provider)
+        if limiter is None:
+            limiter = self.limiters[provider] = ProviderLimiter(self, provider)
+        return limiter
+
+    def apply_config(self, config, old=None):
+        # Горячая перезагрузка: бакеты меняют скорость, но сохраняют накопленные токены,
+        # задачи не перезапускаются — новый интервал действует со следующей паузы
+        self.config = self.merge_config(config)
+        for name, provider in self.config["providers"].items():
+            bucket = self.buckets.get(name)
+            if bucket is None:
+                self.buckets[name] = TokenBucket(provider["rate"], provider["capacity"])
+                continue
+            bucket._refill()
+            bucket.rate = provider["rate"]
+            bucket.capacity = provider["capacity"]
+            bucket.tokens = min(bucket.tokens, bucket.capacity)
+        for job in self.jobs.values():
+            job.interval = self.config["jobs"].get(job.name, {}).get("interval", job.default_interval)
+
+    def add_job(self, name, func, interval, provider=None, interval_fn=None, run_immediately=True, wait_ready=True):
+        # wait_ready=False — задача не ждёт подключения к Discord (служебная, без обращений к нему)
+        self.remove_job(name)
+        job = self.jobs[name] = Job(name, func, interval, provider, interval_fn, run_immediately, wait_ready)
+        # Интервал из config/scheduler.json важнее значения по умолчанию из cog
+        job.interval = self.config["jobs"].get(name, {}).get("interval", interval)
+        job.task = asyncio.ensure_future(self._run(job), loop=self.bot.loop)
+        # По имени задачи сторож цикла (utils/watchdog.py) и профайлер показывают, чья это работа
+        job.task.set_name(f"job:{name}")
+        return job
+
+    def remove_job(self, name):
+        job = self.jobs.pop(name, None)
+        if job is not None and job.task is not None:
+            job.task.cancel()
+
+    def next_delay(self, job):
+        interval = job.interval_fn() if job.interval_fn else job.interval
+        failures = job.stats.consecutive_errors
+        if failures:
+            interval = min(self.config["max_backoff_seconds"], interval * 2 ** failures)
+        jitter = self.config["jitter"]
+        return max(1.0, interval * random.uniform(1 - jitter, 1 + jitter))
+
+    def ratelimit_wait(self, provider):
+        host = self.config["providers"].get(provider, {}).get("host")
+        http = getattr(self.bot, "http_client", None)
+        if not host or http is None:
+            return 0
+        limit = http.rate_limits.get(host)
+        if not limit:
+            return 0
+        remaining, reset_at = limit
+        if remaining is not None and remaining > self.config["ratelimit_reserve"]:
+            return 0
+        return max(0, reset_at - time.time())
+
+    def circuit_wait(self, provider):
+        http = getattr(self.bot, "http_client", None)
+        if http is None or http.health.available(provider):
+            return 0
+        return http.health.retry_in(provider)
+
+    async def _run(self, job):
+        if job.wait_ready:
+            await self.bot.wait_until_ready()
+        delay = 0 if job.run_immediately else self.next_delay(job)
+        while True:
+            job.stats.last_delay = delay
+            job.stats.next_run = time.time() + delay
+            await asyncio.sleep(delay)
+
+            if job.provider:
+                blocked = self.circuit_wait(job.provider)
+                if blocked:
+                    # Провайдер лежит: не тратим сокеты и не копим ошибки, заглянем к пробному окну
+                    metrics.job_runs.inc(job.name, "skipped")
+                    delay = max(blocked, self.next_delay(job))
+                    continue
+
+            started = time.perf_counter()
+            failed = False
+            try:
+                await job.func()
+            except asyncio.CancelledError:
+                raise
+            except CircuitOpenError as e:
+                # Пробный запрос уже занят другой задачей — это не ошибка самой задачи
+                print(f"🔌 [{job.name}] {e}")
+            except Exception as e:
+                failed = True
+                print(f"❌ [{job.name}] Ошибка задачи: {type(e).__name__} - {e}")
+            duration = time.perf_counter() - started
+            job.stats.record(duration, failed)
+            metrics.job_duration.observe(duration, job.name)
+            metrics.job_runs.inc(job.name, "error" if failed else "ok")
+            delay = self.next_delay(job)
+
+    def stats(self):
+        return {name: job.stats.as_dict() for name, job in self.jobs.items()}
+
+    def format_stats(self):
+        lines = []
+        for name, stats in sorted(self.stats().items()):
+            lines.append(
+                f"{name}: запусков {stats['runs']}, ошибок {stats['errors']}, "
+                f"среднее {stats['avg_duration'] * 1000:.0f} мс, макс {stats['max_duration'] * 1000:.0f} мс, "
+                f"следующий через {stats['last_delay']:.0f} с"
+            )
+        return "\n".join(lines)
+
+
+def get_scheduler(bot):
+    scheduler = getattr(bot, "scheduler", None)
+    if scheduler is None:
+        scheduler = bot.scheduler = Scheduler.from_config(bot)
+    return scheduler
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+from utils.persist import WriteBehind
+from utils.scheduler import get_scheduler
+
+DB_PATH = "data/seen.sqlite3"
+CONFIG_PATH = "config/storage.json"
+
+DEFAULT_RETENTION = {
+    "max_items": 5000,   # сколько последних id храним на источник
+    "max_age_days": 0,   # 0 — не удалять по возрасту
+    "compact_hours": 6,  # как часто применять политику хранения
+}
+
+
+# Хранилище уже опубликованного контента: (источник, id) -> message_id в Discord.
+# Проверка членства и поиск сообщения идут по первичному ключу SQLite,
+# старые записи периодически удаляются политикой хранения (compact()).
+# Новые записи копятся в pending и пачкой коммитятся в отдельном потоке;
+# в том же потоке идёт и чистка, чтобы DELETE и VACUUM не держали цикл событий.
+class SeenStore(WriteBehind):
+    def __init__(self, path=DB_PATH, retention=None):
+        super().__init__()
+        self.path = path
+        self.pending = {}
+        self._writer = None
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " source TEXT NOT NULL,"
+            " item_id TEXT NOT NULL,"
+            " message_id INTEGER,"
+            " seen_at REAL NOT NULL,"
+            " PRIMARY KEY (source, item_id)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS seen_by_age ON seen (source, seen_at)")
+        self.conn.commit()
+
+    def __repr__(self):
+        return f"<SeenStore {self.path}>"
+
+    def contains(self, source, item_id):
+        if (source, str(item_id)) in self.pending:
+            return True
+        row = self.conn.execute(
+            "SELECT 1 FROM seen WHERE source = ? AND item_id = ?", (source, str(item_id))
+        ).fetchone()
+        return row is not None
+
+    def filter_new(self, source, item_ids):
+        item_ids = [str(item_id) for item_id in item_ids]
+        if not item_ids:
+            return []
+        known = set()
+        # SQLite ограничивает число параметров, поэтому проверяем пачками
+        for start in range(0, len(item_ids), 500):
+            chunk = item_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT item_id FROM seen WHERE source = ? AND item_id IN ({placeholders})", (source, *chunk)
+            )
+            known.update(row[0] for row in rows)
+        return [item_id for item_id in item_ids if item_id not in known and (source, item_id) not in self.pending]
+
+    def add(self, source, item_id, message_id=None):
+        key = (source, str(item_id))
+        previous = self.pending.get(key)
+        if message_id is None and previous is not None:
+            message_id = previous[0]
+        self.pending[key] = (message_id, time.time())
+        self.mark_dirty()
+
+    def take_snapshot(self):
+        # pending остаётся видимым для проверок, пока запись не закоммичена
+        return dict(self.pending)
+
+    def snapshot_written(self, snapshot):
+        for key, value in snapshot.items():
+            if self.pending.get(key) is value:
+                del self.pending[key]
+
+    def write_snapshot(self, snapshot):
+        with self.writer():
+            self._writer.executemany(
+                "INSERT INTO seen (source, item_id, message_id, seen_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (source, item_id) DO UPDATE SET message_id = COALESCE(excluded.message_id, message_id)",
+                [(source, item_id, message_id, seen_at) for (source, item_id), (message_id, seen_at) in snapshot.items()]
+            )
+
+    def message_id(self, source, item_id):
+        pending = self.pending.get((source, str(item_id)))
+        if pending is not None and pending[0] is not None:
+            return pending[0]
+        row = self.conn.execute(
+            "SELECT message_id FROM seen WHERE source = ? AND item_id = ?", (source, str(item_id))
+        ).fetchone()
+        return row[0] if row else None
+
+    def count(self, source):
+        return self.conn.execute("SELECT COUNT(*) FROM seen WHERE source = ?", (source,)).fetchone()[0]
+
+    def writer(self):
+        # Вызывается только из потока записи, поэтому у него своё соединение
+        if self._writer is None:
+            self._writer = sqlite3.connect(self.path, check_same_thread=False)
+        return self._writer
+
+    async def compact(self):
+        # Политика хранения для всех источников, в потоке записи
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.compact_sync)
+
+    def compact_sync(self):
+        conn = self.writer()
+        removed = {}
+        with conn:
+            for (source,) in conn.execute("SELECT DISTINCT source FROM seen").fetchall():
+                count = 0
+                max_items = self.retention["max_items"]
+                if max_items:
+                    count += conn.execute(
+                        "DELETE FROM seen WHERE source = ? AND seen_at < ("
+                        " SELECT seen_at FROM seen WHERE source = ? ORDER BY seen_at DESC LIMIT 1 OFFSET ?)",
+                        (source, source, max_items - 1)
+                    ).rowcount
+                max_age_days = self.retention["max_age_days"]
+                if max_age_days:
+                    count += conn.execute(
+                        "DELETE FROM seen WHERE source = ? AND seen_at < ?",
+                        (source, time.time() - max_age_days * 86400)
+                    ).rowcount
+                if count:
+                    removed[source] = count
+                    print(f"🧹 [{source}] Удалено старых записей: {count}")
+        if removed:
+            conn.execute("VACUUM")
+        return removed
+
+    def migrate_json(self, source, path, list_key, id_key):
+        # Одноразовый перенос data/video_db_*.json; файл переименовывается в *.migrated
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError as e:
+            print(f"❌ Не удалось прочитать {path} для миграции: {e}")
+            return 0
+
+        messages = {str(entry[id_key]): entry["message_id"] for entry in data.get("messages", [])}
+        item_ids = data.get(list_key, [])
+        # Сохраняем исходный порядок как порядок добавления
+        base = time.time() - len(item_ids)
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO seen (source, item_id, message_id, seen_at) VALUES (?, ?, ?, ?)",
+            [(source, str(item_id), messages.get(str(item_id)), base + i) for i, item_id in enumerate(item_ids)]
+        )
+        self.conn.commit()
+        os.replace(path, path + ".migrated")
+        print(f"📦 [{source}] Перенесено {len(item_ids)} записей из {path}")
+        return len(item_ids)
+
+    def close(self):
+        self.flush_sync()
+        self._executor.shutdown()
+        if self._writer is not None:
+            self._writer.close()
+        self.conn.close()
+
+
+def get_seen_store(bot):
+    store = getattr(bot, "seen_store", None)
+    if store is None:
+        config = {}
+        if os.path.exists(CONFIG_PATH):
+            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        store = bot.seen_store = SeenStore(config.get("seen_db", DB_PATH), config.get("retention"))
+        get_scheduler(bot).add_job("seen_compact", store.compact, store.retention["compact_hours"] * 3600)
+    return store
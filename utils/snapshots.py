@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+REFRESH_COOLDOWN = 30  # чаще этого один ключ не обновляем, даже если он устарел
+
+
+class Snapshot:
+    __slots__ = ("value", "updated_at", "ttl", "origin")
+
+    def __init__(self, value, ttl, origin):
+        self.value = value
+        self.updated_at = time.time()
+        self.ttl = ttl
+        self.origin = origin  # poll — кладёт опрос, refresh — обновлён по запросу команды
+
+    @property
+    def age(self):
+        return time.time() - self.updated_at
+
+    @property
+    def fresh(self):
+        return self.age <= self.ttl
+
+
+# Последнее, что опросы узнали о каждом источнике (стрим, последняя загрузка,
+# последний клип), в памяти и с отметкой свежести. Команды читают отсюда без
+# запросов к API; устаревший ключ обновляется через зарегистрированную функцию,
+# и одновременные запросы одного ключа ждут одно общее обновление.
+class SnapshotCache:
+    def __init__(self):
+        self.entries = {}
+        self.refreshers = {}
+        self.inflight = {}
+        self.attempted = {}
+
+    def put(self, key, value, ttl, origin="poll"):
+        self.entries[key] = Snapshot(value, ttl, origin)
+
+    def touch(self, key, ttl=None):
+        # Опрос прошёл, но ничего не поменялось (например, 304 от RSS)
+        snapshot = self.entries.get(key)
+        if snapshot is not None:
+            snapshot.updated_at = time.time()
+            snapshot.ttl = ttl or snapshot.ttl
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def names(self, kind):
+        return sorted(key.split(":", 1)[1] for key in self.entries if key.startswith(f"{kind}:"))
+
+    def forget(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self, kind):
+        for key in [key for key in self.entries if key.startswith(f"{kind}:")]:
+            del self.entries[key]
+
+    def register(self, kind, refresher, ttl):
+        # refresher(name) -> значение для ключа "<kind>:<name>" или None, если нечего класть
+        self.refreshers[kind] = (refresher, ttl)
+
+    def unregister(self, kind):
+        self.refreshers.pop(kind, None)
+
+    def needs_refresh(self, key):
+        snapshot = self.entries.get(key)
+        if snapshot is not None and snapshot.fresh:
+            return False
+        if key.split(":", 1)[0] not in self.refreshers:
+            return False
+        return time.time() - self.attempted.get(key, 0) >= REFRESH_COOLDOWN
+
+    async def fetch(self, key):
+        # Свежий снимок — сразу; устаревший — после обновления, а при ошибке обновления — какой есть
+        if not self.needs_refresh(key) and key not in self.inflight:
+            return self.entries.get(key)
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.ensure_future(self.refresh(key))
+        try:
+            await asyncio.shield(task)
+        except Exception as e:
+            print(f"⚠️ [Snapshots] Не удалось обновить {key}: {type(e).__name__} - {e}")
+        return self.entries.get(key)
+
+    async def refresh(self, key):
+        kind, name = key.split(":", 1)
+        refresher, ttl = self.refreshers[kind]
+        self.attempted[key] = time.time()
+        try:
+            value = await refresher(name)
+            if value is not None:
+                self.put(key, value, ttl, "refresh")
+        finally:
+            self.inflight.pop(key, None)
+
+
+def get_snapshots(bot):
+    snapshots = getattr(bot, "snapshots", None)
+    if snapshots is None:
+        snapshots = bot.snapshots = SnapshotCache()
+    return snapshots
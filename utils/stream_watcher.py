@@ -0,0 +1,326 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from utils import metrics
+from utils.cluster import get_cluster
+from utils.config_watcher import get_config_watcher
+from utils.endpoints import base_url
+from utils.http import get_http_client
+from utils.persist import open_json_store
+from utils.scheduler import get_scheduler
+from utils.snapshots import get_snapshots
+from utils.twitch_auth import get_twitch_auth
+from utils.twitch_users import BATCH_SIZE, BroadcasterDirectory, batches, check_config, config_logins
+
+CONFIG_PATH = "config/twitch.json"
+STATE_PATH = "stream_state.json"
+
+
+def stream_session(login, stream):
+    # Ключ заявки стрима в кластере: id стрима из Helix (есть и в stream.online
+    # у EventSub), поэтому опрос и вебхук дают один и тот же ключ
+    return f"{login}:{stream.get('id') or stream.get('started_at')}"
+
+
+def stream_snapshot(stream):
+    # Что показывает /status stream: без запроса к Helix
+    if not stream:
+        return {"live": False}
+    return {
+        "live": True,
+        "title": stream.get("title"),
+        "game": stream.get("game_name"),
+        "viewers": stream.get("viewer_count"),
+        "started_at": stream.get("started_at"),
+    }
+
+
+# Единственный источник правды о статусе стрима: опрашивает /helix/streams
+# (или получает события EventSub), ведёт состояние с гистерезисом и рассылает
+# переходы подключённым приёмникам (Discord, Telegram, ...). Файл состояния
+# пишет только он. В кластере опрашивает только свою долю каналов, а каждое
+# уведомление заявляет в общей базе, чтобы его отправил ровно один воркер.
+#
+# Приёмник — любой объект с методами:
+#     async def on_stream_online(self, login, stream)
+#     async def on_stream_offline(self, login)
+# Приёмник с queued = True сам ставит анонс в очередь utils/outbox.py, которая
+# заявляет его тем же ключом и подтверждает только после отправки: если воркер
+# упадёт раньше, анонс отправит тот, к кому переедет канал.
+class StreamWatcher:
+    def __init__(self, bot, config):
+        self.bot = bot
+        self.auth = get_twitch_auth(bot, config["client_id"], config["client_secret"])
+        self.directory = BroadcasterDirectory(self.auth)
+        self.http = get_http_client(bot)
+        self.configure(config)
+
+        self.sinks = {}
+        self.store = open_json_store(STATE_PATH, {"broadcasters": {}})
+        self.migrate_legacy_state()
+        self._locks = {}
+        self._rechecks = {}
+        self.scheduler = get_scheduler(bot)
+        self.cluster = get_cluster(bot)
+        self.snapshots = get_snapshots(bot)
+        self.snapshots.register("twitch", self.refresh_snapshot, self.poll_interval)
+        get_config_watcher(bot).watch(CONFIG_PATH, self.apply_config, check_config)
+
+        bot.add_listener(self.on_twitch_stream_online)
+        bot.add_listener(self.on_twitch_stream_offline)
+
+    def configure(self, config):
+        self.config = config
+        self.logins = config_logins(config)
+        eventsub = config.get("eventsub", {})
+        self.eventsub_enabled = eventsub.get("enabled", False)
+        # С EventSub опрос нужен только как страховка на случай потерянных событий
+        self.fallback_interval = eventsub.get("fallback_poll_minutes", 15) * 60
+        self.poll_interval = config.get("poll_seconds", 60)
+        # Рядом с привычным временем начала стрима опрашиваем чаще, в остальное время — реже
+        self.active_interval = config.get("active_poll_seconds", max(15, self.poll_interval // 2))
+        self.idle_interval = config.get("idle_poll_seconds", self.poll_interval * 2)
+        # Сколько секунд стрим должен отсутствовать, чтобы считаться завершённым:
+        # короткие обрывы не превращаются в "завершён" + "начался"
+        self.offline_grace = config.get("offline_grace_seconds", 180)
+
+    def apply_config(self, config, old):
+        # Новые каналы подхватит ближайший опрос (id — из тёплого кэша каталога),
+        # у убранных просто забываем состояние; токен приложения не сбрасывается
+        before = set(self.logins)
+        self.configure(config)
+        self.snapshots.register("twitch", self.refresh_snapshot, self.poll_interval)
+        if (config["client_id"], config["client_secret"]) != (old.get("client_id"), old.get("client_secret")):
+            self.auth = self.directory.auth = get_twitch_auth(self.bot, config["client_id"], config["client_secret"])
+        added = set(self.logins) - before
+        removed = before - set(self.logins)
+        for login in removed:
+            self.store.data["broadcasters"].pop(login, None)
+            self._locks.pop(login, None)
+            recheck = self._rechecks.pop(login, None)
+            if recheck is not None:
+                recheck.cancel()
+            self.snapshots.forget(f"twitch:{login}")
+        if removed:
+            self.store.mark_dirty()
+        if added or removed:
+            print(f"♻️ [StreamWatcher] Каналов {len(self.logins)}: +{len(added)} / -{len(removed)}")
+
+    def migrate_legacy_state(self):
+        # Старый формат: {"stream_live": ..., "notified_discord": ..., "notified_telegram": ...}
+        data = self.store.data
+        if "stream_live" not in data:
+            return
+        if not self.logins:
+            # Некому приписать старое состояние — начинаем с чистого
+            self.store.data = {"broadcasters": {}}
+            self.store.mark_dirty()
+            return
+        self.store.data = {"broadcasters": {self.logins[0]: {
+            "live": data.get("stream_live", False),
+            "offline_since": None,
+            "notified": {
+                "discord": data.get("notified_discord", False),
+                "telegram": data.get("notified_telegram", False),
+            },
+        }}}
+        self.store.mark_dirty()
+
+    def state_for(self, login):
+        broadcasters = self.store.data["broadcasters"]
+        if login not in broadcasters:
+            broadcasters[login] = {"live": False, "offline_since": None, "notified": {}}
+        return broadcasters[login]
+
+    def add_sink(self, name, sink):
+        if not self.sinks:
+            self.http.acquire()
+            self.scheduler.add_job("twitch_streams", self.poll, self.poll_interval, provider="twitch", interval_fn=self.next_interval)
+        self.sinks[name] = sink
+
+    def remove_sink(self, name):
+        self.sinks.pop(name, None)
+        if not self.sinks:
+            self.scheduler.remove_job("twitch_streams")
+            self.store.flush_sync()
+            self.http.release()
+
+    @staticmethod
+    def hour_of_week(timestamp=None):
+        moment = datetime.fromtimestamp(timestamp or time.time())
+        return moment.weekday() * 24 + moment.hour
+
+    def next_interval(self):
+        if self.eventsub_enabled:
+            return self.fallback_interval
+        broadcasters = self.store.data["broadcasters"]
+        if any(state["live"] for state in broadcasters.values()):
+            return self.poll_interval
+        # Час недели, в который канал уже хотя бы дважды начинал стрим, и час до него
+        now = self.hour_of_week()
+        window = {str(now), str((now + 1) % 168)}
+        for state in broadcasters.values():
+            history = state.get("golive_hours", {})
+            if any(history.get(hour, 0) >= 2 for hour in window):
+                return self.active_interval
+        return self.idle_interval
+
+    async def poll(self):
+        logins = self.cluster.filter_owned(self.logins) if self.cluster else self.logins
+        ids, streams = await self.fetch_streams(logins)
+        await asyncio.gather(*(self.observe(login, streams.get(login)) for login in ids))
+
+    async def fetch_streams(self, logins):
+        # Один запрос /streams на каждые 100 каналов, а не на каждый канал
+        ids = await self.directory.resolve(logins)
+        streams = {}
+        for chunk in batches(list(ids.values())):
+            params = [("user_id", user_id) for user_id in chunk] + [("first", BATCH_SIZE)]
+            data = await self.auth.request("GET", f"{base_url('twitch_helix')}/streams", params=params)
+            if "data" not in data:
+                raise RuntimeError(f"Нет поля 'data' в ответе Twitch API: {data}")
+            for stream in data["data"]:
+                streams[stream["user_login"].lower()] = stream
+        return ids, streams
+
+    async def refresh_snapshot(self, login):
+        # Для команд: один запрос по одному каналу, состояние и уведомления не трогаем
+        if login not in self.logins:
+            return None
+        ids, streams = await self.fetch_streams([login])
+        return stream_snapshot(streams.get(login)) if login in ids else None
+
+    def snapshot_ttl(self):
+        # Снимок считается свежим до следующего планового опроса с запасом на джиттер
+        return self.next_interval() * 1.2 + 5
+
+    async def observe(self, login, stream):
+        lock = self._locks.get(login)
+        if lock is None:
+            lock = self._locks[login] = asyncio.Lock()
+        async with lock:
+            self.snapshots.put(f"twitch:{login}", stream_snapshot(stream), self.snapshot_ttl())
+            state = self.state_for(login)
+            if stream:
+                await self._observe_online(login, state, stream)
+            elif state["live"]:
+                await self._observe_offline(login, state)
+
+    async def _observe_online(self, login, state, stream):
+        if state["offline_since"] is not None:
+            state["offline_since"] = None
+            self.store.mark_dirty()
+        if not state["live"]:
+            print(f"🔴 [StreamWatcher] {login} начал стрим")
+            state["live"] = True
+            state["notified"] = {}
+            state["session"] = stream.get("id") or stream.get("started_at")
+            history = state.setdefault("golive_hours", {})
+            hour = str(self.hour_of_week())
+            history[hour] = history.get(hour, 0) + 1
+            self.store.mark_dirty()
+
+        pending = [name for name in self.sinks if not state["notified"].get(name)]
+        session = stream_session(login, stream)
+        if self.cluster is not None:
+            pending = await self.claim_sinks(state, pending, session)
+        if not pending:
+            return
+        results = await asyncio.gather(
+            *(self.sinks[name].on_stream_online(login, stream) for name in pending),
+            return_exceptions=True
+        )
+        for name, result in zip(pending, results):
+            if isinstance(result, Exception):
+                # Флаг не ставим — приёмник получит повтор на следующем опросе
+                print(f"❌ [StreamWatcher] Приёмник {name} не отправил уведомление: {result}")
+            else:
+                state["notified"][name] = True
+                metrics.observe_lag(f"twitch_{name}", stream.get("started_at"))
+                if self.cluster is not None and not getattr(self.sinks[name], "queued", False):
+                    await self.cluster.confirm(f"twitch_{name}", session)
+        self.store.mark_dirty()
+
+    async def claim_sinks(self, state, pending, session):
+        claimed = []
+        for name in pending:
+            if getattr(self.sinks[name], "queued", False):
+                claimed.append(name)
+            elif await self.cluster.claim(f"twitch_{name}", session):
+                claimed.append(name)
+            else:
+                # Уведомление уже отправил (или отправляет) другой воркер
+                state["notified"][name] = True
+                self.store.mark_dirty()
+        return claimed
+
+    async def _observe_offline(self, login, state):
+        now = time.time()
+        if state["offline_since"] is None:
+            state["offline_since"] = now
+            self.store.mark_dirty()
+            self.schedule_recheck(login)
+            return
+        if now - state["offline_since"] < self.offline_grace:
+            return
+
+        print(f"⚪ [StreamWatcher] {login} завершил стрим")
+        session = f"{login}:{state.pop('session', None)}"
+        state["live"] = False
+        state["offline_since"] = None
+        state["notified"] = {}
+        self.store.mark_dirty()
+        if self.cluster is not None:
+            if not await self.cluster.claim("twitch_offline", session):
+                return
+            await self.cluster.confirm("twitch_offline", session)
+        results = await asyncio.gather(
+            *(sink.on_stream_offline(login) for sink in self.sinks.values()),
+            return_exceptions=True
+        )
+        for name, result in zip(self.sinks, results):
+            if isinstance(result, Exception):
+                print(f"❌ [StreamWatcher] Приёмник {name} не обработал завершение стрима: {result}")
+
+    def schedule_recheck(self, login):
+        # Подтверждаем завершение отдельной проверкой канала после окна гистерезиса,
+        # не дожидаясь следующего (возможно, редкого) планового опроса.
+        # У каждого канала своя проверка: чужая её не отменяет и не заменяет
+        task = self._rechecks.get(login)
+        if task is not None and not task.done():
+            return
+
+        async def recheck():
+            await asyncio.sleep(self.offline_grace + 1)
+            try:
+                ids, streams = await self.fetch_streams([login])
+                if login in ids:
+                    await self.observe(login, streams.get(login))
+            except Exception as e:
+                print(f"❌ [StreamWatcher] Ошибка повторной проверки {login}: {e}")
+            finally:
+                if self._rechecks.get(login) is task:
+                    self._rechecks.pop(login, None)
+
+        task = self._rechecks[login] = asyncio.ensure_future(recheck())
+
+    async def on_twitch_stream_online(self, stream):
+        login = stream["user_login"].lower()
+        if login in self.logins:
+            await self.observe(login, stream)
+
+    async def on_twitch_stream_offline(self, login):
+        login = login.lower()
+        if login in self.logins:
+            await self.observe(login, None)
+
+
+def get_stream_watcher(bot):
+    watcher = getattr(bot, "stream_watcher", None)
+    if watcher is None:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        watcher = bot.stream_watcher = StreamWatcher(bot, config)
+    return watcher
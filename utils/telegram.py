@@ -0,0 +1,267 @@
+import asyncio
+import html
+import json
+import os
+import re
+import time
+from types import SimpleNamespace
+
+import aiohttp
+
+from utils.config_watcher import get_config_watcher
+from utils.endpoints import base_url
+from utils.http import get_http_client
+from utils.scheduler import get_scheduler
+
+CONFIG_PATH = "config/telegram.json"
+CHAT_PREFIX = "tg:"      # так помечены чаты Telegram среди каналов очереди анонсов
+
+DEFAULT_CONFIG = {
+    "token": None,
+    "chat_id": None,         # один чат, как раньше
+    "chat_ids": [],          # или сразу несколько
+    "sources": ["twitch"],   # что ещё зеркалить в Telegram: youtube, tiktok, clips
+    "max_concurrency": 10,   # сколько чатов рассылаем параллельно
+    # Telegram: не больше сообщения в секунду в личный чат и ~20 в минуту в группу или канал
+    "private_interval": 1.0,
+    "group_interval": 3.0,
+}
+
+MAX_ATTEMPTS = 5
+RETRY_BASE = 2
+TEXT_LIMIT = 4096
+CAPTION_LIMIT = 1024
+MEDIA_GROUP_LIMIT = 10
+
+MENTION = re.compile(r"@everyone|@here|<@[!&]?\d+>")
+LINK = re.compile(r"\[([^\]]+)\]\((https?://[^)\s]+)\)")
+BOLD = re.compile(r"\*\*(.+?)\*\*")
+TIMESTAMP = re.compile(r"&lt;t:(\d+)(?::\w)?&gt;")
+
+
+class TelegramError(RuntimeError):
+    def __init__(self, method, status, description):
+        super().__init__(f"{method}: {status} {description}")
+        # 400/403 — чат не найден, бот исключён и т.п.: повтор не поможет
+        self.permanent = status in (400, 403)
+
+
+def chat_key(chat_id):
+    return f"{CHAT_PREFIX}{chat_id}"
+
+
+def is_chat_key(channel_id):
+    return isinstance(channel_id, str) and channel_id.startswith(CHAT_PREFIX)
+
+
+def chat_of(channel_id):
+    return channel_id[len(CHAT_PREFIX):]
+
+
+def markdown_to_html(text):
+    # Эмбеды пишутся в разметке Discord, Telegram понимает HTML
+    text = html.escape(text, quote=False)
+    # html.escape уже превратил & в &amp;, в ссылке остаётся экранировать только кавычки
+    text = LINK.sub(lambda m: '<a href="{}">{}</a>'.format(m.group(2).replace('"', "%22"), m.group(1)), text)
+    text = BOLD.sub(r"<b>\1</b>", text)
+    return TIMESTAMP.sub(lambda m: time.strftime("%d.%m %H:%M", time.localtime(int(m.group(1)))), text)
+
+
+def embed_text(embed):
+    lines = []
+    title = embed.get("title")
+    if title:
+        title = html.escape(title, quote=False)
+        url = embed.get("url")
+        lines.append(f'<b><a href="{html.escape(url)}">{title}</a></b>' if url else f"<b>{title}</b>")
+    if embed.get("description"):
+        lines.append(markdown_to_html(embed["description"]))
+    for field in embed.get("fields") or []:
+        lines.append(f"<b>{html.escape(field['name'], quote=False)}:</b> {markdown_to_html(field['value'])}")
+    return "\n".join(lines)
+
+
+def entry_photo(entry):
+    # Карточка из utils/cards.py загружается файлом, остальное Telegram скачает по ссылке сам
+    card = entry.get("card")
+    if card:
+        return card["path"] if os.path.exists(card["path"]) else card["fallback"]
+    url = ((entry["embed"] or {}).get("image") or {}).get("url")
+    if url and not url.startswith("attachment://"):
+        return url
+    return None
+
+
+def split_text(text, limit=TEXT_LIMIT):
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    return chunks + [text] if text else chunks
+
+
+def validate_config(config):
+    config = {**DEFAULT_CONFIG, **config}
+    if not config["token"]:
+        raise ValueError("нужен token")
+    if not config["chat_id"] and not config["chat_ids"]:
+        raise ValueError("нужен chat_id или chat_ids")
+    if not isinstance(config["chat_ids"], list) or not isinstance(config["sources"], list):
+        raise ValueError("chat_ids и sources должны быть списками")
+    if int(config["max_concurrency"]) < 1:
+        raise ValueError("max_concurrency должен быть не меньше 1")
+
+
+# Клиент Bot API поверх общего HTTP-пула: соединение с api.telegram.org
+# переиспользуется, 429 ждёт parameters.retry_after, каждый чат получает свой
+# темп отправки, а глобальный лимит держит корзина "telegram" планировщика.
+# Превью уходят через sendPhoto/sendMediaGroup, без разворачивания ссылок.
+class TelegramClient:
+    def __init__(self, http, config=None, bucket=None):
+        self.http = http
+        self.bucket = bucket
+        self.next_send = {}
+        self.locks = {}
+        self.apply_config(config or {})
+
+    @classmethod
+    def from_config(cls, http, bucket=None, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(http, config, bucket)
+
+    def apply_config(self, config, old=None):
+        config = {**DEFAULT_CONFIG, **config}
+        self.token = config["token"]
+        chats = ([config["chat_id"]] if config["chat_id"] else []) + list(config["chat_ids"])
+        self.chats = list(dict.fromkeys(chats))
+        self.sources = set(config["sources"])
+        self.max_concurrency = int(config["max_concurrency"])
+        self.private_interval = float(config["private_interval"])
+        self.group_interval = float(config["group_interval"])
+
+    @property
+    def enabled(self):
+        return bool(self.token and self.chats)
+
+    def chats_for(self, source):
+        return self.chats if self.enabled and source in self.sources else []
+
+    async def pace(self, chat_id):
+        interval = self.group_interval if chat_id.startswith("-") else self.private_interval
+        now = time.monotonic()
+        ready = self.next_send.get(chat_id, 0)
+        if ready > now:
+            await asyncio.sleep(ready - now)
+        self.next_send[chat_id] = max(now, ready) + interval
+        if self.bucket is not None:
+            await self.bucket.acquire()
+
+    def payload(self, params, uploads):
+        if not uploads:
+            return {"json": params}
+        form = aiohttp.FormData()
+        for name, value in params.items():
+            form.add_field(name, value if isinstance(value, str) else json.dumps(value))
+        for name, path in uploads.items():
+            with open(path, "rb") as f:
+                form.add_field(name, f.read(), filename=os.path.basename(path))
+        return {"data": form}
+
+    async def call(self, method, params, uploads=None):
+        # uploads — {имя поля: путь к файлу}; тогда запрос уходит multipart
+        chat_id = str(params["chat_id"])
+        url = f"{base_url('telegram')}/bot{self.token}/{method}"
+        lock = self.locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                await self.pace(chat_id)
+                try:
+                    async with self.http.post(url, **self.payload(params, uploads)) as resp:
+                        status = resp.status
+                        body = await resp.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    if attempt == MAX_ATTEMPTS:
+                        raise
+                    print(f"⚠️ [Telegram] {method} в {chat_id}: {type(e).__name__}, повтор")
+                    await asyncio.sleep(RETRY_BASE ** attempt)
+                    continue
+
+                if status == 200 and body.get("ok"):
+                    return body["result"]
+                description = body.get("description")
+                if attempt < MAX_ATTEMPTS and status == 429:
+                    retry_after = (body.get("parameters") or {}).get("retry_after", 1)
+                    # Весь чат ждёт: следующие сообщения в него тоже упрутся в лимит
+                    self.next_send[chat_id] = time.monotonic() + retry_after
+                    print(f"⏳ [Telegram] Лимит в чате {chat_id}, ждём {retry_after} с")
+                    continue
+                if attempt < MAX_ATTEMPTS and status >= 500:
+                    await asyncio.sleep(RETRY_BASE ** attempt)
+                    continue
+                raise TelegramError(method, status, description)
+
+    async def send(self, chat_id, text, photos=()):
+        # Возвращает первое отправленное сообщение
+        photos = [photo for photo in photos if photo][:MEDIA_GROUP_LIMIT]
+        uploads = {}
+
+        def media(photo):
+            if photo.startswith(("http://", "https://")):
+                return photo
+            name = f"photo{len(uploads)}"
+            uploads[name] = photo
+            return f"attach://{name}"
+
+        first = None
+        caption = text if len(text) <= CAPTION_LIMIT else ""
+        if len(photos) == 1:
+            params = {"chat_id": chat_id, "photo": media(photos[0]), "caption": caption, "parse_mode": "HTML"}
+            first = await self.call("sendPhoto", params, uploads)
+        elif photos:
+            items = [{"type": "photo", "media": media(photo)} for photo in photos]
+            items[0].update(caption=caption, parse_mode="HTML")
+            results = await self.call("sendMediaGroup", {"chat_id": chat_id, "media": items}, uploads)
+            first = results[0]
+        if photos and caption:
+            return first
+
+        for chunk in split_text(text):
+            params = {"chat_id": chat_id, "text": chunk, "parse_mode": "HTML", "disable_web_page_preview": True}
+            result = await self.call("sendMessage", params)
+            first = first or result
+        return first
+
+    async def send_entries(self, chat_id, batch):
+        # Пачка из очереди анонсов: общий текст сверху, эмбеды — абзацами, превью — альбомом
+        content = MENTION.sub("", batch[0]["content"] or "").strip()
+        parts = [markdown_to_html(content)] if content else []
+        parts += [embed_text(entry["embed"]) for entry in batch if entry["embed"]]
+        result = await self.send(chat_id, "\n\n".join(parts), [entry_photo(entry) for entry in batch])
+        return SimpleNamespace(id=result["message_id"])
+
+    async def broadcast(self, text, photos=(), chats=None):
+        # {chat_id: сообщение или исключение}; одна ошибка не мешает остальным чатам
+        chats = self.chats if chats is None else chats
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def send_one(chat_id):
+            async with semaphore:
+                return await self.send(chat_id, text, photos)
+
+        results = await asyncio.gather(*(send_one(chat_id) for chat_id in chats), return_exceptions=True)
+        return dict(zip(chats, results))
+
+
+def get_telegram(bot):
+    client = getattr(bot, "telegram", None)
+    if client is None:
+        bucket = get_scheduler(bot).limiter("telegram")
+        client = bot.telegram = TelegramClient.from_config(get_http_client(bot), bucket)
+        get_config_watcher(bot).watch(CONFIG_PATH, client.apply_config, validate_config)
+    return client
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import aiohttp
+
+from utils.endpoints import base_url as endpoint
+
+PAGE_SIZE = 10       # обычно новых видео 0–1, маленькая страница дешевле
+MAX_PAGES = 5
+CACHE_TTL = 60
+RETRY_BUDGET = 3     # повторов на одну проверку при лимитах и сбоях TikWM
+RETRY_BASE = 2
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("TikWM: превышен лимит запросов")
+        self.retry_after = retry_after
+
+
+def is_rate_limited(data):
+    # Бесплатный TikWM отвечает 200 с code -1 и "Free Api Limit: 1 request/second"
+    return data.get("code") != 0 and "limit" in str(data.get("msg", "")).lower()
+
+
+# Опрос ленты TikWM: страницы по курсору от новых к старым до первого уже
+# виденного видео, кэш ответов на cache_ttl секунд и ограниченный бюджет
+# повторов при 429 / лимите бесплатного API. base_url можно направить на
+# локальную заглушку с тем же форматом ответа.
+class TikTokFeed:
+    def __init__(self, http, username, base_url=None, page_size=PAGE_SIZE, max_pages=MAX_PAGES,
+                 cache_ttl=CACHE_TTL, retry_budget=RETRY_BUDGET, bucket=None):
+        self.http = http
+        self.username = username
+        self.base_url = (base_url or endpoint("tikwm")).rstrip("/")
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.cache_ttl = cache_ttl
+        self.retry_budget = retry_budget
+        self.bucket = bucket
+        self.cache = {}
+        self.latest_post = None  # время самой свежей публикации, для адаптивного интервала
+        self.pages_fetched = 0
+        self.cache_hits = 0
+
+    @classmethod
+    def from_config(cls, http, config, bucket=None):
+        return cls(
+            http,
+            config["username"],
+            base_url=config.get("base_url"),
+            page_size=config.get("page_size", PAGE_SIZE),
+            max_pages=config.get("max_pages", MAX_PAGES),
+            cache_ttl=config.get("cache_ttl_seconds", CACHE_TTL),
+            retry_budget=config.get("retry_budget", RETRY_BUDGET),
+            bucket=bucket,
+        )
+
+    def video_url(self, video_id):
+        return f"https://www.tiktok.com/@{self.username}/video/{video_id}"
+
+    async def request_page(self, cursor):
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        params = {"unique_id": self.username, "count": self.page_size, "cursor": cursor}
+        async with self.http.get(f"{self.base_url}/api/user/posts", params=params) as resp:
+            if resp.status == 429:
+                retry_after = resp.headers.get("Retry-After")
+                raise RateLimited(float(retry_after) if retry_after and retry_after.isdigit() else None)
+            if resp.status >= 500:
+                raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+            data = await resp.json(content_type=None)
+        if is_rate_limited(data):
+            raise RateLimited()
+        if data.get("code") != 0:
+            raise RuntimeError(f"Ошибка от API TikWM: {data.get('msg')}")
+        self.pages_fetched += 1
+        return data["data"]
+
+    async def fetch_page(self, cursor, budget):
+        key = str(cursor)
+        cached = self.cache.get(key)
+        if cached and cached[0] > time.time():
+            self.cache_hits += 1
+            return cached[1], budget
+
+        while True:
+            try:
+                page = await self.request_page(cursor)
+                break
+            except (RateLimited, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if budget <= 0:
+                    raise RuntimeError(f"TikWM недоступен, бюджет повторов исчерпан: {type(e).__name__} {e}") from e
+                budget -= 1
+                attempt = self.retry_budget - budget
+                delay = getattr(e, "retry_after", None) or RETRY_BASE ** attempt
+                print(f"⏳ TikWM: {type(e).__name__} {e}, повтор через {delay:.0f} с (осталось {budget})")
+                await asyncio.sleep(delay)
+
+        self.cache[key] = (time.time() + self.cache_ttl, page)
+        return page, budget
+
+    async def fetch_new(self, filter_new, max_pages=None, since=None, limit=None):
+        # await filter_new(ids) -> список ещё не опубликованных id (outbox.filter_new);
+        # since — не брать видео старше отметки (догонялка после простоя), limit — не больше стольких
+        budget = self.retry_budget
+        cursor = 0
+        new_videos = []
+        for _ in range(max_pages or self.max_pages):
+            page, budget = await self.fetch_page(cursor, budget)
+            videos = page.get("videos", [])
+            fresh = set(await filter_new([video["video_id"] for video in videos]))
+            for video in videos:
+                if not video.get("is_top"):
+                    created = video.get("create_time")
+                    if created and (self.latest_post is None or created > self.latest_post):
+                        self.latest_post = created
+                expired = since is not None and (video.get("create_time") or 0) <= since
+                if video["video_id"] in fresh and not expired:
+                    new_videos.append(video)
+                    if limit and len(new_videos) >= limit:
+                        return new_videos
+                elif not video.get("is_top"):
+                    # Закреплённые видео стоят первыми вне хронологии, по ним не останавливаемся
+                    return new_videos
+            if not page.get("hasMore") or not videos:
+                break
+            cursor = page.get("cursor")
+        return new_videos
+
+    def clear_cache(self):
+        now = time.time()
+        for key in [key for key, (expires, _) in self.cache.items() if expires <= now]:
+            del self.cache[key]
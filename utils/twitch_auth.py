@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from utils.endpoints import base_url
+from utils.http import get_http_client
+from utils.persist import open_json_store
+from utils.scheduler import get_scheduler
+
+CACHE_PATH = "data/twitch_tokens.json"
+REFRESH_MARGIN = 300  # обновляем токен за 5 минут до истечения
+
+
+# Один app-токен (client credentials) на client_id: кэш в памяти и на диске,
+# заранее обновляется до истечения, параллельные вызовы ждут одно обновление.
+# Каждый запрос к Helix берёт токен ограничителя "twitch" (800 запросов/мин).
+class TwitchAuth:
+    def __init__(self, http, client_id, client_secret, cache_path=CACHE_PATH, bucket=None):
+        self.http = http
+        self.bucket = bucket
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.cache = open_json_store(cache_path, {})
+        self.token = None
+        self.expires_at = 0
+        self._refresh_task = None
+        self.load_cache()
+
+    def load_cache(self):
+        cached = self.cache.data.get(self.client_id)
+        if cached and cached.get("expires_at", 0) > time.time():
+            self.token = cached["access_token"]
+            self.expires_at = cached["expires_at"]
+
+    def save_cache(self):
+        self.cache.data[self.client_id] = {"access_token": self.token, "expires_at": self.expires_at}
+        self.cache.mark_dirty()
+
+    def is_fresh(self):
+        return self.token is not None and time.time() < self.expires_at - REFRESH_MARGIN
+
+    async def _refresh(self):
+        print("🔑 Получение Twitch app-токена...")
+        params = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "client_credentials"
+        }
+        async with self.http.post(f"{base_url('twitch_oauth')}/token", params=params) as resp:
+            data = await resp.json()
+        if "access_token" not in data:
+            raise RuntimeError(f"Ошибка получения токена: {data}")
+        self.token = data["access_token"]
+        self.expires_at = time.time() + data.get("expires_in", 3600)
+        self.save_cache()
+        print("✅ Успешно получен Twitch токен.")
+        return self.token
+
+    async def get_token(self):
+        if self.is_fresh():
+            return self.token
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+        return await asyncio.shield(self._refresh_task)
+
+    def invalidate(self, token):
+        # Сбрасываем только тот токен, на который пришёл 401, — если его уже
+        # заменили параллельным обновлением, повторно не обновляем
+        if token == self.token:
+            self.token = None
+            self.expires_at = 0
+
+    def set_secret(self, client_secret):
+        # Секрет сменили в конфиге: токен, выданный по старому, больше не используем
+        # ни из памяти, ни из файла кэша
+        if client_secret == self.client_secret:
+            return
+        self.client_secret = client_secret
+        self.token = None
+        self.expires_at = 0
+        self.cache.data.pop(self.client_id, None)
+        self.cache.mark_dirty()
+
+    async def headers(self):
+        token = await self.get_token()
+        return {"Client-ID": self.client_id, "Authorization": f"Bearer {token}"}
+
+    async def request(self, method, url, **kwargs):
+        extra_headers = kwargs.pop("headers", None) or {}
+        for attempt in range(2):
+            headers = await self.headers()
+            headers.update(extra_headers)
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            async with self.http.request(method, url, headers=headers, **kwargs) as resp:
+                if resp.status == 401 and attempt == 0:
+                    print("🔁 Twitch вернул 401, обновляем токен и повторяем запрос...")
+                    self.invalidate(headers["Authorization"][len("Bearer "):])
+                    continue
+                return await resp.json()
+
+
+def get_twitch_auth(bot, client_id, client_secret):
+    registry = getattr(bot, "twitch_auth", None)
+    if registry is None:
+        registry = bot.twitch_auth = {}
+    auth = registry.get(client_id)
+    if auth is None:
+        auth = registry[client_id] = TwitchAuth(
+            get_http_client(bot), client_id, client_secret, bucket=get_scheduler(bot).limiter("twitch")
+        )
+    else:
+        auth.set_secret(client_secret)
+    return auth
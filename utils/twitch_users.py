@@ -0,0 +1,84 @@
+import time
+
+from utils.endpoints import base_url
+from utils.persist import open_json_store
+
+CACHE_PATH = "data/twitch_users.json"
+BATCH_SIZE = 100          # Helix принимает до 100 login / user_id за запрос
+REFRESH_AFTER = 7 * 86400  # логины меняются редко — освежаем раз в неделю
+MISSING_TTL = 3600         # не найденный логин (переименован, забанен) переспрашиваем не чаще раза в час
+
+
+def config_logins(config):
+    # broadcaster_login может быть строкой или списком, плюс необязательный список broadcasters
+    logins = config.get("broadcaster_login") or []
+    if isinstance(logins, str):
+        logins = [logins]
+    logins = list(logins) + list(config.get("broadcasters", []))
+    return list(dict.fromkeys(login.lower() for login in logins))
+
+
+def check_config(config):
+    # Минимум, без которого опрос Twitch не заработает; для горячей перезагрузки конфигов
+    for key in ("client_id", "client_secret"):
+        if not config.get(key):
+            raise ValueError(f"не задан {key}")
+    if not config_logins(config):
+        raise ValueError("не задан ни один broadcaster_login")
+
+
+def batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# Постоянный кэш login -> {id, display_name, profile_image_url}: логины
+# резолвятся пачками по 100 один раз и освежаются раз в REFRESH_AFTER.
+# Логины, которых Helix не вернул, помнятся в памяти MISSING_TTL секунд,
+# чтобы каждый опрос не запрашивал /users заново и не повторял ошибку.
+class BroadcasterDirectory:
+    def __init__(self, auth, cache_path=CACHE_PATH, helix_url=None):
+        self.auth = auth
+        self.helix_url = helix_url
+        self.cache = open_json_store(cache_path, {})
+        self.missing = {}
+
+    def get(self, login):
+        return self.cache.data.get(login.lower())
+
+    def user_id(self, login):
+        user = self.get(login)
+        return user["id"] if user else None
+
+    def login_for(self, user_id):
+        for login, user in self.cache.data.items():
+            if user["id"] == user_id:
+                return login
+        return None
+
+    async def resolve(self, logins):
+        now = time.time()
+        stale = [
+            login for login in logins
+            if (login not in self.cache.data or now - self.cache.data[login]["resolved_at"] > REFRESH_AFTER)
+            and self.missing.get(login, 0) <= now
+        ]
+        for chunk in batches(stale):
+            data = await self.auth.request("GET", f"{self.helix_url or base_url('twitch_helix')}/users", params=[("login", login) for login in chunk])
+            found = set()
+            for user in data.get("data", []):
+                login = user["login"].lower()
+                found.add(login)
+                self.missing.pop(login, None)
+                self.cache.data[login] = {
+                    "id": user["id"],
+                    "display_name": user["display_name"],
+                    "profile_image_url": user.get("profile_image_url"),
+                    "resolved_at": now,
+                }
+            for login in set(chunk) - found:
+                if login not in self.missing:
+                    print(f"❌ Twitch-канал {login} не найден, повторная проверка через {MISSING_TTL // 60} мин.")
+                self.missing[login] = now + MISSING_TTL
+            self.cache.mark_dirty()
+        return {login: self.cache.data[login]["id"] for login in logins if login in self.cache.data}
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from utils import metrics
+
+CONFIG_PATH = "config/watchdog.json"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CONFIG = {
+    "enabled": True,
+    "interval": 0.1,               # как часто цикл отмечается, секунд
+    "stall_threshold": 0.25,       # задержка цикла больше этого — зависание, ловим стек
+    "profile_interval": 0.005,     # шаг сэмплирующего профайлера
+    "profile_max_seconds": 300,    # забытый профайлер остановится сам
+    "profile_dir": "data/profiles",
+}
+
+
+def short_path(path):
+    path = os.path.abspath(path)
+    if path.startswith(ROOT + os.sep):
+        return os.path.relpath(path, ROOT)
+    # Стандартная библиотека и пакеты: хватит последних двух частей пути
+    return os.sep.join(path.split(os.sep)[-2:])
+
+
+def frame_stack(frame):
+    # От внешнего вызова к внутреннему
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    return stack[::-1]
+
+
+def callback_stack(stack):
+    # Без обвязки asyncio.run/run_forever: с колбэка задачи, а в простое — с _run_once/select
+    for index in range(len(stack) - 1, -1, -1):
+        code = stack[index].f_code
+        if code.co_name == "_run" and code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+            return stack[index + 1:]
+    for index, frame in enumerate(stack):
+        if frame.f_code.co_name == "_run_once":
+            return stack[index:]
+    return stack
+
+
+def frame_label(frame):
+    return f"{frame.f_code.co_name} ({short_path(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+
+def is_own(frame):
+    path = frame.f_code.co_filename
+    return path.startswith(ROOT + os.sep) and "site-packages" not in path
+
+
+def culprit(stack):
+    # Самый внутренний кадр кода бота и cog, внутри которого он вызван
+    own = [frame for frame in stack if is_own(frame)]
+    where = frame_label(own[-1]) if own else frame_label(stack[-1]) if stack else "?"
+    cogs = [short_path(frame.f_code.co_filename) for frame in own]
+    cogs = [path for path in cogs if path.startswith("cogs" + os.sep)]
+    return where, cogs[-1] if cogs else None
+
+
+def task_name(loop):
+    try:
+        task = asyncio.current_task(loop)
+    except RuntimeError:
+        return None
+    return task.get_name() if task is not None else None
+
+
+# Сэмплирующий профайлер потока цикла: раз в несколько миллисекунд снимает его
+# стек из другого потока и копит свёрнутые стеки (формат flamegraph.pl,
+# speedscope, inferno). Корнем стека ставится имя задачи asyncio.
+class SamplingProfiler:
+    def __init__(self, loop, thread_id, interval, max_seconds):
+        self.loop = loop
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples = Counter()
+        self.started = time.time()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="loop-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self.done.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = [frame_label(item) for item in callback_stack(frame_stack(frame))]
+            self.samples[";".join([task_name(self.loop) or "loop"] + labels)] += 1
+        self.done.set()
+
+    def stop(self):
+        self.done.set()
+        self.thread.join()
+
+    def dump(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, time.strftime("profile-%Y%m%d-%H%M%S.folded", time.localtime(self.started)))
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+# Сторож цикла событий: корутина отмечается каждые interval секунд, а отдельный
+# поток следит за отметками. Если цикл молчит дольше порога, поток снимает стек
+# потока цикла прямо во время зависания — с задачей asyncio и cog, который его
+# вызвал; в лог это уходит, когда цикл оживает и известна длительность.
+class LoopWatchdog:
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.loop = None
+        self.thread_id = None
+        self.beat = time.monotonic()
+        self.captured = None
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.profiler = None
+        self.task = None
+        self.done = threading.Event()
+
+    @classmethod
+    def from_config(cls, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config)
+
+    def start(self):
+        if self.task is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.beat = time.monotonic()
+        self.task = asyncio.ensure_future(self.tick())
+        self.task.set_name("watchdog")
+        # Новое событие на каждый запуск: после stop() старое уже взведено,
+        # а поток прошлого запуска дожидается именно своего
+        self.done = threading.Event()
+        threading.Thread(target=self.watch, args=(self.done,), name="loop-watchdog", daemon=True).start()
+        print(f"🐶 [Watchdog] Следим за циклом событий, порог зависания {self.config['stall_threshold'] * 1000:.0f} мс")
+
+    def stop(self):
+        self.done.set()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.profiler is not None:
+            self.stop_profile()
+
+    async def tick(self):
+        interval = self.config["interval"]
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self.beat = now
+            lag = max(0.0, now - expected)
+            metrics.loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.config["stall_threshold"]:
+                self.report(lag)
+
+    def watch(self, done):
+        # Отдельный поток: единственный способ увидеть стек, пока цикл занят
+        while not done.wait(self.config["interval"]):
+            silent = time.monotonic() - self.beat - self.config["interval"]
+            if silent < self.config["stall_threshold"] or self.captured is not None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = callback_stack(frame_stack(frame))
+            where, cog = culprit(stack)
+            self.captured = {
+                "task": task_name(self.loop),
+                "where": where,
+                "cog": cog,
+                "stack": [frame_label(item) for item in stack[-12:]],
+            }
+
+    def report(self, lag):
+        captured, self.captured = self.captured, None
+        self.stalls += 1
+        if captured is None:
+            # Короче шага потока-сторожа — стек поймать не успели
+            metrics.loop_stalls.inc("?")
+            print(f"🐢 [Watchdog] Цикл событий задержался на {lag * 1000:.0f} мс")
+            return
+        metrics.loop_stalls.inc(captured["task"] or "?")
+        print(
+            f"🐢 [Watchdog] Цикл событий стоял {lag * 1000:.0f} мс: задача {captured['task'] or '—'}, "
+            f"cog {captured['cog'] or '—'}, {captured['where']}\n    " + "\n    ".join(captured["stack"])
+        )
+
+    def start_profile(self):
+        if self.profiler is not None:
+            return False
+        if self.loop is None:
+            # Сторож выключен в конфиге — профайлер всё равно работает
+            self.loop = asyncio.get_running_loop()
+            self.thread_id = threading.get_ident()
+        self.profiler = SamplingProfiler(
+            self.loop, self.thread_id, self.config["profile_interval"], self.config["profile_max_seconds"]
+        )
+        self.profiler.start()
+        print("🔬 [Watchdog] Профайлер запущен")
+        return True
+
+    def stop_profile(self):
+        # Возвращает путь к файлу со свёрнутыми стеками или None, если профайлер не шёл
+        if self.profiler is None:
+            return None
+        profiler, self.profiler = self.profiler, None
+        profiler.stop()
+        path = profiler.dump(self.config["profile_dir"])
+        print(f"🔬 [Watchdog] Профиль: {sum(profiler.samples.values())} сэмплов в {path}")
+        return path
+
+    def toggle_profile(self):
+        # Для сигнала: первый запускает, второй останавливает и пишет файл
+        if self.profiler is None:
+            self.start_profile()
+        else:
+            self.stop_profile()
+
+    def stats(self):
+        return {
+            "stalls": self.stalls,
+            "max_lag": round(self.max_lag, 3),
+            "p99_lag": metrics.loop_lag.quantile(0.99),
+            "profiling": self.profiler is not None,
+        }
+
+
+def get_watchdog(bot):
+    watchdog = getattr(bot, "watchdog", None)
+    if watchdog is None:
+        watchdog = bot.watchdog = LoopWatchdog.from_config()
+    return watchdog
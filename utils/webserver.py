@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+CONFIG_PATH = "config/web.json"
+
+DEFAULT_CONFIG = {
+    "host": "0.0.0.0",
+    "port": 8080,
+}
+
+
+# Один локальный HTTP-сервер на бота для входящих вебхуков (EventSub и т.п.).
+# Маршруты хранятся в своей таблице, поэтому cogs могут добавлять и убирать
+# их после запуска сервера (например, при перезагрузке расширения).
+class WebServer:
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.routes = {}
+        self.runner = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_config(cls, path=CONFIG_PATH):
+        config = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config)
+
+    def add_route(self, method, path, handler):
+        self.routes[(method.upper(), path)] = handler
+
+    def remove_route(self, method, path):
+        self.routes.pop((method.upper(), path), None)
+
+    async def dispatch(self, request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            raise web.HTTPNotFound()
+        return await handler(request)
+
+    async def start(self):
+        async with self._lock:
+            if self.runner is not None:
+                return
+            app = web.Application()
+            app.router.add_route("*", "/{tail:.*}", self.dispatch)
+            self.runner = web.AppRunner(app, access_log=None)
+            await self.runner.setup()
+            site = web.TCPSite(self.runner, self.config["host"], self.config["port"])
+            await site.start()
+            print(f"🌐 Веб-сервер запущен на {self.config['host']}:{self.config['port']}")
+
+    async def stop(self):
+        async with self._lock:
+            if self.runner is not None:
+                await self.runner.cleanup()
+                self.runner = None
+
+
+def get_web_server(bot):
+    server = getattr(bot, "web_server", None)
+    if server is None:
+        server = bot.web_server = WebServer.from_config()
+    return server
@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import hmac
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from utils import metrics
+from utils.endpoints import base_url
+
+
+# Стоимость вызовов YouTube Data API в единицах квоты
+QUOTA_COST = {
+    "search.list": 100,
+    "playlistItems.list": 1,
+    "videos.list": 1,
+}
+
+RSS_SIZE = 15  # столько последних загрузок отдаёт RSS-фид канала
+
+NS = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "yt": "http://www.youtube.com/xml/schemas/2015",
+    "media": "http://search.yahoo.com/mrss/",
+}
+
+
+def quota_day():
+    # Квота YouTube сбрасывается в полночь по тихоокеанскому времени
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo("America/Los_Angeles")).date().isoformat()
+    except Exception:
+        return datetime.now(timezone.utc).date().isoformat()
+
+
+class QuotaTracker:
+    def __init__(self):
+        self.day = quota_day()
+        self.spent = {}
+        self.calls = {}
+
+    def charge(self, channel_id, method):
+        today = quota_day()
+        if today != self.day:
+            self.day = today
+            self.spent.clear()
+            self.calls.clear()
+        cost = QUOTA_COST[method]
+        self.spent[channel_id] = self.spent.get(channel_id, 0) + cost
+        metrics.youtube_quota.inc(method, value=cost)
+        metrics.youtube_quota_today.set(sum(self.spent.values()))
+        key = (channel_id, method)
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    def report(self):
+        lines = [f"Квота YouTube за {self.day}:"]
+        for channel_id, spent in sorted(self.spent.items()):
+            lines.append(f"  {channel_id}: {spent} ед.")
+        return "\n".join(lines)
+
+
+def is_recent(published, max_age=86400):
+    # Хаб присылает и правки старых видео — анонсируем только свежие загрузки
+    try:
+        published_at = datetime.fromisoformat(published.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return True
+    return time.time() - published_at < max_age
+
+
+def parse_feed(body):
+    root = ET.fromstring(body)
+    videos = []
+    for entry in root.findall("atom:entry", NS):
+        video_id = entry.findtext("yt:videoId", namespaces=NS)
+        if not video_id:
+            continue
+        thumbnail = entry.find("media:group/media:thumbnail", NS)
+        videos.append({
+            "video_id": video_id,
+            "title": entry.findtext("atom:title", default="", namespaces=NS),
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "thumbnail": thumbnail.get("url") if thumbnail is not None else f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+            "published": entry.findtext("atom:published", default="", namespaces=NS),
+            "author": entry.findtext("atom:author/atom:name", default="", namespaces=NS),
+        })
+    return videos
+
+
+def parse_playlist_items(data):
+    videos = []
+    for item in data.get("items", []):
+        snippet = item["snippet"]
+        video_id = snippet["resourceId"]["videoId"]
+        thumbnails = snippet.get("thumbnails", {})
+        thumbnail = (thumbnails.get("maxres") or thumbnails.get("high") or thumbnails.get("default") or {}).get("url")
+        videos.append({
+            "video_id": video_id,
+            "title": snippet["title"],
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "thumbnail": thumbnail or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+            "published": snippet.get("publishedAt", ""),
+            "author": snippet.get("channelTitle", ""),
+        })
+    return videos
+
+
+# Поиск новых загрузок канала: бесплатный RSS-фид с условными запросами,
+# при ошибке — uploads-плейлист (1 ед. квоты) вместо search.list (100 ед.).
+# Data API нужен только для дообогащения (videos.list, до 50 id за вызов).
+class YouTubeFeed:
+    def __init__(self, http, channel_id, api_key=None, quota=None, bucket=None):
+        self.http = http
+        self.bucket = bucket
+        self.channel_id = channel_id
+        self.api_key = api_key
+        self.quota = quota or QuotaTracker()
+        self.etags = {}
+        self.last_modified = None
+
+    async def throttle(self):
+        if self.bucket is not None:
+            await self.bucket.acquire()
+
+    @property
+    def feed_url(self):
+        return f"{base_url('youtube_feed')}?channel_id={self.channel_id}"
+
+    @property
+    def uploads_playlist_id(self):
+        return "UU" + self.channel_id[2:]
+
+    async def fetch_rss(self, conditional=True):
+        # conditional=False — разовое чтение (для /status): ETag опроса не трогаем,
+        # иначе следующий опрос получил бы 304 и пропустил новое видео
+        headers = {}
+        if conditional and self.etags.get("rss"):
+            headers["If-None-Match"] = self.etags["rss"]
+        if conditional and self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        await self.throttle()
+        async with self.http.get(self.feed_url, headers=headers) as resp:
+            if resp.status == 304:
+                return []
+            if resp.status != 200:
+                raise RuntimeError(f"RSS YouTube вернул {resp.status}")
+            if conditional:
+                self.etags["rss"] = resp.headers.get("ETag")
+                self.last_modified = resp.headers.get("Last-Modified")
+            body = await resp.read()
+        return parse_feed(body)
+
+    async def fetch_uploads(self):
+        if not self.api_key:
+            raise RuntimeError("Для uploads-плейлиста нужен api_key")
+        params = {
+            "key": self.api_key,
+            "playlistId": self.uploads_playlist_id,
+            "part": "snippet",
+            "maxResults": 5,
+        }
+        headers = {}
+        if self.etags.get("playlist"):
+            headers["If-None-Match"] = self.etags["playlist"]
+        self.quota.charge(self.channel_id, "playlistItems.list")
+        await self.throttle()
+        async with self.http.get(f"{base_url('youtube_api')}/playlistItems", params=params, headers=headers) as resp:
+            if resp.status == 304:
+                return []
+            data = await resp.json()
+            if resp.status != 200:
+                raise RuntimeError(f"Ошибка от YouTube API ({resp.status}): {data}")
+        self.etags["playlist"] = data.get("etag")
+        return parse_playlist_items(data)
+
+    async def fetch(self):
+        try:
+            return await self.fetch_rss()
+        except Exception as e:
+            print(f"⚠️ RSS YouTube недоступен ({e}), проверяем uploads-плейлист...")
+            return await self.fetch_uploads()
+
+    async def backfill(self, videos, since, limit=150, max_pages=20):
+        # Догонялка после простоя: RSS знает только 15 последних загрузок; если все они
+        # новее отметки, дочитываем uploads-плейлист по 50 видео (1 ед. квоты за страницу)
+        def is_new(video):
+            published = metrics.to_timestamp(video.get("published"))
+            return published is None or published > since
+
+        if len(videos) < RSS_SIZE or not all(is_new(video) for video in videos) or not self.api_key:
+            return [video for video in videos if is_new(video)][:limit]
+
+        collected = []
+        params = {"key": self.api_key, "playlistId": self.uploads_playlist_id, "part": "snippet", "maxResults": 50}
+        for _ in range(max_pages):
+            self.quota.charge(self.channel_id, "playlistItems.list")
+            await self.throttle()
+            async with self.http.get(f"{base_url('youtube_api')}/playlistItems", params=params) as resp:
+                data = await resp.json()
+                if resp.status != 200:
+                    raise RuntimeError(f"Ошибка от YouTube API ({resp.status}): {data}")
+            page = parse_playlist_items(data)
+            collected.extend(video for video in page if is_new(video))
+            if len(collected) >= limit or not data.get("nextPageToken") or not all(is_new(video) for video in page):
+                break
+            params["pageToken"] = data["nextPageToken"]
+        print(f"📚 [YouTube] Догонялка через uploads-плейлист: {len(collected)} видео с последней проверки")
+        return collected[:limit]
+
+    async def enrich(self, videos):
+        if not self.api_key or not videos:
+            return videos
+        by_id = {video["video_id"]: video for video in videos}
+        ids = list(by_id)
+        for start in range(0, len(ids), 50):
+            params = {"key": self.api_key, "id": ",".join(ids[start:start + 50]), "part": "snippet"}
+            self.quota.charge(self.channel_id, "videos.list")
+            await self.throttle()
+            async with self.http.get(f"{base_url('youtube_api')}/videos", params=params) as resp:
+                data = await resp.json()
+                if resp.status != 200:
+                    print(f"⚠️ Не удалось дообогатить видео ({resp.status}): {data}")
+                    return videos
+            for item in data.get("items", []):
+                thumbnails = item["snippet"].get("thumbnails", {})
+                best = thumbnails.get("maxres") or thumbnails.get("high")
+                video = by_id[item["id"]]
+                video["title"] = item["snippet"]["title"]
+                if best:
+                    video["thumbnail"] = best["url"]
+        return videos
+
+
+# Приёмник WebSub (PubSubHubbub): хаб YouTube шлёт Atom-запись сразу после загрузки
+class WebSubReceiver:
+    def __init__(self, http, topic, callback_url, secret, on_videos, lease_seconds=432000):
+        self.http = http
+        self.topic = topic
+        self.callback_url = callback_url
+        self.secret = secret
+        self.on_videos = on_videos
+        self.lease_seconds = lease_seconds
+        self.lease_expires = 0
+
+    def needs_renewal(self):
+        return time.time() > self.lease_expires - 3600
+
+    async def subscribe(self):
+        data = {
+            "hub.mode": "subscribe",
+            "hub.topic": self.topic,
+            "hub.callback": self.callback_url,
+            "hub.secret": self.secret,
+            "hub.lease_seconds": str(self.lease_seconds),
+            "hub.verify": "async",
+        }
+        async with self.http.post(base_url("youtube_hub"), data=data) as resp:
+            if resp.status not in (202, 204):
+                print(f"❌ [WebSub] Хаб отклонил подписку ({resp.status}): {await resp.text()}")
+                return
+        # Реальный срок придёт в hub.lease_seconds при подтверждении
+        self.lease_expires = time.time() + 3600 * 2
+        print("📡 [WebSub] Запрос подписки на фид YouTube отправлен")
+
+    async def handle_verify(self, request):
+        query = request.query
+        if query.get("hub.topic") != self.topic:
+            raise web.HTTPNotFound()
+        if query.get("hub.mode") == "subscribe":
+            self.lease_expires = time.time() + int(query.get("hub.lease_seconds", self.lease_seconds))
+            print("✅ [WebSub] Подписка на фид YouTube подтверждена")
+        return web.Response(text=query.get("hub.challenge", ""), content_type="text/plain")
+
+    async def handle_notify(self, request):
+        body = await request.read()
+        signature = request.headers.get("X-Hub-Signature", "")
+        digest = hmac.new(self.secret.encode(), body, hashlib.sha1).hexdigest()
+        if not hmac.compare_digest(f"sha1={digest}", signature):
+            print("❌ [WebSub] Неверная подпись уведомления, пропускаем.")
+            # Хаб ждёт 2xx даже при неверной подписи, иначе будет повторять
+            return web.Response(status=204)
+        try:
+            videos = [video for video in parse_feed(body) if is_recent(video["published"])]
+        except ET.ParseError:
+            return web.Response(status=204)
+        if videos:
+            # Отвечаем хабу сразу, отправка идёт в фоне
+            asyncio.ensure_future(self.on_videos(videos))
+        return web.Response(status=204)